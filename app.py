@@ -1,27 +1,43 @@
 import streamlit as st
+import html
 import os
-import hashlib
 import uuid
 from pathlib import Path
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
+import queue
 from concurrent.futures import ThreadPoolExecutor
 from filelock import FileLock
-from src.audio.analyzer import AudioAnalyzer
-from src.audio.loader import AudioLoader
+from src.audio.encoder import get_format, get_stem_encoder, publish, published_dir
+from src.audio.profiles import PROFILES
 from src.audio.separator import VocalSeparator
+from src.jobs.pipeline import process_file
+from src.jobs.queue import DONE, FAILED, QUEUED, RUNNING, get_job_queue
+from src.jobs.scheduler import SchedulerFull
 from src.optimization.cache import ResultsCache
+from src.optimization.stem_store import get_stem_store
+from src.utils.metrics import metrics, start_metrics_server, timed
 from src.youtube.downloader import YoutubeDownloader
+from src.youtube.playlist import PlaylistIngestor
 
 # Configuration
 st.set_page_config(page_title="Audio Analyzer Pro", layout="wide")
 MAX_FILE_SIZE = 300  # MB
+JOB_TIMEOUT = 30 * 60  # seconds to wait for a queued job, including time in the queue
+
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve Prometheus metrics on METRICS_PORT, once per server process"""
+    port = os.environ.get("METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
 
 
 def create_temp_dir():
     """Create temporary directories with proper permissions"""
     temp_dirs = [
         Path("temp/uploads"),
-        Path("temp/separated")
+        Path("temp/stems")
     ]
 
     for dir_path in temp_dirs:
@@ -46,121 +62,117 @@ def safe_write(path, data):
             lock_path.unlink()
 
 
-def read_file_chunked(path):
-    """Memory-efficient file reading with locking"""
-    path = Path(path)
-    lock_path = path.with_suffix(path.suffix + '.lock')
+STEM_FORMATS = {"FLAC (lossless)": "flac", "Opus (smallest)": "opus", "WAV (original)": "wav"}
 
-    with FileLock(str(lock_path)):
-        with path.open("rb") as f:
-            while chunk := f.read(8192 * 1024):  # 8MB chunks
-                yield chunk
+# Served by Streamlit at app/static/ (server.enableStaticServing in .streamlit/config.toml)
+STATIC_DIR = Path(__file__).parent / "static"
+STEM_LINK_DIR = STATIC_DIR / "stems"
 
 
 @st.cache_data(show_spinner=False)
-def process_audio(file_path, _separator, _cache):
+@timed('app.process_audio')
+def process_audio(file_path, _separator, _cache, _queue=None, profile="balanced", sampled=False, _user=None):
     """Process audio with enhanced error handling"""
-    try:
-        file_path = Path(file_path)
-        process_id = uuid.uuid4().hex
-        output_dir = Path("temp/separated") / process_id
-        output_dir.mkdir(exist_ok=True)
-
-        # Generate safe output paths
-        vocal_path = output_dir / "vocals.wav"
-        backing_path = output_dir / "accompaniment.wav"
-
-        # Parallel execution with error propagation
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future_sep = executor.submit(
-                _separator.separate_vocals,
-                str(file_path),
-                str(output_dir)
-            )
-            future_analysis = executor.submit(
-                analyze_audio,
-                str(file_path),
-                _cache
-            )
-
-            # Get results with timeout
-            separation_result = future_sep.result(timeout=300)
-            analysis_result = future_analysis.result(timeout=300)
-
-        # Validate outputs
-        if not vocal_path.exists():
-            raise RuntimeError("Vocal separation failed - no output file")
-        if not analysis_result:
-            raise ValueError("Audio analysis failed")
-
-        return {
-            'results': analysis_result,
-            'vocal_path': str(vocal_path),
-            'backing_path': str(backing_path),
-            'process_id': process_id
-        }
-
-    except Exception as e:
-        # Cleanup failed outputs
-        if output_dir.exists():
-            for f in output_dir.iterdir():
-                f.unlink()
-            output_dir.rmdir()
-        raise e
+    status = st.empty()
 
+    def show_status(job):
+        if job['status'] == QUEUED:
+            status.info(f"⏳ Waiting for a worker ({job.get('position', 0)} jobs ahead)")
+        elif job['status'] == RUNNING:
+            status.info("⚙️ Separating and analysing...")
 
-@st.cache_data
-def analyze_audio(file_path, _cache):
-    """Improved audio analysis with safe caching"""
-    try:
-        file_path = Path(file_path)
-        if not file_path.exists():
-            raise FileNotFoundError(f"Missing file: {file_path}")
-
-        # Generate stable cache key
-        file_stat = file_path.stat()
-        cache_key = hashlib.md5(
-            f"{file_path.name}-{file_stat.st_size}-{file_stat.st_mtime}".encode()
-        ).hexdigest()
-
-        if cached := _cache.get_cached_result(cache_key):
-            if all(k in cached for k in ['key', 'bpm', 'additional_info']):
-                return cached
-
-        # Load and validate audio
-        loader = AudioLoader()
-        y, sr = loader.load_audio(str(file_path))
-        if y is None or sr is None:
-            raise ValueError("Failed to load audio data")
-
-        # Perform analysis
-        analyzer = AudioAnalyzer()
-        results = {
-            'key': analyzer.detect_key(y, sr),
-            'bpm': analyzer.detect_bpm(y, sr),
-            'additional_info': analyzer.get_additional_info(y, sr)
-        }
-
-        _cache.cache_result(cache_key, results)
-        return results
-
-    except Exception as e:
-        st.error(f"Analysis failed: {str(e)}")
-        return None
+    if _queue is None:
+        try:
+            return process_file(str(file_path), None, _separator, _cache, profile=profile, sampled=sampled,
+                                user=_user, on_update=show_status, stem_store=get_stem_store())
+        except SchedulerFull as e:
+            raise RuntimeError(f"The server is busy: {e}") from e
+        finally:
+            status.empty()
+
+    # Hand the work to the worker processes and poll until it is done
+    job_id = _queue.enqueue('process_audio', {
+        'file_path': str(Path(file_path).resolve()),
+        'profile': profile,
+        'sampled': sampled
+    })
+
+    job = _queue.wait(job_id, timeout=JOB_TIMEOUT, on_update=show_status)
+    status.empty()
+
+    if job is None or job['status'] == FAILED:
+        raise RuntimeError(job['error'] if job else "Job disappeared from the queue")
+    if job['status'] != DONE:
+        raise TimeoutError("Processing timed out waiting for a worker")
+    return job['result']
+
+
+def hold_stems(slot, stem_key):
+    """Lease a result's stems for this session, releasing the ones shown in the slot before"""
+    store = get_stem_store()
+    leases = st.session_state.setdefault('stem_leases', {})
+    previous = leases.get(slot)
+    if previous and previous != stem_key:
+        store.release(previous, st.session_state.user_id)
+    leases[slot] = stem_key
+    return stem_key is None or store.lease(stem_key, st.session_state.user_id)
+
+
+def process_and_hold(slot, file_path, profile, sampled):
+    """Process audio and keep its stems on disk while this session offers them for download"""
+    args = (
+        file_path,
+        None if st.session_state.job_queue else get_separator(),
+        st.session_state.cache,
+        st.session_state.job_queue,
+        profile,
+        sampled
+    )
+    processed = process_audio(*args, _user=st.session_state.user_id)
+    if processed and not hold_stems(slot, processed.get('stem_key')):
+        # A result cached by Streamlit whose stems were evicted since
+        process_audio.clear()
+        processed = process_audio(*args, _user=st.session_state.user_id)
+        hold_stems(slot, processed.get('stem_key'))
+    return processed
+
+
+def get_separator():
+    """Load the separation model on first use; not needed when workers run it"""
+    if st.session_state.separator is None:
+        st.session_state.separator = VocalSeparator.shared()
+        # Add dummy attributes for Streamlit hashing
+        st.session_state.separator._cache_hash = id(st.session_state.separator)
+    return st.session_state.separator
 
 
 def main():
     """Main application flow"""
     st.title("🎵 Audio Analyzer")
     create_temp_dir()
+    start_metrics_endpoint()
 
-    if 'separator' not in st.session_state:
-        st.session_state.separator = VocalSeparator()
+    if 'cache' not in st.session_state:
         st.session_state.cache = ResultsCache()
+        st.session_state.job_queue = get_job_queue()
+        st.session_state.separator = None
+        st.session_state.yt_downloader = YoutubeDownloader()
+        st.session_state.user_id = uuid.uuid4().hex  # scheduler fairness key and stem lease holder
         # Add dummy attributes for Streamlit hashing
-        st.session_state.separator._cache_hash = id(st.session_state.separator)
         st.session_state.cache._cache_hash = id(st.session_state.cache)
 
+    profile = st.sidebar.selectbox(
+        "Analysis quality", list(PROFILES), index=list(PROFILES).index("balanced"),
+        help="fast for quick previews, accurate for reference-grade key and tempo"
+    )
+    sampled = st.sidebar.checkbox(
+        "Quick scan", help="Estimate key and BPM from a few excerpts; uncertain tracks are analysed in full"
+    )
+    st.sidebar.selectbox(
+        "Stem format", list(STEM_FORMATS), key="stem_format",
+        help="Stems are encoded in the background and only read when you download them"
+    )
+
     tab_upload, tab_youtube = st.tabs(["📤 File Upload", "▶️ YouTube"])
 
     with tab_upload:
@@ -188,11 +200,7 @@ def main():
 
                 # Process file with progress
                 with st.spinner("🔍 Processing audio..."):
-                    processing_results = process_audio(
-                        temp_path,
-                        st.session_state.separator,
-                        st.session_state.cache
-                    )
+                    processing_results = process_and_hold('upload', temp_path, profile, sampled)
 
                     if processing_results and processing_results['results']:
                         st.session_state.update({
@@ -201,6 +209,7 @@ def main():
                             'backing_path': processing_results['backing_path'],
                             'processed': True
                         })
+                        prefetch_stems(processing_results['vocal_path'], processing_results['backing_path'])
                         st.experimental_rerun()
                     else:
                         st.error("Processing failed to return valid results")
@@ -223,11 +232,7 @@ def main():
                 try:
                     audio_path = st.session_state.yt_downloader.download_audio(yt_url, "temp")
                     with st.spinner("🔍 Processing audio..."):
-                        processed_data = process_audio(
-                            audio_path,
-                            st.session_state.separator,
-                            st.session_state.cache
-                        )
+                        processed_data = process_and_hold('youtube', audio_path, profile, sampled)
 
                         if processed_data and processed_data['results']:
                             st.session_state.update({
@@ -235,15 +240,128 @@ def main():
                                 'yt_vocal_path': processed_data['vocal_path'],
                                 'yt_backing_path': processed_data['backing_path']
                             })
+                            prefetch_stems(processed_data['vocal_path'], processed_data['backing_path'])
                             st.success("✅ Processing completed!")
-                            display_analysis_results(st.session_state.yt_results)
-                            display_yt_download_section()
                         else:
                             st.error("YouTube processing failed")
 
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
 
+        # Shown on every rerun, so preparing a download doesn't hide the results
+        if st.session_state.get('yt_results'):
+            display_analysis_results(st.session_state.yt_results)
+            display_yt_download_section()
+
+        st.divider()
+        playlist_url = st.text_input("YouTube playlist URL:", key="playlist_url")
+        if playlist_url and st.button("Process Playlist", key="playlist_button"):
+            try:
+                items = process_playlist(playlist_url, profile, sampled)
+                st.session_state.playlist_items = items
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+
+        if st.session_state.get('playlist_items'):
+            display_playlist_results(st.session_state.playlist_items)
+
+    if st.sidebar.checkbox("📈 Performance metrics"):
+        display_metrics_dashboard()
+
+
+def process_playlist(url, profile="balanced", sampled=False):
+    """Download playlist entries while earlier ones are separated and analysed"""
+    job_queue = st.session_state.job_queue
+    separator = None if job_queue else get_separator()
+    cache = st.session_state.cache
+    user = st.session_state.user_id
+
+    # Runs on pipeline threads, so it must not touch st.* or session state
+    def process_item(audio_path):
+        if job_queue is None:
+            return process_file(audio_path, None, separator, cache, profile=profile, sampled=sampled,
+                                user=user, stem_store=get_stem_store())['results']
+        job = job_queue.wait(
+            job_queue.enqueue('process_audio', {'file_path': str(Path(audio_path).resolve()),
+                                                'profile': profile,
+                                                'sampled': sampled}),
+            timeout=JOB_TIMEOUT
+        )
+        if job is None or job['status'] != DONE:
+            raise RuntimeError(job['error'] if job and job['error'] else "Processing timed out")
+        return job['result']['results']
+
+    with st.spinner("📃 Reading playlist..."):
+        urls = st.session_state.yt_downloader.get_playlist_urls(url)
+
+    # Several workers only help when they can hand files to the job queue
+    ingestor = PlaylistIngestor(
+        st.session_state.yt_downloader,
+        process_item,
+        download_workers=3,
+        analysis_workers=4 if job_queue else 1
+    )
+    progress_bar = st.progress(0.0)
+    progress_updates = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(ingestor.ingest, urls, os.path.abspath("temp"), progress_updates.put)
+        # Progress widgets can only be updated from the script thread
+        while not future.done() or not progress_updates.empty():
+            try:
+                progress = progress_updates.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            finished = progress['processed'] + progress['failed']
+            progress_bar.progress(
+                finished / max(progress['total'], 1),
+                text=f"{progress['downloaded']} downloaded, {progress['processed']} analysed, "
+                     f"{progress['failed']} failed of {progress['total']}"
+            )
+        return future.result()
+
+
+def display_playlist_results(items):
+    """Display per-item playlist results"""
+    st.subheader("Playlist Results")
+    st.dataframe([
+        {
+            'URL': item['url'],
+            'Key': (item['result'] or {}).get('key'),
+            'BPM': (item['result'] or {}).get('bpm'),
+            'Error': item['error']
+        }
+        for item in items
+    ], use_container_width=True)
+
+
+def display_metrics_dashboard():
+    """Display per-stage timing and memory of this server process"""
+    st.sidebar.subheader("Performance Metrics")
+    rows = metrics.snapshot()
+    if not rows:
+        st.sidebar.info("No stages have run yet")
+        return
+
+    st.sidebar.dataframe([
+        {
+            'Stage': row['stage'],
+            'Calls': row['count'],
+            'Mean wall (s)': round(row['mean_wall_seconds'], 3),
+            'Mean CPU (s)': round(row['mean_cpu_seconds'], 3),
+            'Peak memory (MB)': round(row['max_memory_bytes'] / 1024 ** 2, 1),
+            'Errors': row['errors']
+        }
+        for row in rows
+    ], use_container_width=True)
+    if not metrics.trace_memory:
+        st.sidebar.caption("Set AUDIO_ANALYZER_TRACE_MEMORY=1 to trace memory per stage")
+    st.sidebar.download_button(
+        "⬇️ Prometheus metrics",
+        metrics.prometheus_text(),
+        file_name="metrics.prom",
+        mime="text/plain"
+    )
+
 
 def display_analysis_results(results):
     """Display analysis results with error handling"""
@@ -271,6 +389,43 @@ def display_analysis_results(results):
         st.error(f"Error displaying results: {str(e)}")
 
 
+def selected_stem_format():
+    return STEM_FORMATS[st.session_state.get('stem_format', next(iter(STEM_FORMATS)))]
+
+
+def prefetch_stems(*paths):
+    """Start encoding stems in the selected format so downloads are ready when asked for"""
+    fmt = selected_stem_format()
+    for path in paths:
+        get_stem_encoder().submit(path, fmt)
+
+
+def stem_download_button(label, path, file_name, key, slot):
+    """Offer a stem as a link to a static file, kept while the session leases the slot's stems"""
+    if not os.path.exists(path):
+        return
+    fmt = selected_stem_format()
+    encoder = get_stem_encoder()
+
+    if not encoder.is_ready(path, fmt):
+        if not st.button(f"{label} ({fmt.upper()})", key=f"{key}_{fmt}_prepare",
+                         help="Encoding in the background..."):
+            return
+        with st.spinner(f"Encoding {fmt.upper()}..."):
+            encoder.get(path, fmt)
+
+    download_name = f"{Path(file_name).stem}.{get_format(fmt).extension}"
+    encoded = encoder.get(path, fmt)
+    stem_key = st.session_state.get('stem_leases', {}).get(slot)
+    if not stem_key or not get_stem_store().track_link(stem_key, st.session_state.user_id,
+                                                        published_dir(encoded, str(STEM_LINK_DIR))):
+        return  # evicted meanwhile; the next run separates the file again
+    published = publish(encoded, str(STEM_LINK_DIR), download_name)
+    url = "app/static/stems/" + quote(published)
+    st.markdown(f'<a href="{url}" download="{html.escape(download_name)}">{html.escape(label)} ({fmt.upper()})</a>',
+                unsafe_allow_html=True)
+
+
 def display_download_section():
     """Display file upload download section"""
     st.subheader("🎧 Download Separated Tracks")
@@ -280,25 +435,13 @@ def display_download_section():
         st.warning("Separation in progress...")
         return
 
+    hold_stems('upload', st.session_state.get('stem_leases', {}).get('upload'))
     col1, col2 = st.columns(2)
     with col1:
-        if os.path.exists(st.session_state.vocal_path):
-            st.download_button(
-                "⬇️ Download Vocals",
-                b"".join(read_file_chunked(st.session_state.vocal_path)),
-                file_name="vocals.wav",
-                mime="audio/wav",
-                key="dl_vocal"
-            )
+        stem_download_button("⬇️ Download Vocals", st.session_state.vocal_path, "vocals.wav", "dl_vocal", 'upload')
     with col2:
-        if os.path.exists(st.session_state.backing_path):
-            st.download_button(
-                "⬇️ Download Instrumental",
-                b"".join(read_file_chunked(st.session_state.backing_path)),
-                file_name="accompaniment.wav",
-                mime="audio/wav",
-                key="dl_backing"
-            )
+        stem_download_button("⬇️ Download Instrumental", st.session_state.backing_path,
+                             "accompaniment.wav", "dl_backing", 'upload')
 
 
 def display_yt_download_section():
@@ -310,25 +453,14 @@ def display_yt_download_section():
         st.warning("Separation in progress...")
         return
 
+    hold_stems('youtube', st.session_state.get('stem_leases', {}).get('youtube'))
     col1, col2 = st.columns(2)
     with col1:
-        if os.path.exists(st.session_state.yt_vocal_path):
-            st.download_button(
-                "⬇️ YouTube Vocals",
-                b"".join(read_file_chunked(st.session_state.yt_vocal_path)),
-                file_name="yt_vocals.wav",
-                mime="audio/wav",
-                key="yt_dl_vocal"
-            )
+        stem_download_button("⬇️ YouTube Vocals", st.session_state.yt_vocal_path, "yt_vocals.wav", "yt_dl_vocal",
+                             'youtube')
     with col2:
-        if os.path.exists(st.session_state.yt_backing_path):
-            st.download_button(
-                "⬇️ YouTube Instrumental",
-                b"".join(read_file_chunked(st.session_state.yt_backing_path)),
-                file_name="yt_accompaniment.wav",
-                mime="audio/wav",
-                key="yt_dl_backing"
-            )
+        stem_download_button("⬇️ YouTube Instrumental", st.session_state.yt_backing_path,
+                             "yt_accompaniment.wav", "yt_dl_backing", 'youtube')
 
 
 if __name__ == "__main__":
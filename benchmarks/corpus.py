@@ -0,0 +1,107 @@
+import os
+from dataclasses import dataclass
+from typing import Iterable, List
+
+import numpy as np
+import soundfile as sf
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Chord roots and qualities, in semitones above the tonic, of a I-IV-V-I / i-iv-v-i cadence
+_PROGRESSIONS = {
+    'major': [(0, (0, 4, 7)), (5, (0, 4, 7)), (7, (0, 4, 7)), (0, (0, 4, 7))],
+    'minor': [(0, (0, 3, 7)), (5, (0, 3, 7)), (7, (0, 3, 7)), (0, (0, 3, 7))],
+}
+
+
+@dataclass(frozen=True)
+class CorpusTrack:
+    """A generated track and its ground truth."""
+    name: str
+    path: str
+    key: str
+    bpm: float
+    duration: float
+
+
+def tone_track(key: str, duration: float, sr: int = 22050, chord_seconds: float = 2.0) -> np.ndarray:
+    """
+    Cycle a cadence of triads in a key, voiced with decaying harmonics.
+
+    Args:
+        key (str): e.g. 'A minor'
+        duration (float): length in seconds
+        sr (int): sample rate
+        chord_seconds (float): length of every chord
+
+    Returns:
+        np.ndarray: float32 mono samples
+    """
+    tonic, mode = key.split()
+    tonic = PITCH_CLASSES.index(tonic)
+    chord_length = int(chord_seconds * sr)
+    t = np.arange(chord_length) / sr
+    envelope = np.minimum(1.0, np.minimum(t, chord_seconds - t) / 0.05)
+
+    chords = []
+    for root, intervals in _PROGRESSIONS[mode]:
+        chord = np.zeros(chord_length)
+        for interval in intervals:
+            frequency = 220.0 * 2 ** (((tonic + root + interval) % 12 - 9) / 12)
+            for harmonic in (1, 2, 3):
+                chord += np.sin(2 * np.pi * frequency * harmonic * t) / harmonic ** 2
+        chords.append(chord * envelope)
+    cycle = np.concatenate(chords)
+
+    n_samples = int(duration * sr)
+    return np.resize(cycle, n_samples).astype(np.float32) / 6
+
+
+def click_track(bpm: float, duration: float, sr: int = 22050) -> np.ndarray:
+    """Short decaying 1 kHz clicks on every beat, accented on the downbeat."""
+    click_t = np.arange(int(0.03 * sr)) / sr
+    click = np.sin(2 * np.pi * 1000 * click_t) * np.exp(-click_t * 150)
+
+    y = np.zeros(int(duration * sr), dtype=np.float32)
+    beat_starts = np.arange(0, duration, 60.0 / bpm)
+    for beat, start in enumerate(beat_starts):
+        start = int(start * sr)
+        length = min(len(click), len(y) - start)
+        y[start:start + length] += click[:length] * (1.0 if beat % 4 == 0 else 0.6)
+    return y
+
+
+def make_track(key: str, bpm: float, duration: float, sr: int = 22050) -> np.ndarray:
+    """Tones in a key under a click track at a tempo."""
+    return 0.6 * tone_track(key, duration, sr) + 0.4 * click_track(bpm, duration, sr)
+
+
+def build_corpus(output_dir: str, durations: Iterable[float], sr: int = 22050,
+                 seed: int = 0) -> List[CorpusTrack]:
+    """
+    Write one track per duration, with a key and tempo drawn from a seeded generator.
+
+    Tracks are deterministic for a seed, so files already on disk are reused.
+
+    Args:
+        output_dir (str): directory receiving the 16-bit WAV files
+        durations (Iterable[float]): track lengths in seconds
+        sr (int): sample rate
+        seed (int): seed of the key/tempo draw
+
+    Returns:
+        List[CorpusTrack]: generated tracks
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tracks = []
+    for duration in durations:
+        key = f"{PITCH_CLASSES[rng.integers(12)]} {rng.choice(['major', 'minor'])}"
+        bpm = float(rng.integers(80, 160))
+        name = f"{int(duration)}s_{key.replace(' ', '_').replace('#', 'sharp')}_{int(bpm)}bpm"
+        path = os.path.join(output_dir, f"{name}.wav")
+        if not os.path.exists(path):
+            sf.write(path + ".tmp", make_track(key, bpm, duration, sr), sr, subtype='PCM_16', format='WAV')
+            os.replace(path + ".tmp", path)
+        tracks.append(CorpusTrack(name, path, key, bpm, float(duration)))
+    return tracks
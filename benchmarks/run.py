@@ -0,0 +1,269 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from benchmarks.corpus import CorpusTrack, build_corpus
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+
+# Track durations in seconds per profile
+PROFILES = {
+    'quick': (10, 30, 60),
+    'standard': (10, 60, 300, 600),
+    'full': (10, 60, 600, 1800, 3600),
+}
+
+DEFAULT_THRESHOLDS = {
+    'time': 0.25,  # relative slowdown allowed per stage, once scaled to the baseline machine's speed
+    'memory': 0.20,  # relative peak RSS growth allowed per track
+    'bpm_error': 0.02,  # absolute growth of the relative tempo error allowed
+    'min_seconds': 0.01,  # slowdowns smaller than this are timer noise
+}
+
+# Tempo ratios counted as the right beat at another metrical level
+_METRICAL_FACTORS = (1.0, 0.5, 2.0, 1 / 3, 3.0)
+
+# Fixed NumPy workload timed next to every track. Stages are compared as ratios
+# to it, so a baseline recorded on another machine (CPU count, Python version)
+# still catches stages that got slower relative to the rest.
+REFERENCE_STAGE = 'reference'
+
+
+class StubSeparationModel:
+    """Splits audio into two fixed-gain stems, so separation benchmarks measure everything but the model."""
+
+    def separate(self, waveform: np.ndarray) -> Dict[str, np.ndarray]:
+        return {'vocals': waveform * 0.5, 'accompaniment': waveform * 0.5}
+
+
+def _timed(fn: Callable[[], Any], repeat: int = 1) -> Tuple[Any, float]:
+    """Run fn `repeat` times and return its last result and the best wall time."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _reference_workload() -> float:
+    rng = np.random.default_rng(0)
+    frames = rng.standard_normal((256, 2048))
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(2048), axis=1))
+    return float(np.sum(spectrum @ spectrum.T))
+
+
+def _separation_seconds(track: CorpusTrack, output_dir: str) -> float:
+    """Time stem separation with the stub model; Spleeter itself is never loaded."""
+    from src.audio.decoder import decode_audio
+    from src.audio.separator import VocalSeparator
+
+    waveform, sr = decode_audio(track.path, mono=False)
+    separator = VocalSeparator('stub', backend=StubSeparationModel())
+    _, seconds = _timed(lambda: separator.separate_waveform_to_files(waveform, output_dir, sr))
+    return seconds
+
+
+def benchmark_track(track: CorpusTrack, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time every stage on one track and check the analysis against its ground truth.
+
+    Runs in a fresh process per track, so the peak RSS belongs to that track.
+    Every analysis stage gets its own AudioAnalyzer and pays for the features it needs.
+    """
+    from src.audio.analyzer import AudioAnalyzer
+    from src.audio.loader import AudioLoader
+    from src.optimization.cache import ResultsCache
+
+    timings = {}
+    _, timings[REFERENCE_STAGE] = _timed(_reference_workload, repeat)
+    (y, sr), timings['load_audio'] = _timed(lambda: AudioLoader().load_audio(track.path), repeat)
+    key, timings['detect_key'] = _timed(lambda: AudioAnalyzer().detect_key(y, sr), repeat)
+    bpm, timings['detect_bpm'] = _timed(lambda: AudioAnalyzer().detect_bpm(y, sr), repeat)
+    _, timings['detect_tempo'] = _timed(lambda: AudioAnalyzer().detect_tempo(y, sr), repeat)
+    info, timings['get_additional_info'] = _timed(lambda: AudioAnalyzer().get_additional_info(y, sr), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultsCache(os.path.join(tmp, "cache"))
+        results = {'key': key, 'bpm': bpm, 'additional_info': info}
+        _, timings['cache_put'] = _timed(lambda: cache.cache_result(track.path, results), repeat)
+        _, timings['cache_get'] = _timed(lambda: cache.get_cached_result(track.path), repeat)
+
+        timings['separation'] = _separation_seconds(track, os.path.join(tmp, "stems"))
+
+    bpm_errors = [abs(bpm - track.bpm * factor) / (track.bpm * factor) for factor in _METRICAL_FACTORS]
+    return {
+        'track': track.name,
+        'duration': track.duration,
+        'timings': {stage: round(seconds, 6) for stage, seconds in timings.items()},
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'expected_key': track.key,
+        'key': key,
+        'key_correct': key.split(' (')[0] == track.key,
+        'expected_bpm': track.bpm,
+        'bpm': bpm,
+        'bpm_error': round(bpm_errors[0], 4),
+        'bpm_metrical_error': round(min(bpm_errors), 4),
+    }
+
+
+def run_benchmarks(tracks: List[CorpusTrack], repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    """Benchmark every track in its own spawned process."""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for track in tracks:
+        with context.Pool(1) as pool:
+            results[track.name] = pool.apply(benchmark_track, (track, repeat))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            thresholds: Dict[str, float], same_machine: bool = True) -> List[str]:
+    """
+    Find regressions of the results against a baseline.
+
+    Args:
+        results (Dict[str, Dict[str, Any]]): benchmark_track results per track
+        baseline (Dict[str, Dict[str, Any]]): baseline results per track
+        thresholds (Dict[str, float]): allowed regressions, see DEFAULT_THRESHOLDS
+        same_machine (bool): whether the baseline was recorded on this machine. If not,
+            timings are scaled by the ratio of the two reference times, i.e. stage
+            ratios are compared rather than absolute times.
+
+    Returns:
+        List[str]: one message per regression, empty when none
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        reference, base_reference = result['timings'].get(REFERENCE_STAGE), base['timings'].get(REFERENCE_STAGE)
+        scale = 1.0
+        if not same_machine and reference and base_reference:
+            scale = base_reference / reference
+        for stage, seconds in result['timings'].items():
+            base_seconds = base['timings'].get(stage)
+            if base_seconds is None or stage == REFERENCE_STAGE:
+                continue
+            seconds *= scale
+            if seconds > base_seconds * (1 + thresholds['time']) and seconds - base_seconds > thresholds['min_seconds']:
+                scaled = " scaled to the baseline machine" if scale != 1.0 else ""
+                regressions.append(f"{name} {stage}: {seconds:.3f}s{scaled} vs {base_seconds:.3f}s baseline")
+
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + thresholds['memory']):
+            regressions.append(
+                f"{name} peak RSS: {result['peak_rss_mb']:.0f} MB vs {base['peak_rss_mb']:.0f} MB baseline"
+            )
+        if base['key_correct'] and not result['key_correct']:
+            regressions.append(f"{name} key: {result['key']} instead of {result['expected_key']}")
+        if result['bpm_metrical_error'] > base['bpm_metrical_error'] + thresholds['bpm_error']:
+            regressions.append(f"{name} tempo: {result['bpm']} BPM for {result['expected_bpm']:.0f} BPM")
+    return regressions
+
+
+def format_report(results: Dict[str, Dict[str, Any]]) -> str:
+    stages = sorted({stage for result in results.values() for stage in result['timings']})
+    header = ["track"] + stages + ["rss MB", "key", "bpm"]
+    rows = [header]
+    for name, result in results.items():
+        rows.append(
+            [name]
+            + [f"{result['timings'][stage]:.3f}" if stage in result['timings'] else "-" for stage in stages]
+            + [f"{result['peak_rss_mb']:.0f}",
+               "ok" if result['key_correct'] else result['key'],
+               "ok" if result['bpm_error'] < 0.04 else f"{result['bpm']}"]
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows)
+
+
+def machine_info() -> Dict[str, Any]:
+    return {'platform': platform.platform(), 'machine': platform.machine(),
+            'python': platform.python_version(), 'cpus': os.cpu_count()}
+
+
+def _same_machine(machine: Dict[str, Any], other: Dict[str, Any]) -> bool:
+    python = '.'.join(machine['python'].split('.')[:2])
+    return (python == '.'.join(other.get('python', '').split('.')[:2])
+            and machine['cpus'] == other.get('cpus') and machine['machine'] == other.get('machine'))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark loading, analysis, caching and separation on a synthetic corpus."
+    )
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick", help="track durations to run")
+    parser.add_argument("--durations", type=float, nargs="+", help="track durations in seconds (overrides --profile)")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="where generated tracks are kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the corpus keys and tempos")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the best time is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    parser.add_argument("--time-threshold", type=float, help="relative slowdown that fails the run")
+    parser.add_argument("--memory-threshold", type=float, help="relative peak RSS growth that fails the run")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    thresholds = {**DEFAULT_THRESHOLDS, **baseline.get('thresholds', {})}
+    if args.time_threshold is not None:
+        thresholds['time'] = args.time_threshold
+    if args.memory_threshold is not None:
+        thresholds['memory'] = args.memory_threshold
+
+    tracks = build_corpus(args.corpus_dir, args.durations or PROFILES[args.profile], seed=args.seed)
+    results = run_benchmarks(tracks, repeat=args.repeat)
+    print(format_report(results))
+
+    report = {
+        'machine': machine_info(),
+        'thresholds': thresholds,
+        'tracks': results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    same_machine = _same_machine(report['machine'], baseline.get('machine', {}))
+    if baseline and not same_machine:
+        base_machine = baseline.get('machine', {})
+        print(f"Baseline recorded with Python {base_machine.get('python')} on {base_machine.get('cpus')} CPUs; "
+              f"timings are compared as ratios to the '{REFERENCE_STAGE}' stage. Record a baseline on this "
+              f"machine (--baseline PATH --update-baseline) to compare absolute timings.")
+    regressions = compare(results, baseline.get('tracks', {}), thresholds, same_machine)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+from typing import Any, Callable, Dict, Optional
+
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.loader import AudioLoader
+from src.audio.profiles import get_profile
+from src.audio.sampling import SampledAnalyzer, sampled_cache_variant
+from src.audio.shared_buffer import SharedAudioBuffer
+from src.audio.streaming import STREAMING_MIN_DURATION, StreamingAnalyzer
+from src.optimization.cache import ResultsCache
+from src.optimization.feature_store import FeatureNotStored, FeatureStore
+from src.utils.metrics import timed
+
+RESULT_KEYS = ('key', 'bpm', 'additional_info')
+
+
+@timed('analysis.analyze_file')
+def analyze_file(file_path: str, cache: Optional[ResultsCache] = None, buffer: Optional[SharedAudioBuffer] = None,
+                 profile: Optional[str] = None, sampled: bool = False, analyzer: Optional[AudioAnalyzer] = None,
+                 loader: Optional[AudioLoader] = None, feature_store: Optional[FeatureStore] = None,
+                 streaming_min_duration: float = STREAMING_MIN_DURATION,
+                 check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """
+    Analyse an audio file the way the app, the job workers and the batch runner all do.
+
+    Cached results are returned as they are. Otherwise sampled analysis reads
+    excerpts, long recordings are streamed block by block, and anything else
+    is analysed in memory, from the given samples, stored features or a
+    fresh decode. New results are cached.
+
+    Args:
+        file_path (str): Path to the audio file
+        cache (Optional[ResultsCache]): Results cache, None to skip it
+        buffer (Optional[SharedAudioBuffer]): Samples already decoded from the file
+        profile (Optional[str]): Analysis profile name, None for balanced; ignored with an analyzer
+        sampled (bool): Analyse a few excerpts, escalating to the whole track when uncertain
+        analyzer (Optional[AudioAnalyzer]): Analyzer to reuse, a new one for the profile by default
+        loader (Optional[AudioLoader]): Loader to reuse, one at the profile's sample rate by default
+        feature_store (Optional[FeatureStore]): Store of features reused instead of decoding the file
+        streaming_min_duration (float): Duration in seconds from which files are streamed
+        check_cancelled (Optional[Callable]): Called between decoding and analysis stages,
+            raises to stop the analysis
+
+    Returns:
+        Dict[str, Any]: key, bpm and additional_info results
+    """
+    file_path = str(file_path)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Missing file: {file_path}")
+
+    analyzer = analyzer or AudioAnalyzer(get_profile(profile))
+    loader = loader or AudioLoader(analyzer.profile.sample_rate)
+    variant = sampled_cache_variant(analyzer.profile) if sampled else analyzer.profile.cache_variant
+
+    # Cache lookups are keyed by content fingerprint (a stat() for known files) and profile
+    if cache is not None and (cached := cache.get_cached_result(file_path, variant)):
+        if all(k in cached for k in RESULT_KEYS):
+            return cached
+
+    if sampled:
+        # Excerpts are read from disk, even when the whole file was already decoded
+        sampler = SampledAnalyzer(analyzer, loader, streaming_min_duration=streaming_min_duration,
+                                  check_cancelled=check_cancelled)
+        results = sampler.analyze_file(file_path)
+    elif buffer is None and (duration := StreamingAnalyzer.get_duration(file_path)) is not None \
+            and duration >= streaming_min_duration:
+        # Long recordings are analysed with bounded memory
+        results = StreamingAnalyzer(analyzer, check_cancelled=check_cancelled).analyze_file(file_path)
+    else:
+        results = _analyze_in_memory(file_path, analyzer, loader, buffer, feature_store,
+                                     check_cancelled or (lambda: None))
+
+    if cache is not None:
+        cache.cache_result(file_path, results, variant)
+    return results
+
+
+def _analyze_in_memory(file_path: str, analyzer: AudioAnalyzer, loader: AudioLoader,
+                       buffer: Optional[SharedAudioBuffer], feature_store: Optional[FeatureStore],
+                       check_cancelled: Callable[[], None]) -> Dict[str, Any]:
+    profile = analyzer.profile
+    if buffer is not None:
+        # Decimated view of samples decoded for separation as well
+        return analyzer.analyze(buffer.analysis_view(loader.sample_rate), loader.sample_rate, check_cancelled)
+
+    if feature_store is not None:
+        stored = feature_store.load(file_path, profile.feature_params(loader.sample_rate), profile.feature_names)
+        if stored is not None:
+            try:
+                return analyzer.analyze_features(stored, check_cancelled)
+            except FeatureNotStored:
+                pass  # e.g. the harmonic chromagram of a key that only became ambiguous now
+
+    y, sr = loader.load_audio(file_path)
+    if y is None or sr is None:
+        raise ValueError("Failed to load audio data")
+    check_cancelled()
+    features = analyzer.features(y, sr)
+    results = analyzer.analyze_features(features, check_cancelled)
+    if feature_store is not None:
+        feature_store.save(file_path, features, profile.feature_names)
+    return results
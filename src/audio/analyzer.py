@@ -1,10 +1,20 @@
 import librosa
 import numpy as np
-from librosa.feature import spectral_centroid
-from scipy.ndimage import median_filter
+
+from src.audio.features import AudioFeatures
+from src.audio.profiles import HPSS_FALLBACK, HPSS_FULL, AnalysisProfile, get_profile
+from src.audio.tempo import TempoEngine
+from src.utils.metrics import timed
+
+TEMPO_WINDOW_SECONDS = 9.0  # tempogram window of the tempo engine, whatever the profile's frame rate
 
 class AudioAnalyzer:
-    def __init__(self): # used krammer's profile
+    def __init__(self, profile=None): # used krammer's profile
+        '''
+        :param profile: AnalysisProfile or profile name ("fast", "balanced", "accurate"), None for balanced
+        '''
+        self.profile: AnalysisProfile = get_profile(profile)
+
         self.major_profile = np.array([
             6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88
         ])
@@ -13,6 +23,72 @@ class AudioAnalyzer:
             6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17
         ])
 
+        self.keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+        self._profile_matrix = None
+        self._profile_signature = None
+        self._features = None
+        self._features_source = None
+        self._tempo_engine = None
+        self._onset_tempo_engine = None
+        self._tempo = None  # (features, (bpm, confidence)) of the last analysed bundle
+
+    def features(self, y: np.ndarray, sr: int) -> AudioFeatures:
+        '''
+        Get the shared feature bundle for a signal
+
+        Consecutive calls with the same array return the same bundle, so every
+        feature is computed at most once per signal. Signals above the
+        profile's sample rate are downsampled to it first.
+
+        :param y: audio signal
+        :param sr: sample rate
+        :return:
+            AudioFeatures: lazily computed features of the signal
+        '''
+        if self._features is None or self._features_source[0] is not y or self._features_source[1] != sr:
+            self._features_source = (y, sr)
+            if sr > self.profile.sample_rate:
+                y, sr = librosa.resample(y, orig_sr=sr, target_sr=self.profile.sample_rate), self.profile.sample_rate
+            self._features = self.profile.features(y, sr)
+        return self._features
+
+    @timed()
+    def analyze(self, y: np.ndarray, sr: int, check_cancelled=None) -> dict:
+        '''
+        Run the full analysis (key, BPM and additional info) on a signal
+
+        :param y: audio signal
+        :param sr: sample rate
+        :param check_cancelled: optional callable run between stages, raising to stop the analysis
+        :return:
+            dict: analysis results
+        '''
+        return self.analyze_features(self.features(y, sr), check_cancelled)
+
+    @timed()
+    def analyze_features(self, features, check_cancelled=None) -> dict:
+        '''
+        Run the full analysis on an already prepared feature bundle
+
+        :param features: AudioFeatures (or any object exposing the same attributes)
+        :param check_cancelled: optional callable run between stages, raising to stop the analysis
+        :return:
+            dict: analysis results
+        '''
+        check_cancelled = check_cancelled or (lambda: None)
+        key = self._key_from_features(features)
+        check_cancelled()
+        bpm = self._bpm_from_features(features)
+        check_cancelled()
+        return {
+            'key': key,
+            'bpm': bpm,
+            'additional_info': (self._additional_info_from_features(features) if self.profile.additional_info
+                                else {'duration': features.duration})
+        }
+
+    @timed()
     def detect_key(self, y, sr):
         '''
         Detects the key of the audio file using the chroma features and the major and minor profiles form krammer's profile
@@ -23,69 +99,124 @@ class AudioAnalyzer:
         Returns:
             :str key of the audio file
         '''
+        return self._key_from_features(self.features(y, sr))
 
-        # Counting chroma features using CQT (constant Q transform)
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=512)
-
-        # Normalizing the chroma features
-        chroma_normalized = np.mean(chroma, axis=1)
-        chroma_normalized /= np.sum(chroma_normalized)
-
-        # Keys
-        keys = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    @timed()
+    def detect_keys(self, chroma_profiles: np.ndarray) -> tuple:
+        '''
+        Scores all 24 keys for a batch of chroma profiles in one vectorized operation
 
-        # Calculating correlation for every possible key
-        key_correlation = []
-        mode_correlation = []
+        :param chroma_profiles: (N, 12) matrix of mean chroma vectors, one row per track or window
+        :return:
+            tuple: (keys, modes, confidences) - key names, "major"/"minor" and the
+            correlation of the best key for every row
+        '''
+        chroma = np.atleast_2d(np.asarray(chroma_profiles, dtype=float))
 
-        for i in range(12):
-            rolled_chroma = np.roll(chroma_normalized, i)
-            major_corr = np.corrcoef(rolled_chroma, self.major_profile)[0, 1]
-            minor_corr = np.corrcoef(rolled_chroma, self.minor_profile)[0, 1]
-            key_correlation.append(max(major_corr, minor_corr))
-            mode_correlation.append((major_corr, minor_corr))
+        # Pearson correlation is a dot product of centered, unit-norm vectors
+        chroma = chroma / np.sum(chroma, axis=1, keepdims=True)
+        chroma = chroma - np.mean(chroma, axis=1, keepdims=True)
+        chroma /= np.linalg.norm(chroma, axis=1, keepdims=True)
 
-        # Find the key with the highest correlation
-        best_shift = np.argmax(key_correlation)
-        key_index = (12 - best_shift) % 12
+        # (N, 2, 12): correlation with the major/minor profile of every tonic
+        correlations = np.einsum('np,mkp->nmk', chroma, self._get_profile_matrix())
+        major_corr, minor_corr = correlations[:, 0], correlations[:, 1]
 
-        # Define mode (major or minor)
-        major_corr, minor_corr = mode_correlation[best_shift]
-        mode = "major" if major_corr > minor_corr else "minor"
-        confidence = key_correlation[best_shift]
+        key_correlation = np.maximum(major_corr, minor_corr)
+        key_indices = np.argmax(key_correlation, axis=1)
+        rows = np.arange(len(chroma))
 
-        # Additional energy analysis
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)
-        mean_centroid = np.mean(spectral_centroids)
+        keys = [self.keys[i] for i in key_indices]
+        modes = np.where(major_corr[rows, key_indices] > minor_corr[rows, key_indices], "major", "minor").tolist()
+        confidences = key_correlation[rows, key_indices]
+        return keys, modes, confidences
 
-        # Harmonic analysis
-        harmonics = librosa.effects.harmonic(y)
-        harmonic_chromagram = librosa.feature.chroma_cqt(y=harmonics, sr=sr)
+    def _get_profile_matrix(self) -> np.ndarray:
+        '''
+        Get the (2, 12, 12) matrix of normalized major/minor profiles rotated to every tonic
 
-        if confidence < 0.5:
-            harmonics = librosa.effects.harmonic(y)
-            harmonic_chromagram = librosa.feature.chroma_cqt(y=harmonics, sr=sr)
+        The matrix is rebuilt only when major_profile or minor_profile change.
+        '''
+        signature = (self.major_profile.tobytes(), self.minor_profile.tobytes())
+        if self._profile_signature != signature:
+            profiles = np.array([
+                [np.roll(profile, tonic) for tonic in range(12)]
+                for profile in (self.major_profile, self.minor_profile)
+            ], dtype=float)
+            profiles -= np.mean(profiles, axis=2, keepdims=True)
+            profiles /= np.linalg.norm(profiles, axis=2, keepdims=True)
+            self._profile_matrix = profiles
+            self._profile_signature = signature
+        return self._profile_matrix
+
+    def _key_from_features(self, features) -> str:
+        chroma_mean = features.harmonic_chroma_mean if self.profile.hpss == HPSS_FULL else features.chroma_mean
+        keys, modes, confidences = self.detect_keys(chroma_mean[np.newaxis, :])
+        key, mode, confidence = keys[0], modes[0], confidences[0]
+
+        # Harmonic analysis, only needed when the key is ambiguous
+        if self.profile.hpss == HPSS_FALLBACK and confidence < 0.5:
             harmonic_correlation = np.corrcoef(
-                np.mean(harmonic_chromagram, axis=1),
+                features.harmonic_chroma_mean,
                 self.major_profile if mode == "major" else self.minor_profile
             )[0, 1]
 
             if harmonic_correlation > 0.5:
-                return f"{keys[key_index]} {mode} (uncertain)"
+                return f"{key} {mode} (uncertain)"
 
-        return f"{keys[key_index]} {mode}"
+        return f"{key} {mode}"
 
+    @timed()
     def detect_bpm(self, y: np.ndarray, sr: int) -> int:
-        hop_length = 512
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop_length)
+        return self._bpm_from_features(self.features(y, sr))
 
-        # Smoothing the onset envelope
-        onset_env = median_filter(onset_env, size=5)
+    @timed()
+    def detect_tempo(self, y: np.ndarray, sr: int) -> tuple:
+        '''
+        Estimate the tempo and its confidence in one pass with the JIT-compiled tempo engine
 
-        tempo = librosa.beat.tempo(onset_envelope=onset_env, sr=sr)
+        Faster than detect_bpm on a signal whose features aren't needed
+        otherwise, as it skips the librosa onset envelope.
 
-        return int(tempo[0])
+        :param y: audio signal
+        :param sr: sample rate
+        :return:
+            tuple: (bpm, confidence between 0 and 1)
+        '''
+        if self._tempo_engine is None or self._tempo_engine.sr != sr:
+            self._tempo_engine = TempoEngine(sr=sr)
+        bpm, confidence = self._tempo_engine.estimate(y)
+        return int(round(bpm)), confidence
+
+    @timed('AudioAnalyzer.estimate_tempo')
+    def _tempo_from_features(self, features) -> tuple:
+        '''
+        Tempo and confidence of a feature bundle, from its onset envelope, with the tempo engine
 
+        Only needs the onset envelope, so stored and streamed features work too.
+        The result is kept for the last bundle, as both the BPM and the
+        tempo confidence of analyze_features read it.
+
+        :param features: AudioFeatures (or any object exposing the same attributes)
+        :return:
+            tuple: (bpm, confidence between 0 and 1)
+        '''
+        if self._tempo is not None and self._tempo[0] is features:
+            return self._tempo[1]
+
+        engine = self._onset_tempo_engine
+        if engine is None or engine.sr != features.sr or engine.hop_length != features.hop_length:
+            window_frames = int(round(TEMPO_WINDOW_SECONDS * features.sr / features.hop_length))
+            engine = self._onset_tempo_engine = TempoEngine(sr=features.sr, hop_length=features.hop_length,
+                                                      window_frames=window_frames)
+        tempo = engine.estimate_from_onsets(features.onset_env)
+        self._tempo = (features, tempo)
+        return tempo
+
+    def _bpm_from_features(self, features) -> int:
+        return int(round(self._tempo_from_features(features)[0]))
+
+    @timed()
     def get_additional_info(self, y: np.ndarray, sr: int) -> dict:
         '''
         Get additional information about the audio file
@@ -95,22 +226,17 @@ class AudioAnalyzer:
         :return:
             dict: additional information
         '''
+        return self._additional_info_from_features(self.features(y, sr))
 
-        #onset envelope
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-
-        #spectral centroid
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)
-
+    def _additional_info_from_features(self, features) -> dict:
         return {
-            'duration': librosa.get_duration(y=y, sr=sr),
-            'tempo_confidence': self._get_tempo_confidence(y, sr),
-            'key_strength': self._get_key_strength(y, sr),
-            'spectral_bandwidth': np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)),
-            'zero_crossing_rate': np.mean(librosa.feature.zero_crossing_rate(y))
+            'duration': features.duration,
+            'tempo_confidence': self._tempo_confidence_from_features(features),
+            'key_strength': self._key_strength_from_features(features),
+            'spectral_bandwidth': np.mean(features.spectral_bandwidth),
+            'zero_crossing_rate': np.mean(features.zero_crossing_rate)
         }
 
-
     def _get_tempo_confidence(self, y: np.ndarray, sr: int) -> float:
         '''
         Get the confidence of the tempo
@@ -120,11 +246,10 @@ class AudioAnalyzer:
         :return:
             float: confidence of the tempo
         '''
+        return self._tempo_confidence_from_features(self.features(y, sr))
 
-        onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-        pulse = librosa.beat.plp(onset_envelope=onset_env, sr=sr)
-
-        return float(np.mean(pulse))
+    def _tempo_confidence_from_features(self, features) -> float:
+        return self._tempo_from_features(features)[1]
 
     def _get_key_strength(self, y: np.ndarray, sr: int) -> float:
         '''
@@ -135,8 +260,7 @@ class AudioAnalyzer:
         :return:
             float: strength of the key
         '''
+        return self._key_strength_from_features(self.features(y, sr))
 
-        chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-        return float(np.max(np.mean(chroma, axis=1)))
-
-
+    def _key_strength_from_features(self, features) -> float:
+        return float(np.max(features.chroma_mean))
@@ -0,0 +1,124 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+def split_windows(waveform: np.ndarray, window: int, overlap: int) -> Iterator[np.ndarray]:
+    """
+    Split a waveform into consecutive windows overlapping by `overlap` samples.
+
+    Every window but the last is `window` samples long, and the last one is
+    always longer than the overlap, so each crossfade lies inside two windows.
+
+    Args:
+        waveform (np.ndarray): audio with samples along the first axis
+        window (int): window length in samples
+        overlap (int): overlap between consecutive windows in samples
+
+    Yields:
+        np.ndarray: views into the waveform
+    """
+    if not 0 <= overlap < window:
+        raise ValueError("overlap must be shorter than the window")
+
+    step = window - overlap
+    start = 0
+    while len(waveform) - start > window:
+        yield waveform[start:start + window]
+        start += step
+    yield waveform[start:]
+
+
+def crossfade_curves(overlap: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get complementary raised-cosine fade-in/fade-out curves.
+
+    The curves sum to one at every sample, so the overlap-add of two copies of
+    the same signal reproduces it exactly.
+    """
+    fade_in = np.sin(0.5 * np.pi * (np.arange(overlap) + 0.5) / max(overlap, 1)) ** 2
+    return fade_in.astype(np.float32), (1.0 - fade_in).astype(np.float32)
+
+
+def overlap_add(windows: Iterable[np.ndarray], process: Callable[[np.ndarray], Dict[str, np.ndarray]],
+                overlap: int, max_workers: int = 1,
+                sink: Optional[Callable[[str, np.ndarray], None]] = None,
+                check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, np.ndarray]:
+    """
+    Run a multi-output model over overlapping windows and crossfade the results.
+
+    At most `max_workers` windows are processed at a time, and finished
+    regions are passed to `sink` in order as soon as they no longer depend on
+    later windows, so memory is bounded by the window size when a sink is used.
+
+    Args:
+        windows (Iterable[np.ndarray]): consecutive windows overlapping by `overlap` samples,
+            as produced by split_windows
+        process (Callable): maps a window to a dict of outputs with the same number of samples
+        overlap (int): overlap between consecutive windows in samples
+        max_workers (int): windows processed concurrently in threads
+        sink (Optional[Callable]): receives (output name, block) for every finished region;
+            when omitted the stitched outputs are returned
+        check_cancelled (Optional[Callable]): called before every window, raises to stop the run
+
+    Returns:
+        Dict[str, np.ndarray]: stitched outputs, empty when a sink is used
+    """
+    check_cancelled = check_cancelled or (lambda: None)
+    fade_in, fade_out = crossfade_curves(overlap)
+    collected = {}
+    tails = {}
+
+    def emit(name: str, block: np.ndarray) -> None:
+        if sink is not None:
+            sink(name, block)
+        else:
+            collected.setdefault(name, []).append(block)
+
+    def consume(length: int, first: bool, last: bool, outputs: Dict[str, np.ndarray]) -> None:
+        for name, output in outputs.items():
+            output = _fit_length(np.asarray(output), length)
+            shape = (-1,) + (1,) * (output.ndim - 1)
+            start = 0
+            if not first and overlap:
+                emit(name, tails.pop(name) + output[:overlap] * fade_in.reshape(shape))
+                start = overlap
+            if last or not overlap:
+                emit(name, output[start:])
+            else:
+                emit(name, output[start:length - overlap])
+                tails[name] = output[length - overlap:] * fade_out.reshape(shape)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for index, (window, last) in enumerate(_mark_last(windows)):
+            check_cancelled()
+            pending.append((len(window), index == 0, last, executor.submit(process, window)))
+            while len(pending) >= max_workers or (last and pending):
+                length, first, is_last, future = pending.popleft()
+                consume(length, first, is_last, future.result())
+
+    return {name: np.concatenate(blocks) for name, blocks in collected.items()}
+
+
+def _mark_last(items: Iterable) -> Iterator[Tuple[object, bool]]:
+    """Pair every item with a flag telling whether it is the last one."""
+    iterator = iter(items)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield current, False
+        current = following
+    yield current, True
+
+
+def _fit_length(output: np.ndarray, length: int) -> np.ndarray:
+    """Trim or zero-pad a model output to the length of its input window."""
+    if len(output) >= length:
+        return output[:length]
+    padding = [(0, length - len(output))] + [(0, 0)] * (output.ndim - 1)
+    return np.pad(output, padding)
@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from typing import Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from src.utils.metrics import timed
+
+# Containers libsndfile can't open; these go straight to ffmpeg
+FFMPEG_EXTENSIONS = ('.m4a', '.mp4', '.aac', '.webm', '.wma', '.opus', '.mka')
+
+# WAV sample formats that map directly onto a numpy dtype: (format tag, bits) -> (dtype, scale)
+_WAV_DTYPES = {
+    (1, 8): (np.uint8, None),
+    (1, 16): (np.dtype('<i2'), 32768.0),
+    (1, 32): (np.dtype('<i4'), 2147483648.0),
+    (3, 32): (np.dtype('<f4'), None),
+    (3, 64): (np.dtype('<f8'), None),
+}
+
+
+class AudioDecodeError(RuntimeError):
+    """Raised when no backend can decode a file."""
+
+
+class AudioInfo(NamedTuple):
+    """Stream parameters of an audio file."""
+    sample_rate: int
+    channels: int
+    duration: Optional[float]  # seconds, None when the container doesn't say
+
+
+def _needs_ffmpeg(file_path: str) -> bool:
+    return file_path.lower().endswith(FFMPEG_EXTENSIONS)
+
+
+def probe_audio(file_path: str) -> AudioInfo:
+    """
+    Get the sample rate, channels and duration of a file without decoding it.
+
+    libsndfile reads the header of the formats it supports, ffprobe the rest
+    (e.g. the m4a/webm streams YouTube downloads are kept as).
+
+    Raises:
+        AudioDecodeError: when neither backend can read the file
+    """
+    if not os.path.exists(file_path):
+        raise AudioDecodeError(f"Missing file: {file_path}")
+    if not _needs_ffmpeg(file_path):
+        try:
+            info = sf.info(file_path)
+            return AudioInfo(info.samplerate, info.channels, info.duration)
+        except RuntimeError:
+            pass
+    return _probe_ffmpeg(file_path)
+
+
+def iter_blocks(file_path: str, block_frames: int, mono: bool = False) -> Iterator[np.ndarray]:
+    """
+    Decode a file block by block at its native rate, so memory stays bounded by one block.
+
+    Args:
+        file_path (str): Path to the audio file
+        block_frames (int): Frames per block; the last block may be shorter
+        mono (bool): Mix down to one channel
+
+    Yields:
+        np.ndarray: float32 blocks shaped (n_frames, n_channels)
+    """
+    sound_file = None
+    if not _needs_ffmpeg(file_path):
+        try:
+            sound_file = sf.SoundFile(file_path)
+        except RuntimeError:
+            pass
+    if sound_file is None:
+        yield from _iter_ffmpeg(file_path, block_frames, mono)
+        return
+    with sound_file:
+        for block in sound_file.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            yield np.mean(block, axis=1, keepdims=True, dtype=np.float32) if mono else block
+
+
+@timed()
+def decode_audio(file_path: str, sr: Optional[int] = None, mono: bool = True,
+                 offset: float = 0.0, duration: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """
+    Decode (part of) an audio file with the fastest backend for its format.
+
+    PCM WAV files are memory-mapped so only the requested range is read,
+    other formats libsndfile supports (FLAC, OGG, MP3, ...) are read with
+    soundfile, and everything else is piped through ffmpeg as float32.
+    Resampling is done with soxr at the same quality as librosa.load.
+
+    Args:
+        file_path (str): Path to the audio file
+        sr (Optional[int]): Target sample rate, None to keep the native rate
+        mono (bool): Mix down to one channel
+        offset (float): Start reading this many seconds into the file
+        duration (Optional[float]): Read at most this many seconds
+
+    Returns:
+        Tuple[np.ndarray, int]: float32 samples, shaped (n_samples,) when mono and
+        (n_samples, n_channels) otherwise, and their sample rate
+    """
+    if not os.path.exists(file_path):
+        raise AudioDecodeError(f"Missing file: {file_path}")
+
+    if _needs_ffmpeg(file_path):
+        y, native_sr = _decode_ffmpeg(file_path, mono, offset, duration)
+    else:
+        try:
+            y, native_sr = _decode_wav_mmap(file_path, offset, duration)
+        except (ValueError, OSError, struct.error):
+            try:
+                y, native_sr = _decode_soundfile(file_path, offset, duration)
+            except RuntimeError:
+                y, native_sr = _decode_ffmpeg(file_path, mono, offset, duration)
+
+    if mono and y.ndim > 1:
+        y = np.mean(y, axis=1, dtype=np.float32) if y.shape[1] > 1 else y[:, 0]
+
+    if sr is not None and sr != native_sr and len(y):
+        y = soxr.resample(y, native_sr, sr, quality='HQ')
+        native_sr = sr
+
+    return np.ascontiguousarray(y, dtype=np.float32), native_sr
+
+
+def _frame_range(native_sr: int, total_frames: int, offset: float, duration: Optional[float]) -> Tuple[int, int]:
+    start = min(int(round(offset * native_sr)), total_frames)
+    stop = total_frames if duration is None else min(start + int(round(duration * native_sr)), total_frames)
+    return start, stop
+
+
+def _decode_wav_mmap(file_path: str, offset: float, duration: Optional[float]) -> Tuple[np.ndarray, int]:
+    """Memory-map the data chunk of a PCM/float WAV file."""
+    with open(file_path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError("Not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("WAV file has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                data = f.read(chunk_size)
+                format_tag, channels, native_sr = struct.unpack('<HHI', data[:8])
+                bits = struct.unpack('<H', data[14:16])[0]
+                if format_tag == 0xFFFE and len(data) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+                    format_tag = struct.unpack('<H', data[24:26])[0]
+                fmt = (format_tag, channels, native_sr, bits)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    if fmt is None or (fmt[0], fmt[3]) not in _WAV_DTYPES:
+        raise ValueError("Unsupported WAV sample format")
+
+    format_tag, channels, native_sr, bits = fmt
+    dtype, scale = _WAV_DTYPES[(format_tag, bits)]
+    frame_bytes = channels * np.dtype(dtype).itemsize
+    total_frames = min(chunk_size, os.path.getsize(file_path) - data_offset) // frame_bytes
+    start, stop = _frame_range(native_sr, total_frames, offset, duration)
+
+    samples = np.memmap(file_path, dtype=dtype, mode='r', offset=data_offset, shape=(total_frames, channels))
+    y = samples[start:stop].astype(np.float32)
+    if dtype == np.uint8:
+        y = (y - 128.0) / 128.0
+    elif scale is not None:
+        y /= scale
+    return y, native_sr
+
+
+def _decode_soundfile(file_path: str, offset: float, duration: Optional[float]) -> Tuple[np.ndarray, int]:
+    """Read a range of frames with libsndfile."""
+    with sf.SoundFile(file_path) as f:
+        start, stop = _frame_range(f.samplerate, f.frames, offset, duration)
+        f.seek(start)
+        y = f.read(stop - start, dtype='float32', always_2d=True)
+        return y, f.samplerate
+
+
+def _probe_ffmpeg(file_path: str) -> AudioInfo:
+    if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+        raise AudioDecodeError(f"Cannot decode {file_path}: ffmpeg is not installed")
+
+    probe = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=sample_rate,channels:format=duration', '-of', 'json', file_path],
+        capture_output=True, check=False
+    )
+    try:
+        output = json.loads(probe.stdout)
+        stream = output['streams'][0]
+        native_sr, channels = int(stream['sample_rate']), int(stream['channels'])
+    except (ValueError, KeyError, IndexError):
+        raise AudioDecodeError(f"Cannot decode {file_path}: no audio stream found")
+    try:
+        duration = float(output['format']['duration'])
+    except (ValueError, KeyError, TypeError):
+        duration = None
+    return AudioInfo(native_sr, channels, duration)
+
+
+def _ffmpeg_command(file_path: str, channels: int, offset: float = 0.0,
+                    duration: Optional[float] = None) -> list:
+    command = ['ffmpeg', '-nostdin', '-v', 'error']
+    if offset:
+        command += ['-ss', str(offset)]
+    command += ['-i', file_path]
+    if duration is not None:
+        command += ['-t', str(duration)]
+    return command + ['-vn', '-f', 'f32le', '-acodec', 'pcm_f32le', '-ac', str(channels), '-']
+
+
+def _iter_ffmpeg(file_path: str, block_frames: int, mono: bool) -> Iterator[np.ndarray]:
+    """Stream a file through ffmpeg, reading one block of raw float32 samples at a time."""
+    channels = 1 if mono else _probe_ffmpeg(file_path).channels
+    block_bytes = block_frames * channels * 4
+    # stderr goes to a file, so a chatty ffmpeg can't fill a pipe nobody reads
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(_ffmpeg_command(file_path, channels), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while data := process.stdout.read(block_bytes):
+                yield np.frombuffer(data[:len(data) - len(data) % (channels * 4)], dtype='<f4').reshape(-1, channels)
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise AudioDecodeError(f"Cannot decode {file_path}: {stderr.read().decode(errors='replace').strip()}")
+        finally:
+            # The consumer may stop early
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+
+def _decode_ffmpeg(file_path: str, mono: bool, offset: float, duration: Optional[float]) -> Tuple[np.ndarray, int]:
+    """Pipe a file through ffmpeg as raw float32 samples at its native rate."""
+    info = _probe_ffmpeg(file_path)
+    native_sr = info.sample_rate
+    channels = 1 if mono else info.channels
+    result = subprocess.run(_ffmpeg_command(file_path, channels, offset, duration), capture_output=True, check=False)
+    if result.returncode != 0:
+        raise AudioDecodeError(f"Cannot decode {file_path}: {result.stderr.decode(errors='replace').strip()}")
+
+    y = np.frombuffer(result.stdout, dtype='<f4')
+    return y[:len(y) - len(y) % channels].reshape(-1, channels), native_sr
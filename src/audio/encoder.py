@@ -0,0 +1,210 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from src.utils.metrics import timed
+
+
+@dataclass(frozen=True)
+class StemFormat:
+    """Download format of a stem: file extension, MIME type and libsndfile format/subtype."""
+    extension: str
+    mime: str
+    format: str
+    subtype: Optional[str] = None
+    sample_rates: Optional[Tuple[int, ...]] = None  # rates the codec accepts, None for any
+
+
+FORMATS: Dict[str, StemFormat] = {
+    'flac': StemFormat('flac', 'audio/flac', 'FLAC'),
+    # libopus only runs at these rates; other rates are resampled to the highest one
+    'opus': StemFormat('opus', 'audio/ogg', 'OGG', 'OPUS', (48000, 24000, 16000, 12000, 8000)),
+    'wav': StemFormat('wav', 'audio/wav', 'WAV'),
+}
+
+
+def get_format(name: str) -> StemFormat:
+    """Look up a download format by name."""
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown stem format {name!r}, expected one of {', '.join(FORMATS)}") from None
+
+
+def encoded_path(source: str, fmt: str) -> str:
+    """Path of the encoded copy of a stem, next to the stem itself."""
+    root, extension = os.path.splitext(source)
+    target = get_format(fmt).extension
+    return source if extension.lower() == f".{target}" else f"{root}.{target}"
+
+
+@timed()
+def encode_stem(source: str, fmt: str, block_seconds: float = 10.0) -> str:
+    """
+    Encode a stem to a download format, block by block.
+
+    Memory stays bounded by one block whatever the stem's length. The
+    encoded file is written under a temporary name and renamed once
+    complete, so readers never see a partial file.
+
+    Args:
+        source (str): Stem written by the separator
+        fmt (str): 'flac', 'opus' or 'wav'
+        block_seconds (float): Length of the blocks read from the stem
+
+    Returns:
+        str: Path of the encoded file
+    """
+    target = get_format(fmt)
+    destination = encoded_path(source, fmt)
+    if destination == source:
+        return source
+
+    info = sf.info(source)
+    sample_rate = info.samplerate
+    resampler = None
+    if target.sample_rates is not None and sample_rate not in target.sample_rates:
+        sample_rate = target.sample_rates[0]
+        resampler = soxr.ResampleStream(info.samplerate, sample_rate, info.channels, dtype='float32', quality='HQ')
+    # FLAC stores integers; keep 24-bit precision for float and 24/32-bit stems
+    subtype = target.subtype or ('PCM_16' if info.subtype in ('PCM_16', 'PCM_S8', 'PCM_U8') else 'PCM_24')
+
+    partial = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with sf.SoundFile(partial, 'w', samplerate=sample_rate, channels=info.channels,
+                          format=target.format, subtype=subtype) as output:
+            blocks = sf.blocks(source, blocksize=max(int(block_seconds * info.samplerate), 1),
+                               dtype='float32', always_2d=True)
+            block = next(blocks, None)
+            while block is not None:
+                next_block = next(blocks, None)
+                if resampler is not None:
+                    block = resampler.resample_chunk(block, last=next_block is None)
+                output.write(np.clip(block, -1.0, 1.0))
+                block = next_block
+        os.replace(partial, destination)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return destination
+
+
+_LINK_KEY = os.urandom(16)  # makes published names unguessable from a stem's path
+
+
+def published_dir(path: str, static_dir: str) -> str:
+    """Directory publish() links a file into, named after a keyed hash of the file."""
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}".encode()
+    return os.path.join(static_dir, hashlib.blake2b(identity, key=_LINK_KEY, digest_size=16).hexdigest())
+
+
+def publish(path: str, static_dir: str, file_name: str) -> str:
+    """
+    Expose an encoded stem under a static file directory, e.g. Streamlit's `static/`.
+
+    The file is hard linked (copied across filesystems) into a directory
+    named after a keyed hash of the file, so the web server serves it without
+    the app reading it. Publishing the same file again reuses its directory.
+    Register the directory (see published_dir) with StemStore.track_link
+    first, so it is removed with the lease on the stems.
+
+    Args:
+        path (str): Encoded stem
+        static_dir (str): Directory served as static files
+        file_name (str): Name the file is offered under
+
+    Returns:
+        str: Path of the published file, relative to static_dir
+    """
+    link_dir = published_dir(path, static_dir)
+    link = os.path.join(link_dir, file_name)
+
+    os.makedirs(link_dir, exist_ok=True)
+    if not os.path.exists(link):
+        partial = f"{link}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            os.link(path, partial)
+        except OSError:
+            shutil.copyfile(path, partial)
+        os.replace(partial, link)
+    return os.path.join(os.path.basename(link_dir), file_name)
+
+
+class StemEncoder:
+    def __init__(self, max_workers: int = 2):
+        """
+        Encodes stems to download formats on background threads.
+
+        Encoded files are cached next to the stems, so each stem is encoded
+        at most once per format, and concurrent requests for the same stem
+        share one encoding.
+
+        Args:
+            max_workers (int): Stems encoded concurrently
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stem-encoder')
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._lock = threading.RLock()  # done callbacks may run inside submit
+
+    def is_ready(self, source: str, fmt: str) -> bool:
+        """Whether the encoded copy of a stem exists and is up to date."""
+        destination = encoded_path(source, fmt)
+        try:
+            return destination == source or os.path.getmtime(destination) >= os.path.getmtime(source)
+        except OSError:
+            return False
+
+    def submit(self, source: str, fmt: str) -> Future:
+        """
+        Start encoding a stem unless it is already encoded or being encoded.
+
+        Returns:
+            Future: resolves to the path of the encoded file
+        """
+        get_format(fmt)
+        source = os.path.abspath(source)
+        with self._lock:
+            if self.is_ready(source, fmt):
+                future = Future()
+                future.set_result(encoded_path(source, fmt))
+                return future
+            key = (source, fmt)
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(encode_stem, source, fmt)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def get(self, source: str, fmt: str, timeout: Optional[float] = None) -> str:
+        """Path of the encoded stem, waiting for its encoding if needed."""
+        return self.submit(source, fmt).result(timeout)
+
+    def _forget(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_encoder: Optional[StemEncoder] = None
+_encoder_lock = threading.Lock()
+
+
+def get_stem_encoder() -> StemEncoder:
+    """Get the process-wide stem encoder, shared by every session."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = StemEncoder(max_workers=int(os.environ.get('STEM_ENCODER_WORKERS', 2)))
+        return _encoder
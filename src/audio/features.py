@@ -0,0 +1,96 @@
+from functools import cached_property
+
+import librosa
+import numpy as np
+
+from src.utils.metrics import timed
+
+
+class AudioFeatures:
+    def __init__(self, y: np.ndarray, sr: int, hop_length: int = 512,
+                 bins_per_octave: int = 36, n_octaves: int = 7):
+        """
+        Lazily computed feature bundle for a single audio signal.
+
+        Every feature is computed at most once, the first time it is accessed,
+        so all AudioAnalyzer methods working on the same signal share the work.
+
+        Args:
+            y (np.ndarray): audio signal
+            sr (int): sample rate
+            hop_length (int): hop length used for every frame-based feature
+            bins_per_octave (int): constant Q bins per octave of the chromagrams
+            n_octaves (int): octaves covered by the constant Q transform
+        """
+        self.y = y
+        self.sr = sr
+        self.hop_length = hop_length
+        self.bins_per_octave = bins_per_octave
+        self.n_octaves = n_octaves
+
+    @property
+    def params(self) -> dict:
+        """Parameters that determine the feature values, used to key stored features."""
+        return {'sr': self.sr, 'hop_length': self.hop_length,
+                'bins_per_octave': self.bins_per_octave, 'n_octaves': self.n_octaves}
+
+    def _chroma_cqt(self, y: np.ndarray) -> np.ndarray:
+        return librosa.feature.chroma_cqt(y=y, sr=self.sr, hop_length=self.hop_length,
+                                          bins_per_octave=self.bins_per_octave, n_octaves=self.n_octaves)
+
+    @cached_property
+    @timed()
+    def chroma(self) -> np.ndarray:
+        """Chromagram computed with the constant Q transform."""
+        return self._chroma_cqt(self.y)
+
+    @cached_property
+    def chroma_mean(self) -> np.ndarray:
+        """Mean energy per pitch class."""
+        return np.mean(self.chroma, axis=1)
+
+    @cached_property
+    @timed()
+    def harmonic(self) -> np.ndarray:
+        """Harmonic component of the signal (HPSS)."""
+        return librosa.effects.harmonic(self.y)
+
+    @cached_property
+    @timed()
+    def harmonic_chroma(self) -> np.ndarray:
+        """Chromagram of the harmonic component."""
+        return self._chroma_cqt(self.harmonic)
+
+    @cached_property
+    def harmonic_chroma_mean(self) -> np.ndarray:
+        """Mean energy per pitch class of the harmonic component."""
+        return np.mean(self.harmonic_chroma, axis=1)
+
+    @cached_property
+    @timed()
+    def onset_env(self) -> np.ndarray:
+        """Onset strength envelope."""
+        return librosa.onset.onset_strength(y=self.y, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    @timed()
+    def spectral_centroid(self) -> np.ndarray:
+        """Spectral centroid per frame."""
+        return librosa.feature.spectral_centroid(y=self.y, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    @timed()
+    def spectral_bandwidth(self) -> np.ndarray:
+        """Spectral bandwidth per frame."""
+        return librosa.feature.spectral_bandwidth(y=self.y, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    @timed()
+    def zero_crossing_rate(self) -> np.ndarray:
+        """Zero crossing rate per frame."""
+        return librosa.feature.zero_crossing_rate(self.y, hop_length=self.hop_length)
+
+    @cached_property
+    def duration(self) -> float:
+        """Duration of the signal in seconds."""
+        return librosa.get_duration(y=self.y, sr=self.sr)
@@ -1,9 +1,26 @@
 import librosa
 
+from src.audio.decoder import AudioDecodeError, decode_audio
+from src.utils.metrics import timed
+
 class AudioLoader:
-    def __init__(self):
-        self.sample_rate = 22050
+    def __init__(self, sample_rate=22050):
+        self.sample_rate = sample_rate
+
+    @timed()
+    def load_audio(self, file_path, offset=0.0, duration=None):
+        '''
+        Load (part of) an audio file as mono at the analysis sample rate
 
-    def load_audio(self, file_path):
-        y, sr = librosa.load(file_path, sr=self.sample_rate)
-        return y, sr
+        :param file_path: path to the audio file
+        :param offset: start reading this many seconds into the file
+        :param duration: read at most this many seconds, None for the rest of the file
+        :return:
+            tuple: (y, sr)
+        '''
+        try:
+            return decode_audio(file_path, sr=self.sample_rate, offset=offset, duration=duration)
+        except AudioDecodeError:
+            # librosa/audioread stays as the slow path for anything the decoder can't handle
+            y, sr = librosa.load(file_path, sr=self.sample_rate, offset=offset, duration=duration)
+            return y, sr
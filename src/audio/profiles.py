@@ -0,0 +1,120 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+from src.audio.features import AudioFeatures
+
+HPSS_OFF = 'off'  # keys are scored on the full mix only
+HPSS_FALLBACK = 'fallback'  # harmonic chroma double-checks ambiguous keys
+HPSS_FULL = 'full'  # keys are scored on the harmonic component
+
+# Part of every results cache key; bump whenever the results of an unchanged
+# profile change, so results of the old analysis are no longer served.
+# 2: tempo and tempo confidence from the tempo engine
+ANALYSIS_VERSION = 2
+
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    """
+    Quality tier of the analysis.
+
+    Attributes:
+        name (str): profile name
+        sample_rate (int): analysis sample rate; higher rate signals are downsampled
+        hop_length (int): hop length of every frame-based feature
+        bins_per_octave (int): constant Q bins per octave of the chromagram
+        n_octaves (int): octaves covered by the constant Q transform
+        hpss (str): when the harmonic/percussive separation runs, one of HPSS_OFF,
+            HPSS_FALLBACK or HPSS_FULL
+        additional_info (bool): whether the additional_info statistics are computed
+    """
+    name: str
+    sample_rate: int = 22050
+    hop_length: int = 512
+    bins_per_octave: int = 36
+    n_octaves: int = 7
+    hpss: str = HPSS_FALLBACK
+    additional_info: bool = True
+
+    def __post_init__(self):
+        if self.hpss not in (HPSS_OFF, HPSS_FALLBACK, HPSS_FULL):
+            raise ValueError(f"Unknown HPSS mode: {self.hpss}")
+        if self.bins_per_octave % 12:
+            raise ValueError("bins_per_octave must be a multiple of 12")
+
+    @property
+    def cache_variant(self) -> str:
+        """
+        Suffix of the results cache key: the profile and ANALYSIS_VERSION.
+
+        Named profiles use their name, modified ones also a hash of their
+        parameters.
+        """
+        if PROFILES.get(self.name) == self:
+            return f"{self.name}-v{ANALYSIS_VERSION}"
+        params = json.dumps(asdict(self), sort_keys=True).encode()
+        return f"{self.name}-{hashlib.blake2b(params, digest_size=4).hexdigest()}-v{ANALYSIS_VERSION}"
+
+    def features(self, y: np.ndarray, sr: int) -> AudioFeatures:
+        """Feature bundle of a signal already at this profile's sample rate."""
+        return AudioFeatures(y, sr, hop_length=self.hop_length,
+                             bins_per_octave=self.bins_per_octave, n_octaves=self.n_octaves)
+
+    def feature_params(self, sr: int) -> Dict[str, int]:
+        """The AudioFeatures.params of this profile's features at a sample rate, without any signal."""
+        return self.features(None, sr).params
+
+    @property
+    def feature_names(self) -> Tuple[str, ...]:
+        """
+        Features the analysis always reads with this profile.
+
+        The harmonic chromagram of the fallback mode is only read for
+        ambiguous keys, so it is not listed.
+        """
+        names = ['onset_env']
+        if self.hpss != HPSS_FULL or self.additional_info:
+            names.append('chroma')
+        if self.hpss == HPSS_FULL:
+            names.append('harmonic_chroma')
+        if self.additional_info:
+            names += ['spectral_bandwidth', 'zero_crossing_rate']
+        return tuple(names)
+
+
+PROFILES: Dict[str, AnalysisProfile] = {
+    # Interactive previews and bulk triage: half the sample rate, a semitone
+    # resolution CQT over six octaves and no HPSS or additional statistics
+    'fast': AnalysisProfile('fast', sample_rate=11025, hop_length=256, bins_per_octave=12,
+                            n_octaves=6, hpss=HPSS_OFF, additional_info=False),
+    'balanced': AnalysisProfile('balanced'),
+    # Reference-grade results: twice the frame rate and CQT resolution, and
+    # keys scored on the harmonic component
+    'accurate': AnalysisProfile('accurate', hop_length=256, bins_per_octave=72, hpss=HPSS_FULL),
+}
+
+DEFAULT_PROFILE = PROFILES['balanced']
+
+
+def get_profile(profile: Union[str, AnalysisProfile, None] = None) -> AnalysisProfile:
+    """
+    Resolve a profile name.
+
+    Args:
+        profile (Union[str, AnalysisProfile, None]): profile name, profile, or None for the default
+
+    Returns:
+        AnalysisProfile: the profile
+    """
+    if profile is None:
+        return DEFAULT_PROFILE
+    if isinstance(profile, AnalysisProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown analysis profile: {profile} (expected one of {', '.join(PROFILES)})")
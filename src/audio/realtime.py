@@ -0,0 +1,192 @@
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import librosa
+import numpy as np
+import soxr
+
+from src.audio.analyzer import AudioAnalyzer
+
+
+class RingBuffer:
+    def __init__(self, size: int):
+        """Fixed-size float32 history; the oldest values are overwritten."""
+        self.size = size
+        self._data = np.zeros(size, dtype=np.float32)
+        self._end = 0  # index one past the newest value
+
+    def extend(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float32)[-self.size:]
+        first = min(len(values), self.size - self._end)
+        self._data[self._end:self._end + first] = values[:first]
+        self._data[:len(values) - first] = values[first:]
+        self._end = (self._end + len(values)) % self.size
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """The newest n values, oldest first (zeros before anything was written)."""
+        n = self.size if n is None else n
+        return np.concatenate((self._data[self._end:], self._data[:self._end]))[self.size - n:]
+
+
+class OnlineAnalyzer:
+    def __init__(self, analyzer: Optional[AudioAnalyzer] = None, sample_rate: int = 22050,
+                 input_sample_rate: Optional[int] = None, hop_length: int = 512, n_fft: int = 4096,
+                 chroma_half_life: float = 10.0, tempo_half_life: float = 6.0,
+                 min_bpm: float = 60.0, max_bpm: float = 200.0):
+        """
+        Key and tempo estimates updated every hop from audio arriving in chunks.
+
+        Every hop costs one STFT frame, a chroma and mel projection and an
+        update of the autocorrelation over the tempo lags, so latency per
+        frame is bounded whatever the stream length. Chroma and the onset
+        autocorrelation are exponentially decayed sums, so the estimates
+        follow key and tempo changes.
+
+        Args:
+            analyzer (Optional[AudioAnalyzer]): Key profiles used for scoring
+            sample_rate (int): Analysis sample rate
+            input_sample_rate (Optional[int]): Rate of the pushed audio, defaults to sample_rate
+            hop_length (int): Samples between estimate updates
+            n_fft (int): STFT frame length
+            chroma_half_life (float): Seconds after which a frame weighs half in the key estimate
+            tempo_half_life (float): Seconds after which an onset weighs half in the tempo estimate
+            min_bpm (float): Slowest tempo considered
+            max_bpm (float): Fastest tempo considered
+        """
+        self.analyzer = analyzer or AudioAnalyzer()
+        self.sample_rate = sample_rate
+        self.input_sample_rate = input_sample_rate or sample_rate
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+
+        frame_rate = sample_rate / hop_length
+        self._chroma_decay = 0.5 ** (1.0 / (chroma_half_life * frame_rate))
+        self._tempo_decay = 0.5 ** (1.0 / (tempo_half_life * frame_rate))
+        self._mean_decay = 0.5 ** (1.0 / (1.0 * frame_rate))
+
+        self._window = np.hanning(n_fft).astype(np.float32)
+        self._chroma_fb = librosa.filters.chroma(sr=sample_rate, n_fft=n_fft).astype(np.float32)
+        self._mel_fb = librosa.filters.mel(sr=sample_rate, n_fft=n_fft, n_mels=64).astype(np.float32)
+
+        self._min_lag = max(int(np.floor(60.0 * frame_rate / max_bpm)), 1)
+        self._max_lag = int(np.ceil(60.0 * frame_rate / min_bpm))
+        self._lags = np.arange(1, self._max_lag + 2)
+        bpms = 60.0 * frame_rate / self._lags
+        # Log-normal preference for tempi around 120 BPM, one octave wide, as in librosa
+        self._tempo_prior = np.exp(-0.5 * np.log2(bpms / 120.0) ** 2)
+
+        self._resampler = None
+        if self.input_sample_rate != sample_rate:
+            self._resampler = soxr.ResampleStream(self.input_sample_rate, sample_rate, 1,
+                                                  dtype='float32', quality='HQ')
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all audio pushed so far."""
+        self._audio = RingBuffer(self.n_fft)
+        self._onsets = RingBuffer(self._max_lag + 2)
+        self._pending = 0
+        self.frames = 0
+        self._chroma = np.zeros(12)
+        self._acf = np.zeros(len(self._lags))
+        self._onset_energy = 0.0
+        self._onset_mean = 0.0
+        self._previous_mel = None
+        self._estimate = None
+
+    def push(self, samples: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Add a chunk of audio of any length.
+
+        Args:
+            samples (np.ndarray): (n_samples,) or (n_samples, n_channels) audio at input_sample_rate
+
+        Returns:
+            Optional[Dict[str, Any]]: latest estimate, None when the chunk did not complete a hop
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1, dtype=np.float32)
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+
+        updated = False
+        position = 0
+        while position < len(samples):
+            take = min(self.hop_length - self._pending, len(samples) - position)
+            self._audio.extend(samples[position:position + take])
+            position += take
+            self._pending += take
+            if self._pending == self.hop_length:
+                self._pending = 0
+                self._process_frame()
+                updated = True
+        return self.estimate if updated else None
+
+    def process_stream(self, chunks: Iterable[np.ndarray]) -> Iterator[Dict[str, Any]]:
+        """Push chunks as they arrive and yield the estimate after each one that completed a hop."""
+        for chunk in chunks:
+            estimate = self.push(chunk)
+            if estimate is not None:
+                yield estimate
+
+    def _process_frame(self) -> None:
+        self.frames += 1
+        self._estimate = None
+        spectrum = np.abs(np.fft.rfft(self._audio.latest() * self._window)).astype(np.float32)
+        power = spectrum ** 2
+
+        # Key: decayed sum of peak-normalised chroma frames
+        chroma = self._chroma_fb @ power
+        peak = chroma.max()
+        if peak > 1e-10:
+            self._chroma = self._chroma_decay * self._chroma + chroma / peak
+
+        # Tempo: mel spectral flux, centred on its recent mean
+        mel = np.log1p(1000.0 * (self._mel_fb @ power))
+        flux = 0.0 if self._previous_mel is None else float(np.maximum(mel - self._previous_mel, 0.0).mean())
+        self._previous_mel = mel
+        self._onset_mean = self._mean_decay * self._onset_mean + (1 - self._mean_decay) * flux
+        onset = flux - self._onset_mean
+        self._onsets.extend(np.array([onset], dtype=np.float32))
+
+        # Decayed autocorrelation: every lag gains onset[t] * onset[t - lag]
+        history = self._onsets.latest()
+        self._acf = self._tempo_decay * self._acf + onset * history[-1 - self._lags]
+        self._onset_energy = self._tempo_decay * self._onset_energy + onset * onset
+
+    @property
+    def estimate(self) -> Dict[str, Any]:
+        """Current key and tempo; key and bpm are None until there is enough signal."""
+        if self._estimate is None:
+            self._estimate = {
+                'time': self.frames * self.hop_length / self.sample_rate,
+                **self._key_estimate(),
+                **self._tempo_estimate()
+            }
+        return self._estimate
+
+    def _key_estimate(self) -> Dict[str, Any]:
+        if not self._chroma.any():
+            return {'key': None, 'key_confidence': 0.0}
+        keys, modes, confidences = self.analyzer.detect_keys(self._chroma[np.newaxis, :])
+        return {'key': f"{keys[0]} {modes[0]}", 'key_confidence': float(confidences[0])}
+
+    def _tempo_estimate(self) -> Dict[str, Any]:
+        if self.frames <= self._max_lag or self._onset_energy <= 0:
+            return {'bpm': None, 'tempo_confidence': 0.0}
+
+        # Candidate lags exclude the neighbours used for interpolation
+        candidates = slice(max(self._min_lag - 1, 1), self._max_lag)
+        weighted = np.maximum(self._acf, 0.0) * self._tempo_prior
+        index = candidates.start + int(np.argmax(weighted[candidates]))
+
+        # Parabolic interpolation between the neighbouring lags
+        left, centre, right = self._acf[index - 1:index + 2]
+        denominator = left - 2 * centre + right
+        shift = 0.5 * (left - right) / denominator if denominator < 0 else 0.0
+        lag = self._lags[index] + float(np.clip(shift, -0.5, 0.5))
+
+        return {
+            'bpm': round(60.0 * self.sample_rate / (self.hop_length * lag), 1),
+            'tempo_confidence': float(np.clip(self._acf[index] / self._onset_energy, 0.0, 1.0))
+        }
@@ -0,0 +1,206 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.loader import AudioLoader
+from src.audio.profiles import HPSS_FALLBACK, HPSS_FULL, AnalysisProfile
+from src.audio.streaming import STREAMING_MIN_DURATION, StreamingAnalyzer, StreamingFeatures
+from src.utils.metrics import timed
+
+
+def sampled_cache_variant(profile: AnalysisProfile) -> str:
+    """Results cache variant of sampled results, kept apart from whole-track results."""
+    return f"{profile.cache_variant}-sampled"
+
+
+class SampledAnalyzer:
+    def __init__(self, analyzer: Optional[AudioAnalyzer] = None, loader: Optional[AudioLoader] = None,
+                 window_seconds: float = 30.0, max_windows: int = 7, escalation_step: int = 2,
+                 key_threshold: float = 0.5, tempo_threshold: float = 0.6, tempo_tolerance: float = 0.04,
+                 scan_points: int = 32, probe_seconds: float = 0.5,
+                 streaming_min_duration: float = STREAMING_MIN_DURATION,
+                 check_cancelled: Optional[Callable[[], None]] = None):
+        """
+        Key and BPM from a few excerpts instead of the whole track.
+
+        Three windows are decoded first: the start, the middle and the loudest
+        section, found by decoding short probes spread over the file. Their
+        features are pooled and analysed like a whole track. When the key
+        correlation of the pooled chroma or the share of windows agreeing on
+        the tempo is below its threshold, more windows are added, spread as
+        far as possible from the ones already analysed, and past max_windows
+        the whole track is analysed.
+
+        Args:
+            analyzer (Optional[AudioAnalyzer]): analyzer (and profile) used for every window
+            loader (Optional[AudioLoader]): loader decoding the windows, at the profile's sample rate by default
+            window_seconds (float): length of each excerpt
+            max_windows (int): excerpts analysed before falling back to the whole track
+            escalation_step (int): excerpts added per escalation
+            key_threshold (float): key correlation below which the result is escalated
+            tempo_threshold (float): share of windows that must agree with the pooled tempo
+            tempo_tolerance (float): relative BPM difference still counted as agreeing
+            scan_points (int): probes of the energy scan
+            probe_seconds (float): length of each probe
+            streaming_min_duration (float): duration from which the whole-track fallback streams the file
+            check_cancelled (Optional[Callable]): called between excerpts and analysis stages,
+                raises to stop the analysis
+        """
+        self.analyzer = analyzer or AudioAnalyzer()
+        self.loader = loader or AudioLoader(self.analyzer.profile.sample_rate)
+        self.window_seconds = window_seconds
+        self.max_windows = max_windows
+        self.escalation_step = escalation_step
+        self.key_threshold = key_threshold
+        self.tempo_threshold = tempo_threshold
+        self.tempo_tolerance = tempo_tolerance
+        self.scan_points = scan_points
+        self.probe_seconds = probe_seconds
+        self.streaming_min_duration = streaming_min_duration
+        self.check_cancelled = check_cancelled or (lambda: None)
+
+    @timed()
+    def energy_scan(self, file_path: str, duration: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        RMS of short probes evenly spread over a file.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: probe centres in seconds and their RMS
+        """
+        centres = (np.arange(self.scan_points) + 0.5) * duration / self.scan_points
+        rms = np.zeros(self.scan_points)
+        for i, centre in enumerate(centres):
+            y, _ = self.loader.load_audio(file_path, offset=max(centre - self.probe_seconds / 2, 0.0),
+                                          duration=self.probe_seconds)
+            rms[i] = np.sqrt(np.mean(np.square(y))) if len(y) else 0.0
+        return centres, rms
+
+    def plan_windows(self, duration: float, centres: np.ndarray, rms: np.ndarray) -> List[float]:
+        """
+        Start times of the first windows: start, middle and loudest section.
+
+        The loudest section is the window position covering the most probe
+        energy; it is skipped when it overlaps a window already planned.
+        """
+        last = max(duration - self.window_seconds, 0.0)
+        starts = [0.0, min(max(duration / 2 - self.window_seconds / 2, 0.0), last)]
+
+        candidates = np.clip(centres - self.window_seconds / 2, 0.0, last)
+        energy = [np.sum(rms[(centres >= start) & (centres < start + self.window_seconds)] ** 2)
+                  for start in candidates]
+        for index in np.argsort(energy)[::-1]:
+            if not self._overlaps(candidates[index], starts):
+                starts.append(float(candidates[index]))
+                break
+        return self._dedupe(starts)
+
+    def more_windows(self, duration: float, starts: List[float], count: int) -> List[float]:
+        """Up to count new window starts, each as far as possible from the windows already taken."""
+        last = max(duration - self.window_seconds, 0.0)
+        grid = list(np.linspace(0.0, last, max(int(duration / self.window_seconds) * 2, 2)))
+        taken = list(starts)
+        added = []
+        for _ in range(count):
+            free = [start for start in grid if not self._overlaps(start, taken)]
+            if not free:
+                break
+            best = max(free, key=lambda start: min(abs(start - other) for other in taken))
+            taken.append(float(best))
+            added.append(float(best))
+        return added
+
+    def _overlaps(self, start: float, starts: List[float]) -> bool:
+        return any(abs(start - other) < self.window_seconds for other in starts)
+
+    def _dedupe(self, starts: List[float]) -> List[float]:
+        kept = []
+        for start in starts:
+            if not self._overlaps(start, kept):
+                kept.append(start)
+        return kept
+
+    @timed()
+    def analyze_file(self, file_path: str) -> Dict[str, Any]:
+        """
+        Analyse a file from excerpts, escalating while the estimates are uncertain.
+
+        Returns:
+            Dict[str, Any]: the key/bpm/additional_info results of AudioAnalyzer.analyze,
+            plus a 'sampling' entry with the analysed windows, the confidences and
+            whether the whole track was analysed
+        """
+        duration = StreamingAnalyzer.get_duration(file_path)
+        if duration is None or duration < self.window_seconds * 6:
+            # Unknown length or too short for excerpts to save much
+            return self._analyze_full(file_path, duration, escalated=False)
+
+        profile = self.analyzer.profile
+        # The analyzer downsamples windows decoded above the profile's rate
+        summary = StreamingFeatures(min(self.loader.sample_rate, profile.sample_rate), profile.hop_length)
+        summary.n_samples = int(round(duration * summary.sr))  # report the track's duration, not the excerpts'
+        # Only the accurate tier needs HPSS up front; the fallback's harmonic check
+        # is for ambiguous keys, and those are escalated anyway
+        harmonic = profile.hpss == HPSS_FULL
+        key_threshold = max(self.key_threshold, 0.5) if profile.hpss == HPSS_FALLBACK else self.key_threshold
+        window_bpms = []
+        starts = []
+        escalated = False
+        new_starts = self.plan_windows(duration, *self.energy_scan(file_path, duration))
+
+        while True:
+            for start in new_starts:
+                self.check_cancelled()
+                y, sr = self.loader.load_audio(file_path, offset=start, duration=self.window_seconds)
+                features = self.analyzer.features(y, sr)
+                summary.update(features, 0, None, harmonic)
+                window_bpms.append(self.analyzer.detect_bpm(y, sr))
+            starts += new_starts
+
+            key_confidence = self._key_confidence(summary)
+            if key_confidence >= key_threshold:
+                results = self.analyzer.analyze_features(summary, self.check_cancelled)
+                tempo_agreement = self._tempo_agreement(results['bpm'], window_bpms)
+            else:
+                tempo_agreement = None
+            if tempo_agreement is not None and tempo_agreement >= self.tempo_threshold:
+                results['sampling'] = {
+                    'windows': [[start, self.window_seconds] for start in starts],
+                    'key_confidence': key_confidence,
+                    'tempo_agreement': tempo_agreement,
+                    'escalated': escalated,
+                    'full': False
+                }
+                return results
+
+            escalated = True
+            new_starts = self.more_windows(duration, starts, min(self.escalation_step, self.max_windows - len(starts)))
+            if not new_starts:
+                return self._analyze_full(file_path, duration, escalated=True)
+
+    def _key_confidence(self, summary: StreamingFeatures) -> float:
+        """Correlation of the pooled chroma with its best key profile."""
+        chroma_mean = summary.harmonic_chroma_mean if self.analyzer.profile.hpss == HPSS_FULL else summary.chroma_mean
+        _, _, correlations = self.analyzer.detect_keys(chroma_mean[np.newaxis, :])
+        return float(correlations[0])
+
+    def _tempo_agreement(self, bpm: float, window_bpms: List[float]) -> float:
+        """Share of windows whose own tempo matches the pooled one."""
+        bpms = np.asarray(window_bpms, dtype=float)
+        return float(np.mean(np.abs(bpms - bpm) <= self.tempo_tolerance * max(bpm, 1)))
+
+    def _analyze_full(self, file_path: str, duration: Optional[float], escalated: bool) -> Dict[str, Any]:
+        if duration is not None and duration >= self.streaming_min_duration:
+            results = StreamingAnalyzer(self.analyzer, check_cancelled=self.check_cancelled).analyze_file(file_path)
+        else:
+            y, sr = self.loader.load_audio(file_path)
+            self.check_cancelled()
+            results = self.analyzer.analyze(y, sr, self.check_cancelled)
+        results['sampling'] = {
+            'windows': [[0.0, results['additional_info']['duration']]],
+            'key_confidence': None,
+            'tempo_agreement': None,
+            'escalated': escalated,
+            'full': True
+        }
+        return results
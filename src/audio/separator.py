@@ -1,13 +1,323 @@
-from spleeter.separator import Separator
+import os
+import queue
+import threading
+from typing import Callable, Dict, Iterator, Optional
 
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+from src.audio.chunking import overlap_add, split_windows
+from src.audio.decoder import AudioDecodeError, iter_blocks, probe_audio
+from src.utils.metrics import timed
 
 
 class VocalSeparator:
-    def __init__(self):
-        self.separator = Separator('spleeter:2stems')
+    sample_rate = 44100  # rate the Spleeter models are trained on
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, model: str = 'spleeter:2stems', backend=None):
+        """
+        Args:
+            model (str): Spleeter model descriptor
+            backend: model with Spleeter's separate(waveform) -> stems interface,
+                used instead of loading `model` (e.g. a stub in benchmarks)
+        """
+        self.model = model
+        if backend is None:
+            # Spleeter pulls in TensorFlow, so it is only imported when a model is loaded
+            from spleeter.separator import Separator
+            self.separator = Separator(model)
+        else:
+            self.separator = backend
+        self._backend = backend
+        # The TensorFlow predictor is built once and must not be fed concurrently
+        self._predict_lock = threading.Lock()
+        self._warm = False
+        self._replicas = []  # extra model copies for parallel chunked separation
+
+    @classmethod
+    def shared(cls, model: str = 'spleeter:2stems', warmup: bool = True) -> 'VocalSeparator':
+        """
+        Get the process-wide separator of a model, creating and warming it up once.
+
+        Args:
+            model (str): Spleeter model descriptor
+            warmup (bool): run a short dummy separation so the first request doesn't pay for it
+
+        Returns:
+            VocalSeparator: shared separator instance
+        """
+        with cls._shared_lock:
+            separator = cls._shared.get(model)
+            if separator is None:
+                separator = cls._shared[model] = cls(model)
+        if warmup:
+            separator.warmup()
+        return separator
 
+    def warmup(self) -> None:
+        """Load the model and build the prediction graph with one second of silence."""
+        if not self._warm:
+            self.separate_waveform(np.zeros((self.sample_rate, 2), dtype=np.float32))
+
+    @timed()
     def separate_vocals(self, audio_path, output_path):
         self.separator.separate_to_file(
             audio_path,
             output_path
-        )
\ No newline at end of file
+        )
+
+    @timed()
+    def separate_waveform(self, waveform: np.ndarray, sample_rate: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Separate an in-memory waveform into stems.
+
+        Args:
+            waveform (np.ndarray): audio as (n_samples,) mono or (n_samples, n_channels)
+            sample_rate (Optional[int]): rate of the waveform, defaults to the model rate
+
+        Returns:
+            Dict[str, np.ndarray]: (n_samples, 2) float32 array per stem, at the model rate
+        """
+        waveform = self._prepare(waveform, sample_rate or self.sample_rate)
+        with self._predict_lock:
+            stems = self.separator.separate(waveform)
+            self._warm = True
+        return stems
+
+    @timed()
+    def separate_file(self, audio_path: str, output_dir: str, codec: str = 'wav') -> Dict[str, str]:
+        """
+        Separate an audio file with the warm model and write the stems.
+
+        Args:
+            audio_path (str): Path to the audio file
+            output_dir (str): Directory receiving one file per stem
+            codec (str): Output codec, see save_stems
+
+        Returns:
+            Dict[str, str]: Path of every written stem
+        """
+        waveform, _ = librosa.load(audio_path, sr=self.sample_rate, mono=False)
+        stems = self.separate_waveform(np.atleast_2d(waveform).T, self.sample_rate)
+        return self.save_stems(stems, output_dir, codec=codec)
+
+    def separate_waveform_chunked(self, waveform: np.ndarray, sample_rate: Optional[int] = None,
+                                  window_seconds: float = 30.0, overlap_seconds: float = 1.0,
+                                  max_workers: int = 1,
+                                  check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, np.ndarray]:
+        """
+        Separate a waveform in fixed-length overlapping windows.
+
+        Windows are crossfaded with complementary raised-cosine curves, so
+        model memory is bounded by the window length instead of the track
+        length. With max_workers > 1 windows run in parallel threads, each on
+        its own warm copy of the model.
+
+        Args:
+            waveform (np.ndarray): audio as (n_samples,) mono or (n_samples, n_channels)
+            sample_rate (Optional[int]): rate of the waveform, defaults to the model rate
+            window_seconds (float): window length
+            overlap_seconds (float): crossfade length between consecutive windows
+            max_workers (int): windows separated concurrently
+            check_cancelled (Optional[Callable]): called between windows, raises to stop the separation
+
+        Returns:
+            Dict[str, np.ndarray]: (n_samples, 2) float32 array per stem, at the model rate
+        """
+        waveform = self._prepare(waveform, sample_rate or self.sample_rate)
+        window, overlap = self._window_lengths(window_seconds, overlap_seconds)
+        return overlap_add(
+            split_windows(waveform, window, overlap),
+            self._window_processor(max_workers),
+            overlap,
+            max_workers=max_workers,
+            check_cancelled=check_cancelled
+        )
+
+    @timed()
+    def separate_file_chunked(self, audio_path: str, output_dir: str, window_seconds: float = 30.0,
+                              overlap_seconds: float = 1.0, max_workers: int = 1,
+                              codec: str = 'wav',
+                              check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+        """
+        Separate an audio file window by window, streaming stems to disk.
+
+        The file is decoded block by block and stems are written as windows
+        finish, so peak memory doesn't grow with the track length.
+
+        Args:
+            audio_path (str): Path to the audio file
+            output_dir (str): Directory receiving one file per stem
+            window_seconds (float): window length
+            overlap_seconds (float): crossfade length between consecutive windows
+            max_workers (int): windows separated concurrently
+            codec (str): 'wav' or 'flac'
+            check_cancelled (Optional[Callable]): called between windows, raises to stop the separation
+
+        Returns:
+            Dict[str, str]: Path of every written stem
+        """
+        window, overlap = self._window_lengths(window_seconds, overlap_seconds)
+        return self._separate_windows_to_files(
+            self._iter_file_windows(audio_path, window, overlap), overlap, output_dir, max_workers, codec,
+            check_cancelled
+        )
+
+    @timed()
+    def separate_waveform_to_files(self, waveform: np.ndarray, output_dir: str, sample_rate: Optional[int] = None,
+                                   window_seconds: float = 30.0, overlap_seconds: float = 1.0,
+                                   max_workers: int = 1, codec: str = 'wav',
+                                   check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+        """
+        Separate an already decoded waveform window by window, streaming stems to disk.
+
+        A waveform at the model rate is windowed in place, without copies.
+
+        Args:
+            waveform (np.ndarray): audio as (n_samples,) mono or (n_samples, n_channels)
+            output_dir (str): Directory receiving one file per stem
+            sample_rate (Optional[int]): rate of the waveform, defaults to the model rate
+            window_seconds (float): window length
+            overlap_seconds (float): crossfade length between consecutive windows
+            max_workers (int): windows separated concurrently
+            codec (str): 'wav' or 'flac'
+            check_cancelled (Optional[Callable]): called before resampling and between windows,
+                raises to stop the separation
+
+        Returns:
+            Dict[str, str]: Path of every written stem
+        """
+        window, overlap = self._window_lengths(window_seconds, overlap_seconds)
+        if check_cancelled is not None:
+            check_cancelled()
+        waveform = self._prepare(waveform, sample_rate or self.sample_rate)
+        return self._separate_windows_to_files(
+            split_windows(waveform, window, overlap), overlap, output_dir, max_workers, codec, check_cancelled
+        )
+
+    def _separate_windows_to_files(self, windows: Iterator[np.ndarray], overlap: int, output_dir: str,
+                                   max_workers: int, codec: str,
+                                   check_cancelled: Optional[Callable[[], None]] = None) -> Dict[str, str]:
+        os.makedirs(output_dir, exist_ok=True)
+        writers = {}
+
+        def sink(name: str, block: np.ndarray) -> None:
+            if name not in writers:
+                writers[name] = sf.SoundFile(
+                    os.path.join(output_dir, f"{name}.{codec}"), 'w',
+                    samplerate=self.sample_rate, channels=block.shape[1], format=codec.upper()
+                )
+            writers[name].write(block)
+
+        try:
+            overlap_add(windows, self._window_processor(max_workers), overlap, max_workers=max_workers, sink=sink,
+                        check_cancelled=check_cancelled)
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return {name: writer.name for name, writer in writers.items()}
+
+    def _window_lengths(self, window_seconds: float, overlap_seconds: float):
+        window = int(window_seconds * self.sample_rate)
+        overlap = int(overlap_seconds * self.sample_rate)
+        if not 0 <= overlap < window:
+            raise ValueError("overlap_seconds must be shorter than window_seconds")
+        return window, overlap
+
+    def _window_processor(self, max_workers: int):
+        """Build a window callback that borrows one of max_workers model replicas per call."""
+        while len(self._replicas) < max_workers - 1:
+            self._replicas.append(VocalSeparator(self.model, backend=self._backend))
+
+        replicas = queue.Queue()
+        for replica in [self] + self._replicas[:max_workers - 1]:
+            replicas.put(replica)
+
+        def process(window: np.ndarray) -> Dict[str, np.ndarray]:
+            replica = replicas.get()
+            try:
+                return replica.separate_waveform(window)
+            finally:
+                replicas.put(replica)
+
+        return process
+
+    def _iter_file_windows(self, audio_path: str, window: int, overlap: int) -> Iterator[np.ndarray]:
+        """Decode a file into stereo windows at the model rate, block by block when possible."""
+        try:
+            info = probe_audio(audio_path)
+        except AudioDecodeError:
+            # Formats neither libsndfile nor ffmpeg can read are decoded in one go
+            waveform, _ = librosa.load(audio_path, sr=self.sample_rate, mono=False)
+            yield from split_windows(self._prepare(np.atleast_2d(waveform).T, self.sample_rate), window, overlap)
+            return
+
+        resampler = None
+        if info.sample_rate != self.sample_rate:
+            resampler = soxr.ResampleStream(info.sample_rate, self.sample_rate, info.channels,
+                                            dtype='float32', quality='HQ')
+
+        buffer = np.zeros((0, 2), dtype=np.float32)
+        step = window - overlap
+        blocks = iter_blocks(audio_path, window)
+        block = next(blocks, None)
+        while block is not None:
+            next_block = next(blocks, None)
+            if resampler is not None:
+                block = resampler.resample_chunk(block, last=next_block is None)
+            buffer = np.concatenate([buffer, self._prepare(block, self.sample_rate)])
+            block = next_block
+
+            # Hold back enough samples that the final window is longer than the overlap
+            while len(buffer) > window:
+                yield buffer[:window]
+                buffer = buffer[step:]
+        yield buffer
+
+    @timed()
+    def save_stems(self, stems: Dict[str, np.ndarray], output_dir: str, codec: str = 'wav',
+                   bitrate: str = '128k') -> Dict[str, str]:
+        """
+        Encode separated stems to disk.
+
+        WAV and FLAC are written directly with soundfile; other codecs go
+        through Spleeter's ffmpeg audio adapter.
+
+        Args:
+            stems (Dict[str, np.ndarray]): Stems returned by separate_waveform
+            output_dir (str): Directory receiving one file per stem
+            codec (str): Output codec (wav, flac, mp3, ogg, m4a, wma)
+            bitrate (str): Bitrate for lossy codecs
+
+        Returns:
+            Dict[str, str]: Path of every written stem
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {}
+        for name, data in stems.items():
+            path = os.path.join(output_dir, f"{name}.{codec}")
+            if codec in ('wav', 'flac'):
+                sf.write(path, data, self.sample_rate)
+            else:
+                from spleeter.audio.adapter import AudioAdapter
+                AudioAdapter.default().save(path, data, self.sample_rate, codec, bitrate)
+            paths[name] = path
+        return paths
+
+    def _prepare(self, waveform: np.ndarray, sample_rate: int) -> np.ndarray:
+        """Convert a waveform to the float32 stereo layout at the model rate Spleeter expects."""
+        waveform = np.asarray(waveform, dtype=np.float32)
+        if waveform.ndim == 1:
+            waveform = waveform[:, np.newaxis]
+        if sample_rate != self.sample_rate:
+            waveform = soxr.resample(waveform, sample_rate, self.sample_rate, quality='HQ')
+        if waveform.shape[1] == 1:
+            waveform = np.repeat(waveform, 2, axis=1)
+        elif waveform.shape[1] > 2:
+            waveform = waveform[:, :2]
+        return np.ascontiguousarray(waveform)
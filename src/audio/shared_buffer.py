@@ -0,0 +1,91 @@
+from fractions import Fraction
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from src.audio.decoder import decode_audio
+
+
+class SharedAudioBuffer:
+    def __init__(self, samples: np.ndarray, sample_rate: int):
+        """
+        Decoded audio held once in memory and shared between the threads of a job.
+
+        Use from_file to decode a file. The separator reads the full-rate view
+        directly and the analyzer gets a polyphase-decimated mono view.
+
+        Args:
+            samples (np.ndarray): float32 (n_samples, n_channels) samples
+            sample_rate (int): native sample rate of the samples
+        """
+        self.shape = tuple(samples.shape)
+        self.sample_rate = sample_rate
+        self._samples = samples
+        self._views = {}
+
+    @classmethod
+    def from_file(cls, file_path: str) -> 'SharedAudioBuffer':
+        """
+        Decode a file once, at its native rate.
+
+        Formats soundfile can read are decoded straight into the buffer;
+        others go through decode_audio.
+        """
+        try:
+            f = sf.SoundFile(file_path)
+        except RuntimeError:
+            samples, sample_rate = decode_audio(file_path, mono=False)
+            if samples.ndim == 1:
+                samples = samples[:, np.newaxis]
+            return cls(np.ascontiguousarray(samples, dtype=np.float32), sample_rate)
+
+        with f:
+            samples = np.zeros((f.frames, f.channels), dtype=np.float32)
+            read = f.read(out=samples)
+            if len(read) < f.frames:  # frame counts of some compressed formats are estimates
+                samples[len(read):] = 0
+            return cls(samples, f.samplerate)
+
+    @property
+    def duration(self) -> float:
+        return self.shape[0] / self.sample_rate
+
+    def full_rate(self) -> np.ndarray:
+        """Read-only (n_samples, n_channels) view of the native-rate samples."""
+        view = self._samples.view()
+        view.flags.writeable = False
+        return view
+
+    def analysis_view(self, sample_rate: Optional[int] = None) -> np.ndarray:
+        """
+        Mono samples at the analysis rate, decimated with a polyphase filter.
+
+        The result is computed once per rate and reused.
+
+        Args:
+            sample_rate (Optional[int]): target rate, None for the native rate
+
+        Returns:
+            np.ndarray: float32 mono samples
+        """
+        sample_rate = sample_rate or self.sample_rate
+        if sample_rate not in self._views:
+            mono = np.mean(self._samples, axis=1, dtype=np.float32) if self.shape[1] > 1 else self._samples[:, 0]
+            if sample_rate != self.sample_rate:
+                ratio = Fraction(sample_rate, self.sample_rate)
+                mono = resample_poly(mono, ratio.numerator, ratio.denominator).astype(np.float32)
+            self._views[sample_rate] = mono
+        return self._views[sample_rate]
+
+    def close(self) -> None:
+        """Drop the samples; views handed out stay valid until their holders let go of them."""
+        self._views.clear()
+        self._samples = None
+
+    def __enter__(self) -> 'SharedAudioBuffer':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
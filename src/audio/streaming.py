@@ -0,0 +1,228 @@
+from typing import Callable, Optional
+
+import numpy as np
+import soxr
+
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.decoder import AudioDecodeError, iter_blocks, probe_audio
+from src.audio.features import AudioFeatures
+from src.audio.profiles import HPSS_FALLBACK, HPSS_FULL
+
+STREAMING_MIN_DURATION = 20 * 60  # seconds, longer files are analysed block by block
+
+
+class StreamingFeatures:
+    def __init__(self, sr: int, hop_length: int = 512):
+        """
+        Feature summary accumulated block by block.
+
+        Exposes the attributes AudioAnalyzer.analyze_features reads from an
+        AudioFeatures bundle, but only keeps running sums of the frame based
+        features. The onset envelope is the only per-frame array kept, at
+        sr / hop_length values per second (about 170 KB per hour of audio).
+
+        Args:
+            sr (int): analysis sample rate
+            hop_length (int): hop length of every frame-based feature
+        """
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_samples = 0
+        self._chroma_sum = np.zeros(12)
+        self._chroma_frames = 0
+        self._harmonic_chroma_sum = np.zeros(12)
+        self._harmonic_chroma_frames = 0
+        self._bandwidth_sum = 0.0
+        self._bandwidth_frames = 0
+        self._zcr_sum = 0.0
+        self._zcr_frames = 0
+        self._onset_blocks = []
+        # Computes the harmonic chromagram on first use when it was not accumulated
+        self.harmonic_source: Optional[Callable[[], 'StreamingFeatures']] = None
+
+    def update(self, features: AudioFeatures, start: int, count: Optional[int], harmonic: bool,
+               harmonic_only: bool = False) -> None:
+        """
+        Add the frames [start, start + count) of a block to the running sums.
+
+        Args:
+            features (AudioFeatures): features of the block, including its context margins
+            start (int): index of the first frame owned by this block
+            count (Optional[int]): number of frames owned by this block, None for all remaining frames
+            harmonic (bool): whether to accumulate the harmonic chromagram as well
+            harmonic_only (bool): accumulate nothing but the harmonic chromagram
+        """
+        stop = None if count is None else start + count
+
+        if harmonic or harmonic_only:
+            harmonic_chroma = features.harmonic_chroma[:, start:stop]
+            self._harmonic_chroma_sum += harmonic_chroma.sum(axis=1)
+            self._harmonic_chroma_frames += harmonic_chroma.shape[1]
+        if harmonic_only:
+            return
+
+        chroma = features.chroma[:, start:stop]
+        self._chroma_sum += chroma.sum(axis=1)
+        self._chroma_frames += chroma.shape[1]
+
+        bandwidth = features.spectral_bandwidth[0, start:stop]
+        self._bandwidth_sum += float(bandwidth.sum())
+        self._bandwidth_frames += bandwidth.shape[0]
+
+        zcr = features.zero_crossing_rate[0, start:stop]
+        self._zcr_sum += float(zcr.sum())
+        self._zcr_frames += zcr.shape[0]
+
+        self._onset_blocks.append(features.onset_env[start:stop].astype(np.float32))
+
+    @property
+    def chroma_mean(self) -> np.ndarray:
+        return self._chroma_sum / max(self._chroma_frames, 1)
+
+    @property
+    def harmonic_chroma_mean(self) -> np.ndarray:
+        if not self._harmonic_chroma_frames and self.harmonic_source is not None:
+            source, self.harmonic_source = self.harmonic_source, None
+            harmonic = source()
+            self._harmonic_chroma_sum = harmonic._harmonic_chroma_sum
+            self._harmonic_chroma_frames = harmonic._harmonic_chroma_frames
+        if not self._harmonic_chroma_frames:
+            raise ValueError("Harmonic chroma was not accumulated")
+        return self._harmonic_chroma_sum / self._harmonic_chroma_frames
+
+    @property
+    def onset_env(self) -> np.ndarray:
+        if len(self._onset_blocks) > 1:
+            self._onset_blocks = [np.concatenate(self._onset_blocks)]
+        return self._onset_blocks[0] if self._onset_blocks else np.zeros(0, dtype=np.float32)
+
+    @property
+    def spectral_bandwidth(self) -> float:
+        return self._bandwidth_sum / max(self._bandwidth_frames, 1)
+
+    @property
+    def zero_crossing_rate(self) -> float:
+        return self._zcr_sum / max(self._zcr_frames, 1)
+
+    @property
+    def duration(self) -> float:
+        return self.n_samples / self.sr
+
+
+class StreamingAnalyzer:
+    def __init__(self, analyzer: Optional[AudioAnalyzer] = None, sample_rate: Optional[int] = None,
+                 block_seconds: float = 30.0, margin_seconds: float = 2.0,
+                 hop_length: Optional[int] = None, harmonic: Optional[bool] = None,
+                 check_cancelled: Optional[Callable[[], None]] = None):
+        """
+        Bounded-memory analysis of long recordings.
+
+        The file is read in fixed-size blocks with soundfile, mixed down to
+        mono and resampled incrementally. Each block is analysed together with
+        a context margin on both sides, so the frames it owns match the frames
+        of a whole-file analysis, and only running sums are kept between blocks.
+
+        Args:
+            analyzer (Optional[AudioAnalyzer]): analyzer deriving the final results
+            sample_rate (Optional[int]): analysis sample rate, defaults to the analyzer profile's
+            block_seconds (float): length of audio analysed per block
+            margin_seconds (float): context added on each side of a block
+            hop_length (Optional[int]): hop length of every frame-based feature, defaults to the profile's
+            harmonic (Optional[bool]): accumulate the harmonic chromagram in the same pass,
+                defaults to whether the profile scores every key on it. Otherwise, profiles
+                double-checking ambiguous keys stream the file again for it when needed.
+            check_cancelled (Optional[Callable]): called between blocks and analysis stages,
+                raises to stop the analysis
+        """
+        self.analyzer = analyzer or AudioAnalyzer()
+        self.profile = self.analyzer.profile
+        sample_rate = sample_rate or self.profile.sample_rate
+        hop_length = hop_length or self.profile.hop_length
+        self.sample_rate = sample_rate
+        self.hop_length = hop_length
+        self.harmonic = self.profile.hpss == HPSS_FULL if harmonic is None else harmonic
+        self.check_cancelled = check_cancelled or (lambda: None)
+        # Block and margin lengths are whole hops so block frames line up with whole-file frames
+        self.block_length = max(1, int(block_seconds * sample_rate) // hop_length) * hop_length
+        self.margin = int(np.ceil(margin_seconds * sample_rate / hop_length)) * hop_length
+
+    @staticmethod
+    def get_duration(file_path: str) -> Optional[float]:
+        """
+        Get the duration of a file without decoding it.
+
+        Returns:
+            Optional[float]: duration in seconds, None if neither libsndfile nor ffprobe knows it
+        """
+        try:
+            return probe_audio(file_path).duration
+        except AudioDecodeError:
+            return None
+
+    def analyze_file(self, file_path: str) -> dict:
+        """
+        Analyse a file block by block.
+
+        Returns:
+            dict: the same key/bpm/additional_info results as AudioAnalyzer.analyze
+        """
+        return self.analyzer.analyze_features(self.accumulate(file_path), self.check_cancelled)
+
+    def accumulate(self, file_path: str, harmonic_only: bool = False) -> StreamingFeatures:
+        """
+        Stream a file through the feature extractors.
+
+        Args:
+            file_path (str): Path to the audio file
+            harmonic_only (bool): accumulate nothing but the harmonic chromagram
+
+        Returns:
+            StreamingFeatures: accumulated feature summary
+        """
+        summary = StreamingFeatures(self.sample_rate, self.hop_length)
+        if not (self.harmonic or harmonic_only) and self.profile.hpss == HPSS_FALLBACK:
+            # HPSS on every block only pays off for the few ambiguous keys
+            summary.harmonic_source = lambda: self.accumulate(file_path, harmonic_only=True)
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_start = 0  # absolute sample index of buffer[0]
+        position = 0  # absolute sample index of the next block
+
+        info = probe_audio(file_path)
+        resampler = None
+        if info.sample_rate != self.sample_rate:
+            resampler = soxr.ResampleStream(info.sample_rate, self.sample_rate, 1, dtype='float32', quality='HQ')
+
+        read_size = max(self.block_length * info.sample_rate // self.sample_rate, 1)
+        blocks = iter_blocks(file_path, read_size)
+        block = next(blocks, None)
+        while block is not None:
+            self.check_cancelled()
+            next_block = next(blocks, None)
+            samples = np.mean(block, axis=1)
+            if resampler is not None:
+                samples = resampler.resample_chunk(samples, last=next_block is None)
+            buffer = np.concatenate([buffer, samples])
+            summary.n_samples += len(samples)
+            block = next_block
+
+            # Analyse every block whose right margin is already available
+            while buffer_start + len(buffer) - position >= self.block_length + self.margin:
+                self._process(summary, buffer, buffer_start, position, final=False, harmonic_only=harmonic_only)
+                position += self.block_length
+                drop = max(position - self.margin - buffer_start, 0)
+                buffer = buffer[drop:]
+                buffer_start += drop
+
+        if summary.n_samples == 0:
+            raise ValueError(f"No audio data in {file_path}")
+        self._process(summary, buffer, buffer_start, position, final=True, harmonic_only=harmonic_only)
+        return summary
+
+    def _process(self, summary: StreamingFeatures, buffer: np.ndarray, buffer_start: int,
+                 position: int, final: bool, harmonic_only: bool = False) -> None:
+        offset = position - buffer_start
+        end = len(buffer) if final else offset + self.block_length + self.margin
+        features = AudioFeatures(buffer[:end], self.sample_rate, hop_length=self.hop_length,
+                                 bins_per_octave=self.profile.bins_per_octave, n_octaves=self.profile.n_octaves)
+        count = None if final else self.block_length // self.hop_length
+        summary.update(features, offset // self.hop_length, count, self.harmonic, harmonic_only)
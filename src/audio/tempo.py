@@ -0,0 +1,157 @@
+from typing import Optional, Tuple
+
+import librosa
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # the kernels run as plain Python, which is slow but correct
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+
+@njit(cache=True, nogil=True)
+def _onset_flux(log_mel: np.ndarray) -> np.ndarray:
+    """Mean positive difference between consecutive frames of a (n_mels, n_frames) spectrogram."""
+    n_mels, n_frames = log_mel.shape
+    flux = np.zeros(n_frames, dtype=np.float32)
+    for t in range(1, n_frames):
+        total = 0.0
+        for m in range(n_mels):
+            diff = log_mel[m, t] - log_mel[m, t - 1]
+            if diff > 0.0:
+                total += diff
+        flux[t] = total / n_mels
+    return flux
+
+
+@njit(cache=True, nogil=True)
+def _median_filter(x: np.ndarray, size: int) -> np.ndarray:
+    """Running median with reflected edges, as scipy.ndimage.median_filter(mode='reflect')."""
+    n = x.shape[0]
+    half = size // 2
+    out = np.empty(n, dtype=x.dtype)
+    window = np.empty(size, dtype=x.dtype)
+    for i in range(n):
+        for k in range(size):
+            j = i + k - half
+            # 'reflect' mirrors about the edge, repeating the edge sample
+            while j < 0 or j >= n:
+                j = -j - 1 if j < 0 else 2 * n - j - 1
+            window[k] = x[j]
+        window.sort()
+        out[i] = window[half]
+    return out
+
+
+class TempoEngine:
+    def __init__(self, sr: int = 22050, hop_length: int = 512, n_fft: int = 1024, n_mels: int = 40,
+                 median_size: int = 9, window_frames: int = 384, start_bpm: float = 120.0,
+                 min_bpm: float = 30.0, max_bpm: float = 300.0):
+        """
+        Tempo and its confidence from one pass over the signal.
+
+        A coarse mel spectrogram feeds JIT-compiled spectral-flux and running
+        median kernels, the median serving as an adaptive threshold. The onset
+        envelope is then split into overlapping windows whose autocorrelations,
+        computed with one batched FFT, form a tempogram. The mean autocorrelation, weighted by a log-normal prior
+        around start_bpm, is peak-picked with parabolic interpolation.
+
+        Args:
+            sr (int): sample rate of the signals
+            hop_length (int): samples between onset frames
+            n_fft (int): STFT size; tempo needs little frequency resolution
+            n_mels (int): mel bands of the flux
+            median_size (int): width of the running median threshold in frames
+            window_frames (int): tempogram window length in frames (about 9 s by default)
+            start_bpm (float): centre of the tempo prior
+            min_bpm (float): slowest tempo considered
+            max_bpm (float): fastest tempo considered
+        """
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.median_size = median_size
+        self.window_frames = window_frames
+        self.start_bpm = start_bpm
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self._mel_fb = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+        self._window = np.hanning(n_fft).astype(np.float32)
+
+    @property
+    def frame_rate(self) -> float:
+        return self.sr / self.hop_length
+
+    def onset_envelope(self, y: np.ndarray) -> np.ndarray:
+        """Spectral-flux onset envelope of a mono signal, above its running median."""
+        y = np.asarray(y, dtype=np.float32)
+        if len(y) < self.n_fft:
+            y = np.pad(y, (0, self.n_fft - len(y)))
+        frames = np.lib.stride_tricks.sliding_window_view(y, self.n_fft)[::self.hop_length]
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        log_mel = np.log1p(1000.0 * (power.astype(np.float32) @ self._mel_fb.T)).T
+        flux = _onset_flux(np.ascontiguousarray(log_mel, dtype=np.float32))
+        # An adaptive threshold keeps short percussive peaks and drops slow swells
+        return np.maximum(flux - _median_filter(flux, self.median_size), 0.0)
+
+    def estimate(self, y: np.ndarray) -> Tuple[float, float]:
+        """
+        Estimate the tempo of a mono signal.
+
+        Returns:
+            Tuple[float, float]: BPM and a confidence between 0 and 1
+        """
+        return self.estimate_from_onsets(self.onset_envelope(y))
+
+    def estimate_from_onsets(self, onset_env: np.ndarray, frame_rate: Optional[float] = None) -> Tuple[float, float]:
+        """Estimate the tempo from an onset envelope sampled at frame_rate (default: this engine's)."""
+        frame_rate = frame_rate or self.frame_rate
+        acf = self.tempogram(onset_env).mean(axis=1)
+        if acf[0] <= 0:
+            return 0.0, 0.0
+
+        lags = np.arange(len(acf))
+        with np.errstate(divide='ignore'):
+            bpms = 60.0 * frame_rate / lags
+        valid = (bpms >= self.min_bpm) & (bpms <= self.max_bpm)
+        valid[[0, -1]] = False  # interpolation needs both neighbours
+        if not valid.any():
+            return 0.0, 0.0
+
+        prior = np.zeros(len(acf))
+        prior[valid] = np.exp(-0.5 * np.log2(bpms[valid] / self.start_bpm) ** 2)
+        index = int(np.argmax(np.maximum(acf, 0.0) * prior))
+
+        left, centre, right = acf[index - 1:index + 2]
+        denominator = left - 2 * centre + right
+        shift = 0.5 * (left - right) / denominator if denominator < 0 else 0.0
+        bpm = 60.0 * frame_rate / (index + float(np.clip(shift, -0.5, 0.5)))
+        confidence = float(np.clip(acf[index] / acf[0], 0.0, 1.0))
+        return float(bpm), confidence
+
+    def tempogram(self, onset_env: np.ndarray) -> np.ndarray:
+        """
+        Autocorrelation tempogram, (window_frames, n_windows), one column per half-overlapping window.
+
+        Windows are mean-removed and their autocorrelations computed with one
+        zero-padded FFT, each normalised by its value at lag zero.
+        """
+        onset_env = np.asarray(onset_env, dtype=np.float32)
+        win = min(self.window_frames, len(onset_env))
+        if win < 4:
+            return np.zeros((max(win, 1), 1), dtype=np.float32)
+
+        windows = np.lib.stride_tricks.sliding_window_view(onset_env, win)[::max(win // 2, 1)]
+        windows = (windows - windows.mean(axis=1, keepdims=True)) * np.hanning(win).astype(np.float32)
+        n_fft = 1 << int(np.ceil(np.log2(2 * win)))
+        spectrum = np.fft.rfft(windows, n=n_fft, axis=1)
+        acf = np.fft.irfft(np.abs(spectrum) ** 2, n=n_fft, axis=1)[:, :win]
+        energy = acf[:, :1]
+        acf = np.divide(acf, energy, out=np.zeros_like(acf), where=energy > 0)
+        return acf.T.astype(np.float32)
@@ -0,0 +1,53 @@
+import argparse
+import logging
+import sys
+
+from src.audio.profiles import PROFILES
+from src.batch.runner import run_batch
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.batch",
+        description="Analyse audio libraries offline and write the results as JSON Lines."
+    )
+    parser.add_argument("paths", nargs="*", help="audio files or directories to walk")
+    parser.add_argument("-m", "--manifest", help="text file with one audio path per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSON Lines output file (resumed if it exists)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--cache-dir", default="cache", help="ResultsCache directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the results cache")
+    parser.add_argument("--feature-store", default=None,
+                        help="FeatureStore directory; reuses stored features instead of decoding audio")
+    parser.add_argument("--profile", choices=list(PROFILES), default="balanced",
+                        help="analysis quality tier (default: balanced)")
+    parser.add_argument("--sampled", action="store_true",
+                        help="analyse a few excerpts per file, escalating to the whole file when uncertain")
+    parser.add_argument("--results-store", default=None,
+                        help="Parquet results store directory for library queries")
+    args = parser.parse_args(argv)
+
+    if not args.paths and not args.manifest:
+        parser.error("give at least one path or a manifest")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    stats = run_batch(
+        args.paths,
+        args.output,
+        manifest=args.manifest,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        max_workers=args.workers,
+        feature_store_dir=args.feature_store,
+        profile=args.profile,
+        sampled=args.sampled,
+        results_store_dir=args.results_store
+    )
+    print(
+        f"{stats['analyzed']} analysed, {stats['cached']} from cache, {stats['skipped']} already done, "
+        f"{stats['failed']} failed in {stats['elapsed']:.1f}s ({stats['files_per_second']:.2f} files/s)"
+    )
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
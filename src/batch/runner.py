@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+import numpy as np
+
+from src.audio import analysis
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.loader import AudioLoader
+from src.audio.profiles import AnalysisProfile, get_profile
+from src.audio.sampling import sampled_cache_variant
+from src.audio.streaming import STREAMING_MIN_DURATION
+from src.optimization.cache import ResultsCache
+from src.optimization.feature_store import FeatureStore
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+
+
+def iter_audio_files(paths: Iterable[str], manifest: Optional[str] = None,
+                     extensions: Iterable[str] = AUDIO_EXTENSIONS) -> Iterator[str]:
+    """
+    Yield audio files from directories, single files and an optional manifest.
+
+    Args:
+        paths (Iterable[str]): files or directories to walk recursively
+        manifest (Optional[str]): text file with one audio path per line
+        extensions (Iterable[str]): accepted file extensions
+
+    Yields:
+        str: path of every audio file, each one only once
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    seen = set()
+
+    def candidates():
+        if manifest:
+            with open(manifest, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield line
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.lower().endswith(extensions):
+                            yield os.path.join(root, name)
+            else:
+                yield path
+
+    for path in candidates():
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """
+    Read the paths already analysed successfully from a JSON Lines output file.
+
+    Lines left incomplete by a crash are ignored, so their files are analysed again.
+
+    Args:
+        output_path (str): JSON Lines results file
+
+    Returns:
+        Set[str]: paths with a successful result
+    """
+    completed = set()
+    try:
+        with open(output_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'error' not in record and 'path' in record:
+                    completed.add(record['path'])
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+def truncate_partial_line(output_path: str) -> None:
+    """
+    Cut a JSON Lines file back to its last complete line.
+
+    A crash mid-write leaves a line without its newline; appending to it would
+    glue the next record onto it and corrupt both. The partial record never
+    counted as done, so its file is analysed again.
+
+    Args:
+        output_path (str): JSON Lines results file, which may not exist yet
+    """
+    try:
+        f = open(output_path, 'rb+')
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - 65536, 0)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(feature_store_dir: Optional[str] = None, profile: Optional[AnalysisProfile] = None) -> None:
+    """Set up the per-process analysis state, limiting native thread pools to one core."""
+    try:
+        from threadpoolctl import threadpool_limits
+        _worker_state['limits'] = threadpool_limits(1)
+    except ImportError:
+        pass
+    profile = get_profile(profile)
+    _worker_state['loader'] = AudioLoader(profile.sample_rate)
+    _worker_state['analyzer'] = AudioAnalyzer(profile)
+    _worker_state['feature_store'] = FeatureStore(feature_store_dir) if feature_store_dir else None
+
+
+def analyze_file(path: str, streaming_min_duration: float = STREAMING_MIN_DURATION,
+                 sampled: bool = False) -> Dict[str, Any]:
+    """
+    Analyse a single file inside a worker process.
+
+    The results cache is handled by the parent process, so cached files are
+    never sent to a worker.
+
+    Args:
+        path (str): audio file path
+        streaming_min_duration (float): duration from which the streaming analyzer is used
+        sampled (bool): analyse excerpts, escalating to the whole file when uncertain
+
+    Returns:
+        Dict[str, Any]: result record with either the analysis results or an error message
+    """
+    if 'analyzer' not in _worker_state:
+        _init_worker()
+
+    start = time.perf_counter()
+    try:
+        results = analysis.analyze_file(path, sampled=sampled, analyzer=_worker_state['analyzer'],
+                                        loader=_worker_state['loader'],
+                                        feature_store=_worker_state['feature_store'],
+                                        streaming_min_duration=streaming_min_duration)
+        return {'path': path, 'results': results, 'elapsed': time.perf_counter() - start}
+    except Exception as e:
+        return {'path': path, 'error': str(e), 'elapsed': time.perf_counter() - start}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class BatchRunner:
+    def __init__(self, output_path: str, cache: Optional[ResultsCache] = None,
+                 max_workers: Optional[int] = None,
+                 streaming_min_duration: float = STREAMING_MIN_DURATION,
+                 feature_store_dir: Optional[str] = None, profile: Optional[str] = None,
+                 sampled: bool = False, results_store=None):
+        """
+        Analyse many files on a process pool and write the results as JSON Lines.
+
+        Files with a successful line in the output file are skipped, so an
+        interrupted run resumes where it stopped. Files found in the results
+        cache are written without being analysed again.
+
+        Args:
+            output_path (str): JSON Lines results file, appended to
+            cache (Optional[ResultsCache]): results cache, None to disable it
+            max_workers (Optional[int]): worker processes, defaults to one per core
+            streaming_min_duration (float): duration from which the streaming analyzer is used
+            feature_store_dir (Optional[str]): FeatureStore directory; stored features are
+                reused instead of decoding, and new ones are stored
+            profile (Optional[str]): analysis profile name, None for balanced
+            sampled (bool): analyse a few excerpts per file instead of whole files
+            results_store (Optional[ResultsStore]): Parquet store also receiving every result
+        """
+        self.output_path = output_path
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.streaming_min_duration = streaming_min_duration
+        self.feature_store_dir = feature_store_dir
+        self.profile = get_profile(profile)
+        self.sampled = sampled
+        self.cache_variant = sampled_cache_variant(self.profile) if sampled else self.profile.cache_variant
+        self.results_store = results_store
+
+    def run(self, files: Iterable[str]) -> Dict[str, Any]:
+        """
+        Analyse files, skipping completed and cached ones.
+
+        Args:
+            files (Iterable[str]): audio file paths
+
+        Returns:
+            Dict[str, Any]: run statistics, including throughput in files per second
+        """
+        completed = load_completed(self.output_path)
+        stats = {'analyzed': 0, 'cached': 0, 'skipped': 0, 'failed': 0}
+        start = time.perf_counter()
+
+        Path(self.output_path).parent.mkdir(parents=True, exist_ok=True)
+        truncate_partial_line(self.output_path)
+        with open(self.output_path, 'a') as output, \
+                ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                    initargs=(self.feature_store_dir, self.profile)) as executor:
+            pending = set()
+            max_pending = self.max_workers * 2
+
+            for path in files:
+                if path in completed:
+                    stats['skipped'] += 1
+                    continue
+
+                if self.cache is not None:
+                    cached = self.cache.get_cached_result(path, self.cache_variant)
+                    if cached and all(k in cached for k in analysis.RESULT_KEYS):
+                        self._write(output, {'path': path, 'cached': True, **cached})
+                        self._store(path, cached)
+                        stats['cached'] += 1
+                        continue
+
+                # Keep a bounded number of files in flight
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._collect(done, output, stats)
+                pending.add(executor.submit(analyze_file, path, self.streaming_min_duration, self.sampled))
+
+            done, _ = wait(pending)
+            self._collect(done, output, stats)
+
+        if self.results_store is not None:
+            self.results_store.flush()
+
+        elapsed = time.perf_counter() - start
+        stats['elapsed'] = elapsed
+        stats['files_per_second'] = (stats['analyzed'] + stats['cached']) / elapsed if elapsed > 0 else 0.0
+        logger.info("Batch finished: %s", stats)
+        return stats
+
+    def _collect(self, futures, output, stats: Dict[str, Any]) -> None:
+        for future in futures:
+            record = future.result()
+            if 'error' in record:
+                stats['failed'] += 1
+                logger.warning("Analysis failed for %s: %s", record['path'], record['error'])
+                self._write(output, record)
+                continue
+
+            results = record.pop('results')
+            if self.cache is not None:
+                self.cache.cache_result(record['path'], results, self.cache_variant)
+            self._write(output, {**record, 'cached': False, **results})
+            self._store(record['path'], results)
+            stats['analyzed'] += 1
+
+    def _store(self, path: str, results: Dict[str, Any]) -> None:
+        if self.results_store is not None:
+            self.results_store.add(path, results, self.cache_variant)
+
+    @staticmethod
+    def _write(output, record: Dict[str, Any]) -> None:
+        output.write(json.dumps(record, default=_json_default) + '\n')
+        output.flush()
+
+
+def run_batch(paths: List[str], output_path: str, manifest: Optional[str] = None,
+              cache_dir: Optional[str] = "cache", max_workers: Optional[int] = None,
+              feature_store_dir: Optional[str] = None, profile: Optional[str] = None,
+              sampled: bool = False, results_store_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Walk paths and the manifest, then analyse every audio file found."""
+    cache = ResultsCache(cache_dir) if cache_dir else None
+    results_store = None
+    if results_store_dir:
+        from src.optimization.results_store import ResultsStore
+        results_store = ResultsStore(results_store_dir)
+    runner = BatchRunner(output_path, cache=cache, max_workers=max_workers, feature_store_dir=feature_store_dir,
+                         profile=profile, sampled=sampled, results_store=results_store)
+    return runner.run(iter_audio_files(paths, manifest))
@@ -0,0 +1,199 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.audio.analysis import analyze_file
+from src.audio.shared_buffer import SharedAudioBuffer
+from src.audio.streaming import STREAMING_MIN_DURATION, StreamingAnalyzer
+from src.jobs.queue import DONE, QUEUED, RUNNING
+from src.jobs.scheduler import ANALYSIS, SEPARATION, Scheduler, Task, check_cancelled, get_scheduler
+from src.optimization.cache import ResultsCache
+from src.optimization.stem_store import StemStore
+from src.utils.metrics import timed
+
+PROCESS_TIMEOUT = 300  # seconds
+
+
+@timed('pipeline.process_file')
+def process_file(file_path: str, output_dir: Optional[str], separator, cache: ResultsCache,
+                 timeout: float = PROCESS_TIMEOUT, profile: Optional[str] = None,
+                 sampled: bool = False, user: Optional[str] = None,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 scheduler: Optional[Scheduler] = None,
+                 stem_store: Optional[StemStore] = None,
+                 streaming_min_duration: float = STREAMING_MIN_DURATION) -> Dict[str, Any]:
+    """
+    Separate stems and analyse an audio file in parallel.
+
+    Both tasks go through the process-wide scheduler, so concurrent calls
+    share its bounded pools. They are cancelled when either fails, times
+    out, or the caller stops waiting.
+
+    Args:
+        file_path (str): Path to the audio file
+        output_dir (Optional[str]): Directory receiving vocals.wav and accompaniment.wav,
+            unused with a stem store
+        separator (VocalSeparator): Separator running the stem model
+        cache (ResultsCache): Results cache
+        timeout (float): Seconds separation and analysis may take together, from when the first starts
+        profile (Optional[str]): Analysis profile name, None for balanced
+        sampled (bool): Analyse excerpts instead of the whole track, see analyze_file
+        user (Optional[str]): Session the work is scheduled for, for fairness between users
+        on_update (Optional[Callable]): Called while waiting with {'status', 'position'},
+            position being the number of tasks that start first
+        scheduler (Optional[Scheduler]): Scheduler to use, the process-wide one by default
+        stem_store (Optional[StemStore]): Store reusing the stems of audio separated before;
+            new stems are added to it
+        streaming_min_duration (float): Duration in seconds from which both tasks stream the file
+            instead of sharing decoded samples
+
+    Returns:
+        Dict[str, Any]: analysis results and stem paths, plus 'stem_key' with a stem store
+    """
+    file_path = Path(file_path)
+    scheduler = scheduler or get_scheduler()
+
+    stem_key = None
+    if stem_store is not None:
+        # Same fingerprint as the results cache, so the file is hashed only once
+        fingerprint = cache.fingerprinter.fingerprint(str(file_path))
+        stem_key = stem_store.stem_key(fingerprint, separator.model)
+        if (stems := stem_store.lookup(fingerprint, separator.model)) is not None:
+            # Separated before: only the analysis is left, usually a results cache hit
+            analysis_result, = _wait([
+                scheduler.submit(ANALYSIS, analyze_file, str(file_path), cache, None, profile, sampled, user=user,
+                                 streaming_min_duration=streaming_min_duration, check_cancelled=check_cancelled)
+            ], timeout, on_update)
+            return {
+                'results': analysis_result,
+                'vocal_path': stems['vocals'],
+                'backing_path': stems['accompaniment'],
+                'stem_key': stem_key
+            }
+        output_dir = stem_store.staging_dir()
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Generate safe output paths
+    vocal_path = output_dir / "vocals.wav"
+    backing_path = output_dir / "accompaniment.wav"
+
+    buffer = None
+    tasks = []
+    try:
+        # Decode once and share the samples between separation and analysis;
+        # long recordings are streamed from disk by both instead
+        duration = StreamingAnalyzer.get_duration(str(file_path))
+        if duration is None or duration < streaming_min_duration:
+            buffer = SharedAudioBuffer.from_file(str(file_path))
+
+        if buffer is not None:
+            tasks.append(scheduler.submit(
+                SEPARATION,
+                separator.separate_waveform_to_files,
+                buffer.full_rate(),
+                str(output_dir),
+                buffer.sample_rate,
+                user=user,
+                check_cancelled=check_cancelled
+            ))
+        else:
+            tasks.append(scheduler.submit(
+                SEPARATION,
+                separator.separate_file_chunked,
+                str(file_path),
+                str(output_dir),
+                user=user,
+                check_cancelled=check_cancelled
+            ))
+        tasks.append(scheduler.submit(ANALYSIS, analyze_file, str(file_path), cache, buffer, profile, sampled,
+                                      user=user, streaming_min_duration=streaming_min_duration,
+                                      check_cancelled=check_cancelled))
+        _, analysis_result = _wait(tasks, timeout, on_update)
+
+        # Validate outputs
+        if not vocal_path.exists():
+            raise RuntimeError("Vocal separation failed - no output file")
+        if not analysis_result:
+            raise ValueError("Audio analysis failed")
+
+        if stem_store is not None:
+            stems = stem_store.commit(fingerprint, separator.model, str(output_dir))
+            return {
+                'results': analysis_result,
+                'vocal_path': stems['vocals'],
+                'backing_path': stems['accompaniment'],
+                'stem_key': stem_key
+            }
+        return {
+            'results': analysis_result,
+            'vocal_path': str(vocal_path),
+            'backing_path': str(backing_path)
+        }
+
+    except BaseException:
+        # Stop work still queued (e.g. when submitting the analysis was refused) and cleanup failed outputs
+        for task in tasks:
+            task.cancel()
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    finally:
+        if buffer is not None:
+            unfinished = [task for task in tasks if not task.done()]
+            if unfinished:
+                # Cancelled tasks may still be reading the samples; the last one to stop releases them
+                remaining = [len(unfinished)]
+                lock = threading.Lock()
+
+                def release(_):
+                    with lock:
+                        remaining[0] -= 1
+                        if remaining[0] == 0:
+                            buffer.close()
+
+                for task in unfinished:
+                    task.add_done_callback(release)
+            else:
+                buffer.close()
+
+
+def _wait(tasks: List[Task], timeout: float,
+          on_update: Optional[Callable[[Dict[str, Any]], None]], poll_interval: float = 0.5) -> List[Any]:
+    """
+    Wait for scheduled tasks together and return their results.
+
+    The first task to fail or be cancelled cancels the others right away, and
+    one deadline, counted from when the first task started running, covers
+    them all. Tasks are also cancelled when the wait is abandoned.
+    """
+    finished = threading.Event()
+    for task in tasks:
+        task.add_done_callback(lambda _: finished.set())
+
+    try:
+        while True:
+            finished.clear()
+            failed = next((task for task in tasks if task.done() and task.status != DONE), None)
+            if failed is not None:
+                for task in tasks:
+                    task.cancel()
+                failed.result()  # raises the task's error
+            if all(task.done() for task in tasks):
+                return [task.result() for task in tasks]
+
+            started = [task.started_at for task in tasks if task.started_at is not None]
+            if started and time.time() - min(started) > timeout:
+                raise TimeoutError(f"Processing did not finish within {timeout} s")
+            if on_update is not None:
+                queued = [task.position for task in tasks if task.status == QUEUED]
+                on_update({'status': QUEUED, 'position': max(queued)} if queued else {'status': RUNNING})
+            finished.wait(poll_interval)
+    except BaseException:
+        # Failed, timed out or abandoned (e.g. the session stopped): don't leave work running
+        for task in tasks:
+            task.cancel()
+        raise
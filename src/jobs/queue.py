@@ -0,0 +1,457 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=_json_default)
+
+
+WORKER_LOST = "Worker stopped responding"
+
+
+class JobQueue(ABC):
+    def __init__(self, visibility_timeout: float = 120.0, result_ttl: float = 24 * 60 * 60, max_attempts: int = 3):
+        """
+        Interface of the job queue backends.
+
+        Jobs are dicts with id, kind, payload, status, result, error, attempts,
+        created_at and updated_at; queued jobs also carry their position in the queue.
+
+        Workers heartbeat() the jobs they run. reap() puts running jobs back in
+        the queue once their last heartbeat is older than visibility_timeout,
+        since their worker died, and fails them after max_attempts claims.
+        It also deletes finished jobs older than result_ttl.
+
+        Args:
+            visibility_timeout (float): Seconds without heartbeat after which a running job is requeued
+            result_ttl (float): Seconds finished jobs are kept
+            max_attempts (int): Claims of a job before it is failed instead of requeued
+        """
+        self.visibility_timeout = visibility_timeout
+        self.result_ttl = result_ttl
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        """Add a job and return its id."""
+
+    @abstractmethod
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job and mark it running, None if none arrives within timeout."""
+
+    @abstractmethod
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Mark a job done with its result."""
+
+    @abstractmethod
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job failed with an error message."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the current state of a job."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str) -> None:
+        """Record that the worker running a job is still alive."""
+
+    @abstractmethod
+    def requeue_stale(self) -> int:
+        """Requeue (or fail, past max_attempts) running jobs without a recent heartbeat; return how many."""
+
+    @abstractmethod
+    def purge_finished(self) -> int:
+        """Delete done and failed jobs older than result_ttl; return how many."""
+
+    def reap(self) -> Dict[str, int]:
+        """Recover the jobs of dead workers and drop old finished jobs."""
+        return {'requeued': self.requeue_stale(), 'purged': self.purge_finished()}
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.5,
+             on_update: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Poll a job until it is done or failed.
+
+        Args:
+            job_id (str): Job id
+            timeout (Optional[float]): Seconds to wait, None to wait forever
+            poll_interval (float): Seconds between polls
+            on_update (Optional[Callable]): Called with the job after every poll
+
+        Returns:
+            Optional[Dict[str, Any]]: Final job state, or the last one seen on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if on_update is not None and job is not None:
+                on_update(job)
+            if job is None or job['status'] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+
+class InMemoryJobQueue(JobQueue):
+    def __init__(self, **kwargs):
+        """Job queue for a single process, used when workers run as threads and in tests."""
+        super().__init__(**kwargs)
+        self._jobs = {}
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._condition:
+            self._jobs[job_id] = {
+                'id': job_id, 'kind': kind, 'payload': json.loads(_dumps(payload)), 'status': QUEUED,
+                'result': None, 'error': None, 'attempts': 0, 'created_at': now, 'updated_at': now
+            }
+            self._queue.append(job_id)
+            self._condition.notify()
+        return job_id
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        with self._condition:
+            if not self._queue:
+                self._condition.wait(timeout)
+            if not self._queue:
+                return None
+            job = self._jobs[self._queue.popleft()]
+            job.update(status=RUNNING, attempts=job['attempts'] + 1, updated_at=time.time())
+            return dict(job)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._finish(job_id, DONE, result=json.loads(_dumps(result)))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id: str, status: str, **fields) -> None:
+        with self._condition:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(status=status, updated_at=time.time(), **fields)
+
+    def heartbeat(self, job_id: str) -> None:
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] == RUNNING:
+                job['updated_at'] = time.time()
+
+    def requeue_stale(self) -> int:
+        cutoff = time.time() - self.visibility_timeout
+        with self._condition:
+            stale = [job for job in self._jobs.values() if job['status'] == RUNNING and job['updated_at'] < cutoff]
+            for job in stale:
+                if job['attempts'] >= self.max_attempts:
+                    job.update(status=FAILED, error=WORKER_LOST, updated_at=time.time())
+                else:
+                    job.update(status=QUEUED, updated_at=time.time())
+                    self._queue.appendleft(job['id'])
+                    self._condition.notify()
+            return len(stale)
+
+    def purge_finished(self) -> int:
+        cutoff = time.time() - self.result_ttl
+        with self._condition:
+            old = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in (DONE, FAILED) and job['updated_at'] < cutoff]
+            for job_id in old:
+                del self._jobs[job_id]
+            return len(old)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job['status'] == QUEUED:
+                job['position'] = self._queue.index(job_id)
+            return job
+
+
+class SQLiteJobQueue(JobQueue):
+    def __init__(self, db_path: str = "temp/jobs.db", poll_interval: float = 0.2, **kwargs):
+        """
+        Job queue in an SQLite file, shared by processes on one host.
+
+        Stand-in for Redis in development and tests.
+
+        Args:
+            db_path (str): SQLite database file
+            poll_interval (float): Seconds between polls while claiming
+            **kwargs: visibility_timeout, result_ttl and max_attempts, see JobQueue
+        """
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        columns = {row[1] for row in self._connection().execute("PRAGMA table_info(jobs)")}
+        if 'attempts' not in columns:
+            self._connection().execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, _dumps(payload), QUEUED, now, now)
+        )
+        return job_id
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        conn = self._connection()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at, rowid LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (RUNNING, time.time(), row[0])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            if row is not None:
+                return self.get(row[0])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, updated_at = ? WHERE id = ?",
+            (DONE, _dumps(result), time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (FAILED, error, time.time(), job_id)
+        )
+
+    def heartbeat(self, job_id: str) -> None:
+        self._connection().execute(
+            "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING)
+        )
+
+    def requeue_stale(self) -> int:
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (FAILED, WORKER_LOST, now, RUNNING, now - self.visibility_timeout, self.max_attempts)
+            ).rowcount
+            # Requeued jobs keep their created_at, so they are claimed again first
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, RUNNING, now - self.visibility_timeout)
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return failed + requeued
+
+    def purge_finished(self) -> int:
+        return self._connection().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - self.result_ttl)
+        ).rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT id, kind, payload, status, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(('id', 'kind', 'payload', 'status', 'result', 'error', 'attempts', 'created_at', 'updated_at'),
+                       row))
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        if job['status'] == QUEUED:
+            job['position'] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job['created_at'])
+            ).fetchone()[0]
+        return job
+
+
+class RedisJobQueue(JobQueue):
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "audio_analyzer", **kwargs):
+        """
+        Job queue in Redis, shared by workers on any host.
+
+        Queued ids live in a list, claimed ids are moved atomically to a
+        processing list, and every job is a hash. Finished job hashes expire
+        after result_ttl.
+
+        Args:
+            url (str): Redis URL
+            prefix (str): Key prefix
+            **kwargs: visibility_timeout, result_ttl and max_attempts, see JobQueue
+        """
+        import redis
+
+        super().__init__(**kwargs)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.queue_key = f"{prefix}:jobs:queued"
+        self.processing_key = f"{prefix}:jobs:processing"
+        self.prefix = prefix
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            'id': job_id, 'kind': kind, 'payload': _dumps(payload), 'status': QUEUED, 'attempts': 0,
+            'created_at': now, 'updated_at': now
+        })
+        pipe.lpush(self.queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        job_id = self.redis.brpoplpush(self.queue_key, self.processing_key, timeout=max(int(timeout), 1))
+        if job_id is None:
+            return None
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={'status': RUNNING, 'updated_at': time.time()})
+        pipe.hincrby(self._job_key(job_id), 'attempts', 1)
+        pipe.execute()
+        return self.get(job_id)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._finish(job_id, {'status': DONE, 'result': _dumps(result)})
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, {'status': FAILED, 'error': error})
+
+    def _finish(self, job_id: str, fields: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={**fields, 'updated_at': time.time()})
+        pipe.expire(self._job_key(job_id), max(int(self.result_ttl), 1))
+        pipe.lrem(self.processing_key, 1, job_id)
+        pipe.execute()
+
+    def heartbeat(self, job_id: str) -> None:
+        self.redis.hset(self._job_key(job_id), 'updated_at', time.time())
+
+    def requeue_stale(self) -> int:
+        cutoff = time.time() - self.visibility_timeout
+        count = 0
+        for job_id in self.redis.lrange(self.processing_key, 0, -1):
+            data = self.redis.hmget(self._job_key(job_id), 'updated_at', 'attempts')
+            if data[0] is not None and float(data[0]) >= cutoff:
+                continue
+            # Only the reaper that takes the id out of the processing list recovers the job
+            if not self.redis.lrem(self.processing_key, 1, job_id):
+                continue
+            count += 1
+            if data[0] is None:
+                continue  # the hash is gone
+            if int(data[1] or 0) >= self.max_attempts:
+                self._finish(job_id, {'status': FAILED, 'error': WORKER_LOST})
+            else:
+                pipe = self.redis.pipeline()
+                pipe.hset(self._job_key(job_id), mapping={'status': QUEUED, 'updated_at': time.time()})
+                pipe.rpush(self.queue_key, job_id)  # claimed from the right, so it runs next
+                pipe.execute()
+        return count
+
+    def purge_finished(self) -> int:
+        return 0  # finished job hashes expire on their own
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.redis.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+
+        job = {
+            'id': data['id'], 'kind': data['kind'], 'payload': json.loads(data['payload']),
+            'status': data['status'], 'result': json.loads(data['result']) if data.get('result') else None,
+            'error': data.get('error'), 'attempts': int(data.get('attempts', 0)),
+            'created_at': float(data['created_at']),
+            'updated_at': float(data['updated_at'])
+        }
+        if job['status'] == QUEUED:
+            index = self.redis.lpos(self.queue_key, job_id)
+            if index is not None:
+                # Jobs are pushed on the left and claimed from the right
+                job['position'] = self.redis.llen(self.queue_key) - 1 - index
+        return job
+
+
+def get_job_queue(url: Optional[str] = None) -> Optional[JobQueue]:
+    """
+    Create the job queue configured by a URL or the JOB_QUEUE_URL environment variable.
+
+    Supported URLs are redis://..., sqlite:///path/to/jobs.db and memory://.
+
+    Returns:
+        Optional[JobQueue]: Job queue, None when no queue is configured
+    """
+    url = url or os.environ.get("JOB_QUEUE_URL")
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteJobQueue(url[len("sqlite:///"):])
+    if url == "memory://":
+        return InMemoryJobQueue()
+    raise ValueError(f"Unsupported job queue URL: {url}")
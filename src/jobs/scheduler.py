@@ -0,0 +1,318 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from src.jobs.queue import DONE, FAILED, QUEUED, RUNNING
+
+logger = logging.getLogger(__name__)
+
+CANCELLED = 'cancelled'
+
+ANALYSIS = 'analysis'
+SEPARATION = 'separation'
+
+
+class SchedulerFull(RuntimeError):
+    """Raised when a task is refused because the queue or the user's share of it is full."""
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task that was cancelled, at its next check_cancelled() call."""
+
+
+_current = threading.local()
+
+
+def check_cancelled() -> None:
+    """
+    Stop the calling task if it was cancelled.
+
+    The pipeline passes it to the audio layer as its check_cancelled callback,
+    run between units of work (separation windows, streaming blocks, analysis
+    excerpts and stages); outside a scheduled task it does nothing.
+    """
+    task = getattr(_current, 'task', None)
+    if task is not None and task.cancel_event.is_set():
+        raise TaskCancelled(f"Task {task.id} was cancelled")
+
+
+class Task:
+    def __init__(self, scheduler: 'Scheduler', pool: str, user: str, fn: Callable, args: tuple, kwargs: dict):
+        """
+        Unit of work queued on one of the scheduler's pools.
+
+        Use result() to wait for it, cancel() to drop it from the queue or ask
+        it to stop at its next check_cancelled(), and position to know how
+        many tasks will start before it.
+        """
+        self.id = uuid.uuid4().hex
+        self.pool = pool
+        self.user = user
+        self.status = QUEUED
+        self.error: Optional[BaseException] = None
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self._scheduler = scheduler
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+        self._result = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    @property
+    def position(self) -> int:
+        """Tasks that will start before this one, 0 once it is running."""
+        return self._scheduler.position(self)
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def add_done_callback(self, fn: Callable[['Task'], None]) -> None:
+        """Call fn(task) once the task has finished, right away if it already has."""
+        with self._callbacks_lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        with self._callbacks_lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                logger.exception("Done callback of task %s failed", self.id)
+
+    def cancel(self) -> bool:
+        """
+        Cancel the task.
+
+        Returns:
+            bool: True if the task had not finished yet
+        """
+        return self._scheduler.cancel(self)
+
+    def result(self, timeout: Optional[float] = None,
+               on_update: Optional[Callable[['Task'], None]] = None, poll_interval: float = 0.5) -> Any:
+        """
+        Wait for the task and return its result.
+
+        The timeout counts from the moment the task starts running, so waiting
+        in the queue does not use it up; the queue is bounded by admission
+        control instead. A task running past its timeout is cancelled.
+
+        Args:
+            timeout (Optional[float]): Seconds the task may run, None to wait forever
+            on_update (Optional[Callable[[Task], None]]): Called with the task every poll while it waits
+            poll_interval (float): Seconds between on_update calls
+
+        Raises:
+            TimeoutError: The task ran longer than timeout
+            TaskCancelled: The task was cancelled
+        """
+        polling = on_update is not None or timeout is not None
+        while not self._done.wait(poll_interval if polling else None):
+            if on_update is not None:
+                on_update(self)
+            if timeout is not None and self.started_at is not None and time.time() - self.started_at > timeout:
+                self.cancel()
+                raise TimeoutError(f"Task {self.id} did not finish within {timeout} s")
+        if self.status == CANCELLED:
+            raise TaskCancelled(f"Task {self.id} was cancelled")
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+    def _run(self) -> None:
+        self.started_at = time.time()
+        _current.task = self
+        try:
+            if self.cancel_event.is_set():
+                raise TaskCancelled(f"Task {self.id} was cancelled")
+            self._result = self._fn(*self._args, **self._kwargs)
+            status = DONE
+        except TaskCancelled:
+            status = CANCELLED
+        except BaseException as e:
+            self.error = e
+            status = CANCELLED if self.cancel_event.is_set() else FAILED
+        finally:
+            _current.task = None
+        self._finish(status)
+
+
+class _Pool:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.queues: 'OrderedDict[str, Deque[Task]]' = OrderedDict()  # per user, in round-robin order
+        self.running = 0
+        self.threads = []
+
+    def queued(self) -> int:
+        return sum(len(tasks) for tasks in self.queues.values())
+
+    def next_task(self) -> Task:
+        """Pop the head of the first user's queue and move that user to the back."""
+        user, tasks = next(iter(self.queues.items()))
+        task = tasks.popleft()
+        self.queues.move_to_end(user)
+        if not tasks:
+            del self.queues[user]
+        return task
+
+    def dispatch_order(self):
+        """Queued tasks in the order round-robin will start them."""
+        queues = [list(tasks) for tasks in self.queues.values()]
+        for depth in range(max((len(tasks) for tasks in queues), default=0)):
+            for tasks in queues:
+                if depth < len(tasks):
+                    yield tasks[depth]
+
+
+class Scheduler:
+    def __init__(self, analysis_workers: int = 2, separation_workers: int = 1,
+                 max_queued: int = 32, max_queued_per_user: int = 4):
+        """
+        Process-wide scheduler shared by every session.
+
+        Analysis and separation run on separate, fixed-size thread pools, so
+        the number of heavy jobs stays bounded however many users are active
+        and a long separation never holds back analyses. Each pool serves its
+        users round-robin; admission control refuses new tasks once the
+        queues are full, so waiting times stay bounded and predictable.
+
+        Args:
+            analysis_workers (int): Threads running analysis tasks
+            separation_workers (int): Threads running separation tasks
+            max_queued (int): Tasks waiting per pool before new ones are refused
+            max_queued_per_user (int): Tasks a single user may have waiting per pool
+        """
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self._condition = threading.Condition()
+        self._pools = {ANALYSIS: _Pool(ANALYSIS, analysis_workers), SEPARATION: _Pool(SEPARATION, separation_workers)}
+        self._shutdown = False
+        for pool in self._pools.values():
+            for index in range(pool.workers):
+                thread = threading.Thread(target=self._work, args=(pool,), name=f"{pool.name}-{index}", daemon=True)
+                thread.start()
+                pool.threads.append(thread)
+
+    def submit(self, pool: str, fn: Callable, *args, user: Optional[str] = None, **kwargs) -> Task:
+        """
+        Queue fn(*args, **kwargs) on a pool.
+
+        Args:
+            pool (str): ANALYSIS or SEPARATION
+            fn (Callable): Work to run
+            user (Optional[str]): Identity used for fairness and per-user limits
+
+        Raises:
+            SchedulerFull: The pool's queue or the user's share of it is full
+        """
+        user = user or 'anonymous'
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            target = self._pools[pool]
+            if target.queued() >= self.max_queued:
+                raise SchedulerFull(f"The {pool} queue is full, try again later")
+            if len(target.queues.get(user, ())) >= self.max_queued_per_user:
+                raise SchedulerFull(f"Too many {pool} tasks waiting for this session")
+            task = Task(self, pool, user, fn, args, kwargs)
+            target.queues.setdefault(user, deque()).append(task)
+            self._condition.notify_all()
+        return task
+
+    def position(self, task: Task) -> int:
+        with self._condition:
+            if task.status != QUEUED:
+                return 0
+            for position, queued in enumerate(self._pools[task.pool].dispatch_order()):
+                if queued is task:
+                    return position
+        return 0
+
+    def cancel(self, task: Task) -> bool:
+        with self._condition:
+            if task.done():
+                return False
+            task.cancel_event.set()
+            if task.status == QUEUED:
+                # Never started: drop it from the queue right away
+                pool = self._pools[task.pool]
+                tasks = pool.queues.get(task.user)
+                if tasks is not None and task in tasks:
+                    tasks.remove(task)
+                    if not tasks:
+                        del pool.queues[task.user]
+                task._finish(CANCELLED)
+        logger.info("Cancelled %s task %s of %s", task.pool, task.id, task.user)
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Running and queued tasks per pool."""
+        with self._condition:
+            return {name: {'workers': pool.workers, 'running': pool.running, 'queued': pool.queued()}
+                    for name, pool in self._pools.items()}
+
+    def shutdown(self, cancel_queued: bool = True) -> None:
+        """Stop the worker threads once their current task is done."""
+        with self._condition:
+            self._shutdown = True
+            queued = [task for pool in self._pools.values() for tasks in pool.queues.values() for task in tasks]
+            self._condition.notify_all()
+        if cancel_queued:
+            for task in queued:
+                task.cancel()
+
+    def _work(self, pool: _Pool) -> None:
+        while True:
+            with self._condition:
+                while not pool.queues and not self._shutdown:
+                    self._condition.wait()
+                if not pool.queues:
+                    return
+                task = pool.next_task()
+                task.status = RUNNING
+                pool.running += 1
+            try:
+                task._run()
+            finally:
+                with self._condition:
+                    pool.running -= 1
+
+
+_scheduler: Optional[Scheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """
+    Get the process-wide scheduler, created on first use.
+
+    Pool sizes and limits come from SCHEDULER_ANALYSIS_WORKERS,
+    SCHEDULER_SEPARATION_WORKERS, SCHEDULER_MAX_QUEUED and
+    SCHEDULER_MAX_QUEUED_PER_USER.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(
+                analysis_workers=int(os.environ.get('SCHEDULER_ANALYSIS_WORKERS', 2)),
+                separation_workers=int(os.environ.get('SCHEDULER_SEPARATION_WORKERS', 1)),
+                max_queued=int(os.environ.get('SCHEDULER_MAX_QUEUED', 32)),
+                max_queued_per_user=int(os.environ.get('SCHEDULER_MAX_QUEUED_PER_USER', 4))
+            )
+        return _scheduler
@@ -0,0 +1,177 @@
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.jobs.queue import JobQueue, get_job_queue
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+_separator = None
+_cache = None
+
+
+def process_audio_handler(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Separate and analyse one file, as the Streamlit app does locally.
+
+    The separator model and results cache are created on the first job and
+    kept warm in the worker process for the following ones. Stems go to the
+    shared stem store, so the app must see the same STEM_STORE_DIR.
+    """
+    global _separator, _cache
+    from src.audio.separator import VocalSeparator
+    from src.jobs.pipeline import process_file
+    from src.optimization.cache import ResultsCache
+    from src.optimization.stem_store import get_stem_store
+
+    if _separator is None:
+        _separator = VocalSeparator.shared()
+        _cache = ResultsCache()
+    return process_file(payload['file_path'], payload.get('output_dir'), _separator, _cache,
+                        profile=payload.get('profile'), sampled=payload.get('sampled', False),
+                        stem_store=get_stem_store())
+
+
+DEFAULT_HANDLERS: Dict[str, Handler] = {
+    'process_audio': process_audio_handler,
+}
+
+
+class JobWorker:
+    def __init__(self, queue: JobQueue, handlers: Optional[Dict[str, Handler]] = None, poll_timeout: float = 1.0,
+                 reap_interval: float = 60.0):
+        """
+        Claim jobs from a queue and run their handlers.
+
+        The running job is heartbeated so other workers don't take it for
+        lost, and the queue is reaped every reap_interval, requeueing the
+        jobs of workers that died.
+
+        Args:
+            queue (JobQueue): Job queue
+            handlers (Optional[Dict[str, Handler]]): Handler per job kind, DEFAULT_HANDLERS when omitted
+            poll_timeout (float): Seconds to block on an empty queue before checking for a stop
+            reap_interval (float): Seconds between reaps of the queue
+        """
+        self.queue = queue
+        self.handlers = DEFAULT_HANDLERS if handlers is None else handlers
+        self.poll_timeout = poll_timeout
+        self.reap_interval = reap_interval
+        self._next_reap = 0.0
+
+    def run_once(self) -> bool:
+        """
+        Run the next job, if one arrives within the poll timeout.
+
+        Handler errors are recorded on the job and never stop the worker.
+
+        Returns:
+            bool: whether a job was run
+        """
+        self._reap_if_due()
+        job = self.queue.claim(timeout=self.poll_timeout)
+        if job is None:
+            return False
+
+        handler = self.handlers.get(job['kind'])
+        if handler is None:
+            self.queue.fail(job['id'], f"Unknown job kind: {job['kind']}")
+            return True
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], done), daemon=True)
+        heartbeat.start()
+        try:
+            result = handler(job['payload'])
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job['id'], job['kind'])
+            self.queue.fail(job['id'], str(e) or type(e).__name__)
+        else:
+            self.queue.complete(job['id'], result)
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(self, job_id: str, done: threading.Event) -> None:
+        """Keep a job marked alive until it finishes."""
+        while not done.wait(self.queue.visibility_timeout / 4):
+            try:
+                self.queue.heartbeat(job_id)
+            except Exception:
+                logger.exception("Heartbeat of job %s failed", job_id)
+
+    def _reap_if_due(self) -> None:
+        now = time.monotonic()
+        if now < self._next_reap:
+            return
+        self._next_reap = now + self.reap_interval
+        try:
+            reaped = self.queue.reap()
+        except Exception:
+            logger.exception("Reaping the job queue failed")
+            return
+        if reaped['requeued']:
+            logger.warning("Recovered %d jobs of workers that stopped responding", reaped['requeued'])
+
+    def run(self, stop_event: Optional[threading.Event] = None) -> None:
+        """Run jobs until the stop event is set."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.run_once()
+
+
+def _worker_main(queue_url: Optional[str]) -> None:
+    """Entry point of a worker process; stops after the current job on SIGTERM."""
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    JobWorker(get_job_queue(queue_url)).run(stop_event)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.jobs.worker",
+        description="Run headless workers that separate and analyse queued audio files."
+    )
+    parser.add_argument("--queue", default=None,
+                        help="job queue URL, redis://... or sqlite:///path (default: $JOB_QUEUE_URL)")
+    parser.add_argument("-p", "--processes", type=int, default=1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    if get_job_queue(args.queue) is None:
+        parser.error("no job queue configured; pass --queue or set JOB_QUEUE_URL")
+
+    if args.processes == 1:
+        try:
+            _worker_main(args.queue)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    processes = [
+        multiprocessing.Process(target=_worker_main, args=(args.queue,), name=f"worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,138 @@
 import os
-import hashlib
 import pickle
 import json
+import sqlite3
+import threading
 import time
-from typing import Optional, Dict, Any
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterable, Iterator, List
+
+from src.optimization.fingerprint import FileFingerprinter
+from src.utils.metrics import timed
 
 
 class ResultsCache:
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", max_bytes: Optional[int] = 1024 ** 3,
+                 max_entries: Optional[int] = None, fingerprinter: Optional[FileFingerprinter] = None):
         """
         Initialize the cache system.
 
+        Results are pickled next to an SQLite index holding one row per entry,
+        so lookups and inserts are indexed and safe across processes. When the
+        cache grows past its byte or entry budget, the least recently used
+        entries are evicted.
+
         Args:
             cache_dir (str): Directory to store cache files
+            max_bytes (Optional[int]): Byte budget for cached results, None for no limit
+            max_entries (Optional[int]): Entry budget, None for no limit
+            fingerprinter (Optional[FileFingerprinter]): Source of cache keys, defaults to
+                one indexed in the cache directory
         """
         self.cache_dir = cache_dir
-        self.metadata_file = os.path.join(cache_dir, "cache_metadata.json")
-        self._ensure_cache_dir()
+        self.index_file = os.path.join(cache_dir, "cache_index.db")
+        self.metadata_file = os.path.join(cache_dir, "cache_metadata.json")  # legacy index
         self.cache_ttl = 7 * 24 * 60 * 60  # 7 days in seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.fingerprinter = fingerprinter or FileFingerprinter(os.path.join(cache_dir, "fingerprints.db"))
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._ensure_cache_dir()
 
     def _ensure_cache_dir(self) -> None:
-        """Create cache directory if it doesn't exist."""
+        """Create cache directory and index if they don't exist."""
         os.makedirs(self.cache_dir, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "cache_key TEXT PRIMARY KEY, "
+                "timestamp REAL NOT NULL, "
+                "file_path TEXT)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if 'size' not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            if 'last_access' not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+                conn.execute("UPDATE entries SET last_access = timestamp")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+
+            # Running totals kept up to date by triggers, so budget checks don't scan the table
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "id INTEGER PRIMARY KEY CHECK (id = 1), "
+                "total_bytes INTEGER NOT NULL, "
+                "total_entries INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO usage (id, total_bytes, total_entries) "
+                "SELECT 1, COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                "UPDATE usage SET total_bytes = total_bytes + NEW.size, total_entries = total_entries + 1; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                "UPDATE usage SET total_bytes = total_bytes - OLD.size, total_entries = total_entries - 1; END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN "
+                "UPDATE usage SET total_bytes = total_bytes + NEW.size - OLD.size; END"
+            )
+        self._drop_legacy_metadata()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection of the current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements inside one write transaction, rolling back on errors."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _drop_legacy_metadata(self) -> None:
+        """
+        Remove the entries of the legacy JSON metadata file.
+
+        They are keyed by an MD5 of the file without an analysis variant, so no
+        lookup can reach them and importing them would only use up the budget.
+        """
         if not os.path.exists(self.metadata_file):
-            self._save_metadata({})
+            return
+        try:
+            with open(self.metadata_file, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            metadata = {}
+
+        for key in metadata:
+            self._remove_entry_file(key)
+        try:
+            os.remove(self.metadata_file)
+        except FileNotFoundError:
+            pass
 
     def _get_file_hash(self, file_path: str) -> str:
         """
-        Generate MD5 hash of file content and modification time.
+        Get the content fingerprint of a file, used as its cache key.
 
         Args:
             file_path (str): Path to the audio file
@@ -35,42 +140,119 @@ class ResultsCache:
         Returns:
             str: Hash string
         """
-        hasher = hashlib.md5()
-        with open(file_path, 'rb') as f:
-            buf = f.read(65536)  # Read in 64kb chunks
-            while len(buf) > 0:
-                hasher.update(buf)
-                buf = f.read(65536)
+        return self.fingerprinter.fingerprint(file_path).replace(':', '-')
 
-        # Include file modification time in hash
-        mod_time = str(os.path.getmtime(file_path))
-        hasher.update(mod_time.encode())
+    def _get_cache_key(self, file_path: str, variant: Optional[str] = None) -> str:
+        """
+        Get the cache key of a file's results.
+
+        Args:
+            file_path (str): Path to the audio file
+            variant (Optional[str]): Analysis variant (e.g. profile) the results belong to
 
-        return hasher.hexdigest()
+        Returns:
+            str: Content fingerprint, suffixed with the variant if given
+        """
+        cache_key = self._get_file_hash(file_path)
+        return f"{cache_key}-{variant}" if variant else cache_key
 
     def _get_cache_path(self, cache_key: str) -> str:
         """Get the full path for a cache file."""
         return os.path.join(self.cache_dir, f"{cache_key}.pkl")
 
-    def _load_metadata(self) -> Dict:
-        """Load cache metadata from JSON file."""
+    def _remove_entry_file(self, cache_key: str) -> None:
+        """Remove a cache file if it exists."""
         try:
-            with open(self.metadata_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+            os.remove(self._get_cache_path(cache_key))
+        except FileNotFoundError:
+            pass
 
-    def _save_metadata(self, metadata: Dict) -> None:
-        """Save cache metadata to JSON file."""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(metadata, f)
+    def _remove_entry_files(self, cache_keys: List[str]) -> None:
+        """
+        Remove the files of entries deleted by a committed transaction.
 
-    def get_cached_result(self, audio_path: str) -> Optional[Dict[str, Any]]:
+        Files are removed outside the write transaction so other processes
+        aren't blocked on disk I/O; keys cached again in the meantime keep
+        their new file.
+        """
+        conn = self._connection()
+        for start in range(0, len(cache_keys), 500):  # stay below SQLite's variable limit
+            chunk = cache_keys[start:start + 500]
+            cached_again = {
+                key for (key,) in conn.execute(
+                    f"SELECT cache_key FROM entries WHERE cache_key IN ({','.join('?' * len(chunk))})", chunk
+                )
+            }
+            for key in chunk:
+                if key not in cached_again:
+                    self._remove_entry_file(key)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _read_entry(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Unpickle a cached result, None if the file is missing or corrupted."""
+        try:
+            with open(self._get_cache_path(cache_key), 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write_entry(self, cache_key: str, result: Dict[str, Any]) -> int:
+        """Pickle a result atomically so concurrent readers never see partial files."""
+        cache_path = self._get_cache_path(cache_key)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = pickle.dumps(result)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+        return len(data)
+
+    def _touch(self, cache_keys: List[str]) -> None:
+        """Record an access for LRU eviction."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE entries SET last_access = ? WHERE cache_key = ?",
+                [(time.time(), key) for key in cache_keys]
+            )
+
+    def _evict(self, conn: sqlite3.Connection) -> List[str]:
+        """
+        Unindex least recently used entries until the cache fits its budget.
+
+        Returns:
+            List[str]: Evicted keys, whose files are removed once the transaction is committed
+        """
+        evicted = []
+        while True:
+            total_bytes, total_entries = conn.execute(
+                "SELECT total_bytes, total_entries FROM usage WHERE id = 1"
+            ).fetchone()
+            over_bytes = self.max_bytes is not None and total_bytes > self.max_bytes
+            over_entries = self.max_entries is not None and total_entries > self.max_entries
+            if not (over_bytes or over_entries) or total_entries == 0:
+                break
+
+            batch = max(total_entries - self.max_entries, 1) if over_entries else 1
+            rows = conn.execute(
+                "SELECT cache_key FROM entries ORDER BY last_access LIMIT ?", (min(batch, 500),)
+            ).fetchall()
+            conn.executemany("DELETE FROM entries WHERE cache_key = ?", rows)
+            evicted += [key for (key,) in rows]
+
+        if evicted:
+            self._count('evictions', len(evicted))
+        return evicted
+
+    @timed()
+    def get_cached_result(self, audio_path: str, variant: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Retrieve cached analysis results for an audio file.
 
         Args:
             audio_path (str): Path to the audio file
+            variant (Optional[str]): Analysis variant, see AnalysisProfile.cache_variant
 
         Returns:
             Optional[Dict[str, Any]]: Cached results or None if not found/expired
@@ -78,45 +260,120 @@ class ResultsCache:
         if not os.path.exists(audio_path):
             return None
 
-        cache_key = self._get_file_hash(audio_path)
-        cache_path = self._get_cache_path(cache_key)
-        metadata = self._load_metadata()
+        cache_key = self._get_cache_key(audio_path, variant)
+        row = self._connection().execute(
+            "SELECT timestamp FROM entries WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
 
         # Check if cache exists and is valid
-        if cache_key in metadata:
-            cache_time = metadata[cache_key]['timestamp']
-            if time.time() - cache_time <= self.cache_ttl:
-                try:
-                    with open(cache_path, 'rb') as f:
-                        return pickle.load(f)
-                except (FileNotFoundError, pickle.UnpicklingError):
-                    pass
+        if row is not None and time.time() - row[0] <= self.cache_ttl:
+            result = self._read_entry(cache_key)
+            if result is not None:
+                self._touch([cache_key])
+                self._count('hits')
+                return result
 
+        self._count('misses')
         return None
 
-    def cache_result(self, audio_path: str, result: Dict[str, Any]) -> None:
+    @timed()
+    def get_cached_results(self, audio_paths: Iterable[str],
+                           variant: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve cached analysis results for many audio files at once.
+
+        Args:
+            audio_paths (Iterable[str]): Paths to the audio files
+            variant (Optional[str]): Analysis variant, see AnalysisProfile.cache_variant
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Cached results by audio path, misses are left out
+        """
+        keys = {}
+        for audio_path in audio_paths:
+            if os.path.exists(audio_path):
+                keys.setdefault(self._get_cache_key(audio_path, variant), []).append(audio_path)
+
+        results = {}
+        hit_keys = []
+        cutoff = time.time() - self.cache_ttl
+        key_list = list(keys)
+        for start in range(0, len(key_list), 500):  # stay below SQLite's variable limit
+            chunk = key_list[start:start + 500]
+            rows = self._connection().execute(
+                f"SELECT cache_key FROM entries WHERE timestamp >= ? "
+                f"AND cache_key IN ({','.join('?' * len(chunk))})",
+                [cutoff, *chunk]
+            ).fetchall()
+            for (cache_key,) in rows:
+                result = self._read_entry(cache_key)
+                if result is not None:
+                    hit_keys.append(cache_key)
+                    for audio_path in keys[cache_key]:
+                        results[audio_path] = result
+
+        if hit_keys:
+            self._touch(hit_keys)
+        self._count('hits', len(hit_keys))
+        self._count('misses', len(key_list) - len(hit_keys))
+        return results
+
+    @timed()
+    def cache_result(self, audio_path: str, result: Dict[str, Any], variant: Optional[str] = None) -> None:
         """
         Cache analysis results for an audio file.
 
         Args:
             audio_path (str): Path to the audio file
             result (Dict[str, Any]): Analysis results to cache
+            variant (Optional[str]): Analysis variant, see AnalysisProfile.cache_variant
         """
-        cache_key = self._get_file_hash(audio_path)
-        cache_path = self._get_cache_path(cache_key)
+        self.cache_results({audio_path: result}, variant)
+
+    @timed()
+    def cache_results(self, results: Dict[str, Dict[str, Any]], variant: Optional[str] = None) -> None:
+        """
+        Cache analysis results for many audio files in one transaction.
+
+        Args:
+            results (Dict[str, Dict[str, Any]]): Analysis results by audio path
+            variant (Optional[str]): Analysis variant, see AnalysisProfile.cache_variant
+        """
+        keyed = [(self._get_cache_key(audio_path, variant), audio_path, result)
+                 for audio_path, result in results.items()]
 
-        # Save results
-        with open(cache_path, 'wb') as f:
-            pickle.dump(result, f)
+        # Files are written under the index lock so eviction never removes a newer pickle
+        with self._transaction() as conn:
+            for cache_key, audio_path, result in keyed:
+                size = self._write_entry(cache_key, result)
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO entries (cache_key, timestamp, file_path, size, last_access) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET timestamp = excluded.timestamp, "
+                    "file_path = excluded.file_path, size = excluded.size, last_access = excluded.last_access",
+                    (cache_key, now, audio_path, size, now)
+                )
+            evicted = self._evict(conn)
+        self._remove_entry_files(evicted)
 
-        # Update metadata
-        metadata = self._load_metadata()
-        metadata[cache_key] = {
-            'timestamp': time.time(),
-            'file_path': audio_path
-        }
-        self._save_metadata(metadata)
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get cache counters and usage.
+
+        Returns:
+            Dict[str, int]: hits, misses and evictions of this instance, plus
+            the entries and bytes currently stored
+        """
+        total_bytes, total_entries = self._connection().execute(
+            "SELECT total_bytes, total_entries FROM usage WHERE id = 1"
+        ).fetchone()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({'entries': total_entries, 'bytes': total_bytes})
+        return stats
 
+    @timed()
     def clear_expired(self) -> int:
         """
         Remove expired cache entries.
@@ -124,34 +381,20 @@ class ResultsCache:
         Returns:
             int: Number of entries cleared
         """
-        metadata = self._load_metadata()
-        current_time = time.time()
-        expired_keys = []
+        cutoff = time.time() - self.cache_ttl
+        with self._transaction() as conn:
+            expired_keys = [
+                key for (key,) in conn.execute("SELECT cache_key FROM entries WHERE timestamp < ?", (cutoff,))
+            ]
+            conn.execute("DELETE FROM entries WHERE timestamp < ?", (cutoff,))
+        self._remove_entry_files(expired_keys)
 
-        for key, data in metadata.items():
-            if current_time - data['timestamp'] > self.cache_ttl:
-                cache_path = self._get_cache_path(key)
-                try:
-                    os.remove(cache_path)
-                except FileNotFoundError:
-                    pass
-                expired_keys.append(key)
-
-        for key in expired_keys:
-            del metadata[key]
-
-        self._save_metadata(metadata)
         return len(expired_keys)
 
     def clear_all(self) -> None:
         """Clear all cache entries."""
-        metadata = self._load_metadata()
-
-        for key in metadata:
-            cache_path = self._get_cache_path(key)
-            try:
-                os.remove(cache_path)
-            except FileNotFoundError:
-                pass
+        with self._transaction() as conn:
+            keys = [key for (key,) in conn.execute("SELECT cache_key FROM entries")]
+            conn.execute("DELETE FROM entries")
+        self._remove_entry_files(keys)
 
-        self._save_metadata({})
\ No newline at end of file
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from functools import cached_property
+from typing import Optional, Dict, Any, Iterable
+
+import numpy as np
+
+from src.audio.features import AudioFeatures
+from src.optimization.fingerprint import FileFingerprinter
+
+
+class FeatureNotStored(LookupError):
+    """Raised when reading a feature that was not stored for a track."""
+
+
+class StoredFeatures(AudioFeatures):
+    def __init__(self, feature_dir: str, metadata: Dict[str, Any]):
+        """
+        Feature bundle backed by memory-mapped .npy files.
+
+        Drop-in replacement for AudioFeatures in AudioAnalyzer.analyze_features,
+        without the audio signal.
+
+        Args:
+            feature_dir (str): Directory holding the stored arrays
+            metadata (Dict[str, Any]): Contents of the directory's meta.json
+        """
+        params = metadata['params']
+        super().__init__(None, params['sr'], hop_length=params['hop_length'],
+                         bins_per_octave=params.get('bins_per_octave', 36), n_octaves=params.get('n_octaves', 7))
+        self.feature_dir = feature_dir
+        self.metadata = metadata
+
+    @property
+    def params(self) -> dict:
+        return self.metadata['params']
+
+    @property
+    def names(self) -> tuple:
+        """Names of the stored features; entries written before this was recorded hold all of them."""
+        return tuple(self.metadata.get('features', FeatureStore.FEATURES))
+
+    def _load(self, name: str) -> np.ndarray:
+        if name not in self.names:
+            raise FeatureNotStored(f"{name} is not stored in {self.feature_dir}")
+        return np.load(os.path.join(self.feature_dir, f"{name}.npy"), mmap_mode='r')
+
+    @cached_property
+    def chroma(self) -> np.ndarray:
+        return self._load('chroma')
+
+    @cached_property
+    def harmonic(self) -> np.ndarray:
+        raise AttributeError("The harmonic signal is not stored, only its chromagram")
+
+    @cached_property
+    def harmonic_chroma(self) -> np.ndarray:
+        return self._load('harmonic_chroma')
+
+    @cached_property
+    def onset_env(self) -> np.ndarray:
+        return self._load('onset_env')
+
+    @cached_property
+    def spectral_centroid(self) -> np.ndarray:
+        return self._load('spectral_centroid')
+
+    @cached_property
+    def spectral_bandwidth(self) -> np.ndarray:
+        return self._load('spectral_bandwidth')
+
+    @cached_property
+    def zero_crossing_rate(self) -> np.ndarray:
+        return self._load('zero_crossing_rate')
+
+    @cached_property
+    def duration(self) -> float:
+        return self.metadata['duration']
+
+
+class FeatureStore:
+    FEATURES = (
+        'chroma', 'harmonic_chroma', 'onset_env',
+        'spectral_centroid', 'spectral_bandwidth', 'zero_crossing_rate'
+    )
+
+    def __init__(self, store_dir: str = "cache/features", fingerprinter: Optional[FileFingerprinter] = None):
+        """
+        Persistent store of intermediate per-track features.
+
+        Features are saved as .npy files in one directory per track and
+        parameter set, keyed by the track's content fingerprint and the
+        feature parameters, and loaded back memory-mapped. Analysis results can
+        then be re-derived (e.g. after changing key profiles) without decoding
+        the audio again.
+
+        Args:
+            store_dir (str): Root directory of the store
+            fingerprinter (Optional[FileFingerprinter]): Source of content fingerprints
+        """
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.fingerprinter = fingerprinter or FileFingerprinter(os.path.join(store_dir, "fingerprints.db"))
+
+    def _get_feature_dir(self, fingerprint: str, params: Dict[str, Any]) -> str:
+        """Get the directory of a fingerprint and parameter set."""
+        digest = hashlib.blake2b(
+            json.dumps({'fingerprint': fingerprint, 'params': params}, sort_keys=True).encode(),
+            digest_size=16
+        ).hexdigest()
+        return os.path.join(self.store_dir, digest[:2], digest)
+
+    def load(self, audio_path: str, params: Dict[str, Any],
+             names: Optional[Iterable[str]] = None) -> Optional[StoredFeatures]:
+        """
+        Load the stored features of an audio file.
+
+        Args:
+            audio_path (str): Path to the audio file
+            params (Dict[str, Any]): Feature parameters, as given by AudioFeatures.params
+            names (Optional[Iterable[str]]): Features that must be stored, e.g. AnalysisProfile.feature_names
+
+        Returns:
+            Optional[StoredFeatures]: Memory-mapped features or None if not stored
+        """
+        if not os.path.exists(audio_path):
+            return None
+
+        feature_dir = self._get_feature_dir(self.fingerprinter.fingerprint(audio_path), params)
+        try:
+            with open(os.path.join(feature_dir, "meta.json"), 'r') as f:
+                metadata = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        stored = StoredFeatures(feature_dir, metadata)
+        if names is not None and not set(names) <= set(stored.names):
+            return None
+        return stored
+
+    def save(self, audio_path: str, features: AudioFeatures, names: Optional[Iterable[str]] = None) -> str:
+        """
+        Store the features of an audio file.
+
+        The listed features are computed if needed; other features are only
+        stored when already computed, so saving never adds work the profile
+        skips (e.g. HPSS for the fast profile).
+
+        Args:
+            audio_path (str): Path to the audio file the features were computed from
+            features (AudioFeatures): Feature bundle of the file
+            names (Optional[Iterable[str]]): Features to store, all of FEATURES by default
+
+        Returns:
+            str: Directory holding the stored features
+        """
+        feature_dir = self._get_feature_dir(self.fingerprinter.fingerprint(audio_path), features.params)
+        if os.path.exists(os.path.join(feature_dir, "meta.json")):
+            return feature_dir
+
+        # Write into a private directory first so readers only ever see complete entries
+        tmp_dir = f"{feature_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            names = set(self.FEATURES if names is None else names)
+            # cached_property keeps computed features in the instance dict
+            stored = [name for name in self.FEATURES if name in names or name in vars(features)]
+            for name in stored:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(features, name)))
+            with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+                json.dump({
+                    'params': features.params,
+                    'features': stored,
+                    'duration': float(features.duration),
+                    'source': os.path.abspath(audio_path)
+                }, f)
+            try:
+                os.rename(tmp_dir, feature_dir)
+            except OSError:
+                # Another process stored the same features first
+                if not os.path.exists(os.path.join(feature_dir, "meta.json")):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return feature_dir
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from typing import Optional
+
+
+class FileFingerprinter:
+    def __init__(self, index_file: Optional[str] = None, sampled: bool = False,
+                 chunk_size: int = 1024 * 1024, sample_chunks: int = 16,
+                 max_entries: int = 100_000):
+        """
+        Content fingerprints for files with a stat() based fast path.
+
+        The first time a file is seen its content is hashed with BLAKE2b and the
+        result is stored under the file's (device, inode) together with its size
+        and modification time. Later lookups only stat() the file and reuse the
+        stored fingerprint as long as size and modification time are unchanged.
+
+        Args:
+            index_file (Optional[str]): SQLite file for the stat index, None to keep it in memory
+            sampled (bool): hash the size plus evenly spaced chunks instead of the whole file
+            chunk_size (int): read size, and size of every sampled chunk
+            sample_chunks (int): number of chunks hashed in sampled mode
+            max_entries (int): stat index entries kept before the oldest are pruned
+        """
+        self.index_file = index_file
+        self.sampled = sampled
+        self.chunk_size = chunk_size
+        self.sample_chunks = sample_chunks
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._memory_conn = None
+        self._memory_lock = threading.Lock()
+
+        with self._lock():
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "device INTEGER NOT NULL, "
+                "inode INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "fingerprint TEXT NOT NULL, "
+                "last_seen REAL NOT NULL, "
+                "PRIMARY KEY (device, inode))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_last_seen ON fingerprints (last_seen)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection of the current thread (shared when in memory)."""
+        if self.index_file is None:
+            if self._memory_conn is None:
+                self._memory_conn = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+            return self._memory_conn
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_file)), exist_ok=True)
+            conn = sqlite3.connect(self.index_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lock(self):
+        """In-memory indexes share one connection, so serialize access to it."""
+        return self._memory_lock if self.index_file is None else nullcontext()
+
+    def fingerprint(self, file_path: str) -> str:
+        """
+        Get the content fingerprint of a file.
+
+        Args:
+            file_path (str): Path to the file
+
+        Returns:
+            str: Fingerprint, prefixed with the hashing scheme
+        """
+        st = os.stat(file_path)
+
+        with self._lock():
+            row = self._connection().execute(
+                "SELECT fingerprint FROM fingerprints "
+                "WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        fingerprint = self.hash_file(file_path, st.st_size)
+        with self._lock():
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO fingerprints "
+                "(device, inode, size, mtime_ns, fingerprint, last_seen) VALUES (?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, fingerprint, time.time())
+            )
+            self._prune(conn)
+        return fingerprint
+
+    def hash_file(self, file_path: str, size: Optional[int] = None) -> str:
+        """
+        Hash a file's content without consulting the stat index.
+
+        Args:
+            file_path (str): Path to the file
+            size (Optional[int]): File size if already known
+
+        Returns:
+            str: Fingerprint, prefixed with the hashing scheme
+        """
+        if size is None:
+            size = os.path.getsize(file_path)
+
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(size.to_bytes(8, 'little'))
+        with open(file_path, 'rb') as f:
+            if self.sampled and size > self.chunk_size * self.sample_chunks:
+                step = (size - self.chunk_size) // (self.sample_chunks - 1)
+                for i in range(self.sample_chunks):
+                    f.seek(i * step)
+                    hasher.update(f.read(self.chunk_size))
+                return f"b2s:{hasher.hexdigest()}"
+
+            while buf := f.read(self.chunk_size):
+                hasher.update(buf)
+        return f"b2:{hasher.hexdigest()}"
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """Drop the least recently hashed entries once the index is over its size."""
+        count = conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM fingerprints WHERE rowid IN "
+                "(SELECT rowid FROM fingerprints ORDER BY last_seen LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
@@ -0,0 +1,473 @@
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from filelock import FileLock
+
+from src.audio.profiles import DEFAULT_PROFILE
+from src.optimization.fingerprint import FileFingerprinter
+from src.utils.metrics import timed
+
+DEFAULT_VARIANT = DEFAULT_PROFILE.cache_variant
+
+TRACK_SCHEMA = pa.schema([
+    ('track_id', pa.string()),
+    ('variant', pa.string()),
+    ('path', pa.string()),
+    ('analyzed_at', pa.float64()),
+    ('key', pa.string()),
+    ('mode', pa.string()),
+    ('key_uncertain', pa.bool_()),
+    ('bpm', pa.float64()),
+    ('key_confidence', pa.float64()),
+    ('duration', pa.float64()),
+    ('tempo_confidence', pa.float64()),
+    ('key_strength', pa.float64()),
+    ('spectral_bandwidth', pa.float64()),
+    ('zero_crossing_rate', pa.float64()),
+])
+
+SEGMENT_SCHEMA = pa.schema([
+    ('track_id', pa.string()),
+    ('variant', pa.string()),
+    ('analyzed_at', pa.float64()),
+    ('start', pa.float64()),
+    ('end', pa.float64()),
+    ('key', pa.string()),
+    ('mode', pa.string()),
+    ('bpm', pa.float64()),
+    ('key_confidence', pa.float64()),
+    ('tempo_confidence', pa.float64()),
+])
+
+# additional_info entries stored as columns
+TOMBSTONE_SUFFIX = ".removed"  # marks a compacted part, '.<part>.removed'
+
+INFO_COLUMNS = ('duration', 'tempo_confidence', 'key_strength', 'spectral_bandwidth', 'zero_crossing_rate')
+
+_KEY_PATTERN = re.compile(r'^(?P<key>[A-G]#?) (?P<mode>major|minor)(?P<uncertain> \(uncertain\))?$')
+
+
+def parse_key(label: Optional[str]) -> Tuple[Optional[str], Optional[str], bool]:
+    """
+    Split an analyzer key label such as "A minor (uncertain)".
+
+    Returns:
+        Tuple[Optional[str], Optional[str], bool]: tonic, mode and whether the key was marked uncertain
+    """
+    match = _KEY_PATTERN.match(label or '')
+    if match is None:
+        return None, None, False
+    return match['key'], match['mode'], match['uncertain'] is not None
+
+
+def _float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+class ResultsStore:
+    TRACKS = "tracks"
+    SEGMENTS = "segments"
+
+    def __init__(self, store_dir: str = "cache/results_store", fingerprinter: Optional[FileFingerprinter] = None,
+                 buffer_size: int = 1000, compact_after: int = 64, row_group_size: int = 64 * 1024):
+        """
+        Append-only Parquet dataset of analysis results for library-wide queries.
+
+        Every append writes a new part file, so analysis workers never rewrite
+        existing data, and compaction periodically merges the parts into one
+        file sorted by key, mode and BPM, keeping only the latest result of
+        each track. Queries read only the columns they need and push filters
+        down to the Parquet row group statistics.
+
+        A track is identified by its content fingerprint and the analysis
+        variant (profile) that produced it; when a track was analysed more
+        than once, queries return the latest result.
+
+        Args:
+            store_dir (str): Root directory of the dataset
+            fingerprinter (Optional[FileFingerprinter]): Source of content fingerprints
+            buffer_size (int): Rows buffered by add() before they are written
+            compact_after (int): Part files from which flush() compacts the dataset
+            row_group_size (int): Rows per row group of compacted files
+        """
+        self.store_dir = store_dir
+        self.buffer_size = buffer_size
+        self.compact_after = compact_after
+        self.row_group_size = row_group_size
+        for name in (self.TRACKS, self.SEGMENTS):
+            os.makedirs(os.path.join(store_dir, name), exist_ok=True)
+        self.fingerprinter = fingerprinter or FileFingerprinter(os.path.join(store_dir, "fingerprints.db"))
+        self._compact_lock = FileLock(os.path.join(store_dir, ".compact.lock"))
+        self._buffer_lock = threading.Lock()
+        self._tracks: List[Dict[str, Any]] = []
+        self._segments: List[Dict[str, Any]] = []
+
+    def _dir(self, name: str) -> str:
+        return os.path.join(self.store_dir, name)
+
+    def _parts(self, name: str) -> List[str]:
+        """
+        Visible Parquet files of a dataset.
+
+        In-progress files start with a dot, and so do the tombstones of
+        compacted parts: a part with a tombstone is hidden but only removed
+        by the next compaction, so readers that listed it can still open it.
+        """
+        directory = self._dir(name)
+        entries = os.listdir(directory)
+        tombstoned = {entry[1:-len(TOMBSTONE_SUFFIX)] for entry in entries if entry.endswith(TOMBSTONE_SUFFIX)}
+        return sorted(
+            os.path.join(directory, entry) for entry in entries
+            if entry.endswith('.parquet') and not entry.startswith('.') and entry not in tombstoned
+        )
+
+    def _remove_tombstoned(self, name: str) -> int:
+        """Delete the parts tombstoned by an earlier compaction, and their tombstones."""
+        directory = self._dir(name)
+        removed = 0
+        for entry in os.listdir(directory):
+            if entry.endswith(TOMBSTONE_SUFFIX):
+                for path in (os.path.join(directory, entry[1:-len(TOMBSTONE_SUFFIX)]), os.path.join(directory, entry)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _tombstone(path: str) -> None:
+        directory, file_name = os.path.split(path)
+        open(os.path.join(directory, f".{file_name}{TOMBSTONE_SUFFIX}"), 'w').close()
+
+    @staticmethod
+    def _read(read: Callable[[], pa.Table], attempts: int = 3) -> pa.Table:
+        """Run a read, listing the parts again if one disappeared meanwhile."""
+        for attempt in range(attempts):
+            try:
+                return read()
+            except FileNotFoundError:
+                if attempt == attempts - 1:
+                    raise
+
+    def _dataset(self, name: str) -> ds.Dataset:
+        schema = TRACK_SCHEMA if name == self.TRACKS else SEGMENT_SCHEMA
+        return ds.dataset(self._parts(name), schema=schema, format='parquet')
+
+    def _write_part(self, name: str, table: pa.Table, prefix: str = "part") -> str:
+        """Write a table as a new file, renamed into place so readers never see partial files."""
+        file_name = f"{prefix}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(self._dir(name), file_name)
+        tmp_path = os.path.join(self._dir(name), f".{file_name}.tmp")
+        pq.write_table(table, tmp_path, compression='zstd', row_group_size=self.row_group_size)
+        os.replace(tmp_path, path)
+        return path
+
+    def _track_row(self, audio_path: str, results: Dict[str, Any], variant: str, analyzed_at: float) -> Dict[str, Any]:
+        key, mode, uncertain = parse_key(results.get('key'))
+        info = results.get('additional_info') or {}
+        sampling = results.get('sampling') or {}
+        return {
+            'track_id': self.fingerprinter.fingerprint(audio_path),
+            'variant': variant,
+            'path': os.path.abspath(audio_path),
+            'analyzed_at': analyzed_at,
+            'key': key,
+            'mode': mode,
+            'key_uncertain': uncertain,
+            'bpm': _float(results.get('bpm')),
+            'key_confidence': _float(sampling.get('key_confidence')),
+            **{column: _float(info.get(column)) for column in INFO_COLUMNS}
+        }
+
+    @staticmethod
+    def _segment_rows(track: Dict[str, Any], segments: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        rows = []
+        for segment in segments:
+            key, mode = segment.get('key'), segment.get('mode')
+            if mode is None:
+                key, mode, _ = parse_key(key)
+            rows.append({
+                'track_id': track['track_id'],
+                'variant': track['variant'],
+                'analyzed_at': track['analyzed_at'],
+                'start': float(segment['start']),
+                'end': float(segment['end']),
+                'key': key,
+                'mode': mode,
+                'bpm': _float(segment.get('bpm')),
+                'key_confidence': _float(segment.get('key_confidence')),
+                'tempo_confidence': _float(segment.get('tempo_confidence'))
+            })
+        return rows
+
+    def _rows(self, results: Dict[str, Dict[str, Any]], variant: Optional[str],
+              segments: Optional[Dict[str, Sequence[Dict[str, Any]]]]) -> Tuple[List[Dict], List[Dict]]:
+        now = time.time()
+        track_rows, segment_rows = [], []
+        for audio_path, result in results.items():
+            track = self._track_row(audio_path, result, variant or DEFAULT_VARIANT, now)
+            track_rows.append(track)
+            if segments and audio_path in segments:
+                segment_rows.extend(self._segment_rows(track, segments[audio_path]))
+        return track_rows, segment_rows
+
+    @timed()
+    def append(self, results: Dict[str, Dict[str, Any]], variant: Optional[str] = None,
+               segments: Optional[Dict[str, Sequence[Dict[str, Any]]]] = None) -> None:
+        """
+        Write analysis results as a new part of the dataset.
+
+        Args:
+            results (Dict[str, Dict[str, Any]]): Analysis results by audio path
+            variant (Optional[str]): Analysis variant, see AnalysisProfile.cache_variant
+            segments (Optional[Dict[str, Sequence[Dict[str, Any]]]]): Per-segment estimates by audio path,
+                dicts with start, end (seconds), key and optionally mode, bpm, key_confidence, tempo_confidence
+        """
+        track_rows, segment_rows = self._rows(results, variant, segments)
+        self._write_rows(track_rows, segment_rows)
+
+    def _write_rows(self, track_rows: List[Dict[str, Any]], segment_rows: List[Dict[str, Any]]) -> None:
+        # Segments first, so a track's segments exist whenever the track row is visible
+        if segment_rows:
+            self._write_part(self.SEGMENTS, pa.Table.from_pylist(segment_rows, schema=SEGMENT_SCHEMA))
+        if track_rows:
+            self._write_part(self.TRACKS, pa.Table.from_pylist(track_rows, schema=TRACK_SCHEMA))
+
+    def add(self, audio_path: str, results: Dict[str, Any], variant: Optional[str] = None,
+            segments: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """
+        Buffer one result, writing the buffer once it holds buffer_size rows.
+
+        Thread-safe; call flush() (or close()) to write the remaining rows.
+        """
+        track_rows, segment_rows = self._rows({audio_path: results}, variant,
+                                              {audio_path: segments} if segments else None)
+        with self._buffer_lock:
+            self._tracks.extend(track_rows)
+            self._segments.extend(segment_rows)
+            full = len(self._tracks) >= self.buffer_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows, compacting the dataset when it has too many parts."""
+        with self._buffer_lock:
+            track_rows, self._tracks = self._tracks, []
+            segment_rows, self._segments = self._segments, []
+        self._write_rows(track_rows, segment_rows)
+        if len(self._parts(self.TRACKS)) >= self.compact_after:
+            self.compact()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def _newest(table: pa.Table) -> pa.Table:
+        """(track_id, variant, analyzed_at) of the newest analysis of every track in a table."""
+        newest = table.group_by(['track_id', 'variant']).aggregate([('analyzed_at', 'max')])
+        return newest.select(['track_id', 'variant', 'analyzed_at_max']) \
+            .rename_columns(['track_id', 'variant', 'analyzed_at'])
+
+    @staticmethod
+    def _latest_mask(table: pa.Table) -> np.ndarray:
+        """Mask of the newest row of every (track_id, variant) in a table sorted by them and analyzed_at desc."""
+        ids = pc.binary_join_element_wise(table['track_id'], table['variant'], '\x00').to_numpy(zero_copy_only=False)
+        mask = np.ones(len(ids), dtype=bool)
+        mask[1:] = ids[1:] != ids[:-1]
+        return mask
+
+    @timed()
+    def compact(self) -> Dict[str, int]:
+        """
+        Merge the part files of both datasets, keeping the latest result of every track.
+
+        Only files present when compaction starts are merged, so appends can
+        continue meanwhile. Merged parts are tombstoned rather than removed,
+        as queries may have listed them, and removed by the next compaction.
+
+        Returns:
+            Dict[str, int]: rows kept per dataset
+        """
+        kept = {}
+        with self._compact_lock:
+            for name in (self.TRACKS, self.SEGMENTS):
+                self._remove_tombstoned(name)
+            track_files = self._parts(self.TRACKS)
+            segment_files = self._parts(self.SEGMENTS)
+            if len(track_files) <= 1 and len(segment_files) <= 1 and all(
+                    os.path.basename(path).startswith("compact-") for path in track_files + segment_files):
+                return {self.TRACKS: sum(pq.read_metadata(path).num_rows for path in track_files),
+                        self.SEGMENTS: sum(pq.read_metadata(path).num_rows for path in segment_files)}
+
+            tracks = ds.dataset(track_files, schema=TRACK_SCHEMA, format='parquet').to_table()
+            tracks = tracks.sort_by([('track_id', 'ascending'), ('variant', 'ascending'),
+                                     ('analyzed_at', 'descending')])
+            tracks = tracks.filter(pa.array(self._latest_mask(tracks)))
+            latest = tracks.select(['track_id', 'variant', 'analyzed_at'])
+
+            segments = ds.dataset(segment_files, schema=SEGMENT_SCHEMA, format='parquet').to_table()
+            # Segments whose track row is not visible yet belong to an append in progress
+            in_flight = segments.join(latest, keys=['track_id', 'variant'], join_type='left anti')
+            segments = pa.concat_tables([
+                segments.join(latest, keys=['track_id', 'variant', 'analyzed_at'], join_type='inner'),
+                in_flight
+            ]).select(SEGMENT_SCHEMA.names)
+
+            # Sorting clusters similar values in row groups, so their statistics prune more
+            if tracks.num_rows:
+                self._write_part(self.TRACKS, tracks.sort_by([('key', 'ascending'), ('mode', 'ascending'),
+                                                              ('bpm', 'ascending')]), prefix="compact")
+            if segments.num_rows:
+                self._write_part(self.SEGMENTS, segments.sort_by([('track_id', 'ascending'),
+                                                                  ('start', 'ascending')]), prefix="compact")
+            for path in track_files + segment_files:
+                self._tombstone(path)
+            kept[self.TRACKS] = tracks.num_rows
+            kept[self.SEGMENTS] = segments.num_rows
+        return kept
+
+    @staticmethod
+    def _expression(filter: Optional[ds.Expression], key: Optional[str], mode: Optional[str],
+                    min_bpm: Optional[float], max_bpm: Optional[float],
+                    variant: Optional[str]) -> Optional[ds.Expression]:
+        if key is not None and mode is None:
+            key, mode, _ = parse_key(key) if ' ' in key else (key, None, False)
+        conditions = [] if filter is None else [filter]
+        if variant is not None:
+            conditions.append(ds.field('variant') == variant)
+        if key is not None:
+            conditions.append(ds.field('key') == key)
+        if mode is not None:
+            conditions.append(ds.field('mode') == mode)
+        if min_bpm is not None:
+            conditions.append(ds.field('bpm') >= min_bpm)
+        if max_bpm is not None:
+            conditions.append(ds.field('bpm') <= max_bpm)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def _latest_only(self, dataset: ds.Dataset, table: pa.Table) -> pa.Table:
+        """Drop rows superseded by a newer result of the same track, looking only at the tracks found."""
+        ids = pc.unique(table['track_id'])
+        newest = self._newest(dataset.to_table(columns=['track_id', 'variant', 'analyzed_at'],
+                                               filter=ds.field('track_id').isin(ids)))
+        joined = table.join(newest, keys=['track_id', 'variant', 'analyzed_at'], join_type='inner')
+        # Identical rows (a part and its compacted copy read together) collapse to one
+        joined = joined.sort_by([('track_id', 'ascending'), ('variant', 'ascending')])
+        joined = joined.filter(pa.array(self._latest_mask(joined)))
+        return joined.select(table.column_names)
+
+    @timed()
+    def query(self, filter: Optional[ds.Expression] = None, columns: Optional[List[str]] = None,
+              key: Optional[str] = None, mode: Optional[str] = None,
+              min_bpm: Optional[float] = None, max_bpm: Optional[float] = None,
+              variant: Optional[str] = DEFAULT_VARIANT, latest: bool = True) -> pa.Table:
+        """
+        Select tracks, pushing the filters down to the Parquet files.
+
+        Example:
+            store.query(key="A minor", min_bpm=120, max_bpm=128, columns=['path', 'bpm'])
+
+        Args:
+            filter (Optional[ds.Expression]): Extra condition, e.g. ds.field('duration') > 600
+            columns (Optional[List[str]]): Columns to return, all by default
+            key (Optional[str]): Tonic ("A") or full key ("A minor")
+            mode (Optional[str]): "major" or "minor"
+            min_bpm (Optional[float]): Lowest BPM, inclusive
+            max_bpm (Optional[float]): Highest BPM, inclusive
+            variant (Optional[str]): Analysis variant, None for all
+            latest (bool): Skip results superseded by a newer analysis of the same track
+
+        Returns:
+            pa.Table: matching tracks
+        """
+        expression = self._expression(filter, key, mode, min_bpm, max_bpm, variant)
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys([*columns, 'track_id', 'variant', 'analyzed_at']))
+
+        def read() -> pa.Table:
+            dataset = self._dataset(self.TRACKS)
+            table = dataset.to_table(columns=read_columns, filter=expression)
+            if latest and table.num_rows:
+                table = self._latest_only(dataset, table)
+            return table
+
+        table = self._read(read)
+        return table.select(columns) if columns is not None else table
+
+    @timed()
+    def segments(self, track_ids: Optional[Sequence[str]] = None, filter: Optional[ds.Expression] = None,
+                 variant: Optional[str] = DEFAULT_VARIANT) -> pa.Table:
+        """
+        Per-segment time series of the latest analysis of each track.
+
+        Args:
+            track_ids (Optional[Sequence[str]]): Track fingerprints, e.g. from query(columns=['track_id'])
+            filter (Optional[ds.Expression]): Extra condition on segment columns
+            variant (Optional[str]): Analysis variant, None for all
+
+        Returns:
+            pa.Table: segments sorted by track and start time
+        """
+        conditions = [] if filter is None else [filter]
+        if track_ids is not None:
+            conditions.append(ds.field('track_id').isin(list(track_ids)))
+        if variant is not None:
+            conditions.append(ds.field('variant') == variant)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        def read() -> pa.Table:
+            table = self._dataset(self.SEGMENTS).to_table(filter=expression)
+            if table.num_rows:
+                # Keep the segments of the analysis the track rows point at
+                latest = self._newest(self._dataset(self.TRACKS).to_table(
+                    columns=['track_id', 'variant', 'analyzed_at'],
+                    filter=ds.field('track_id').isin(pc.unique(table['track_id']))
+                ))
+                table = table.join(latest, keys=['track_id', 'variant', 'analyzed_at'], join_type='inner')
+            return table
+
+        return self._read(read).select(SEGMENT_SCHEMA.names).sort_by([('track_id', 'ascending'), ('start', 'ascending')])
+
+    @timed()
+    def export(self, path: str, **query) -> int:
+        """
+        Write the tracks matching a query to a .csv or .parquet file.
+
+        Args:
+            path (str): Output file, its extension selects the format
+            **query: Arguments of query()
+
+        Returns:
+            int: rows written
+        """
+        table = self.query(**query)
+        if path.endswith('.csv'):
+            pa_csv.write_csv(table, path)
+        elif path.endswith('.parquet'):
+            pq.write_table(table, path, compression='zstd')
+        else:
+            raise ValueError(f"Unsupported export format: {path}")
+        return table.num_rows
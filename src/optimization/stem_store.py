@@ -0,0 +1,382 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from src.utils.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+STEM_EXTENSION = '.wav'  # encoded downloads (.flac, .opus) are cached next to the stems
+
+
+class StemStore:
+    def __init__(self, store_dir: str = "temp/stems", max_bytes: Optional[int] = 10 * 1024 ** 3,
+                 lease_ttl: float = 60 * 60, min_age: float = 5 * 60, staging_ttl: float = 24 * 60 * 60):
+        """
+        Content-addressed store of separated stems.
+
+        Stems are stored once per (audio fingerprint, model), so the same song
+        uploaded again, under any name, reuses the stems of the first upload
+        instead of running the model again. An SQLite index, safe across
+        processes, tracks every entry's size and last access.
+
+        Readers that need stems to stay on disk (e.g. a session offering
+        them for download) hold a lease on them; leases expire after
+        lease_ttl unless renewed, so crashed sessions don't pin stems forever.
+        Download links published outside the store are tracked with the lease
+        they were offered under and removed once it ends. collect(), run
+        periodically by start_collector(), evicts the least recently used
+        entries without a live lease until the store fits in max_bytes.
+
+        Args:
+            store_dir (str): Directory holding the stems and their index
+            max_bytes (Optional[int]): Disk quota, None for no limit
+            lease_ttl (float): Seconds a lease lasts unless renewed
+            min_age (float): Seconds after their last access during which entries are never
+                evicted, covering the gap between a lookup and the caller's lease
+            staging_ttl (float): Seconds after which abandoned staging directories are removed
+        """
+        self.store_dir = os.path.abspath(store_dir)
+        self.objects_dir = os.path.join(self.store_dir, "objects")
+        self.staging_root = os.path.join(self.store_dir, "staging")
+        self.index_file = os.path.join(self.store_dir, "stems.db")
+        self.max_bytes = max_bytes
+        self.lease_ttl = lease_ttl
+        self.min_age = min_age
+        self.staging_ttl = staging_ttl
+        self._local = threading.local()
+        self._collector: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_root, exist_ok=True)
+
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stems ("
+                "stem_key TEXT PRIMARY KEY, "
+                "fingerprint TEXT NOT NULL, "
+                "model TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "created REAL NOT NULL, "
+                "last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_stems_last_access ON stems (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "holder TEXT NOT NULL, "
+                "stem_key TEXT NOT NULL, "
+                "expires REAL NOT NULL, "
+                "PRIMARY KEY (holder, stem_key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_leases_stem_key ON leases (stem_key, expires)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS links ("
+                "holder TEXT NOT NULL, "
+                "link_dir TEXT NOT NULL, "
+                "stem_key TEXT NOT NULL, "
+                "PRIMARY KEY (holder, link_dir))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_links_link_dir ON links (link_dir)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the SQLite connection of the current thread."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements inside one write transaction, rolling back on errors."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def stem_key(fingerprint: str, model: str) -> str:
+        """Key of the stems of some audio content separated by a model."""
+        return f"{fingerprint}-{model}".replace(':', '-').replace('/', '-')
+
+    def _entry_dir(self, stem_key: str) -> str:
+        return os.path.join(self.objects_dir, stem_key)
+
+    def _stems(self, stem_key: str) -> Dict[str, str]:
+        """Stem name -> path of every stem of an entry."""
+        entry_dir = self._entry_dir(stem_key)
+        return {
+            os.path.splitext(name)[0]: os.path.join(entry_dir, name)
+            for name in sorted(os.listdir(entry_dir))
+            if name.endswith(STEM_EXTENSION)
+        }
+
+    def lookup(self, fingerprint: str, model: str) -> Optional[Dict[str, str]]:
+        """
+        Get the stored stems of some audio, marking them as recently used.
+
+        Args:
+            fingerprint (str): Content fingerprint of the audio file
+            model (str): Separation model, e.g. 'spleeter:2stems'
+
+        Returns:
+            Optional[Dict[str, str]]: Path of every stem by name, None if not stored
+        """
+        stem_key = self.stem_key(fingerprint, model)
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE stems SET last_access = ? WHERE stem_key = ?", (time.time(), stem_key)
+            ).rowcount
+        if not updated:
+            return None
+        try:
+            return self._stems(stem_key)
+        except FileNotFoundError:
+            # Removed behind the index's back
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM stems WHERE stem_key = ?", (stem_key,))
+            return None
+
+    def staging_dir(self) -> str:
+        """Create a private directory for the separator to write new stems into before commit()."""
+        path = os.path.join(self.staging_root, uuid.uuid4().hex)
+        os.makedirs(path)
+        return path
+
+    @timed('stem_store.commit')
+    def commit(self, fingerprint: str, model: str, staging_dir: str) -> Dict[str, str]:
+        """
+        Move freshly separated stems into the store.
+
+        When the same audio was stored meanwhile (e.g. by a concurrent upload),
+        the stored stems win and the staged ones are discarded.
+
+        Args:
+            fingerprint (str): Content fingerprint of the audio file
+            model (str): Separation model
+            staging_dir (str): Directory from staging_dir() holding the stems
+
+        Returns:
+            Dict[str, str]: Path of every stored stem by name
+        """
+        stem_key = self.stem_key(fingerprint, model)
+        entry_dir = self._entry_dir(stem_key)
+        size = _dir_size(staging_dir)
+        now = time.time()
+        with self._transaction() as conn:
+            exists = conn.execute("SELECT 1 FROM stems WHERE stem_key = ?", (stem_key,)).fetchone()
+            if exists:
+                conn.execute("UPDATE stems SET last_access = ? WHERE stem_key = ?", (now, stem_key))
+            else:
+                # Leftover of an entry whose index row is gone
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(staging_dir, entry_dir)
+                conn.execute(
+                    "INSERT INTO stems (stem_key, fingerprint, model, size, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (stem_key, fingerprint, model, size, now, now)
+                )
+        if exists:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return self._stems(stem_key)
+
+    def lease(self, stem_key: str, holder: str, ttl: Optional[float] = None) -> bool:
+        """
+        Keep an entry from being evicted, or renew the holder's lease on it.
+
+        Args:
+            stem_key (str): Entry to keep
+            holder (str): Lease owner, e.g. a session id; one lease per holder and entry
+            ttl (Optional[float]): Seconds the lease lasts, lease_ttl by default
+
+        Returns:
+            bool: False if the entry is no longer stored
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if not conn.execute("SELECT 1 FROM stems WHERE stem_key = ?", (stem_key,)).fetchone():
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (holder, stem_key, expires) VALUES (?, ?, ?)",
+                (holder, stem_key, now + (self.lease_ttl if ttl is None else ttl))
+            )
+            conn.execute("UPDATE stems SET last_access = ? WHERE stem_key = ?", (now, stem_key))
+        return True
+
+    def track_link(self, stem_key: str, holder: str, link_dir: str) -> bool:
+        """
+        Keep a published copy of an entry's files (see encoder.publish) only as long as a lease.
+
+        The directory is removed by collect() once no holder that published
+        it has a live lease on the entry, and files copied rather than hard
+        linked count towards the entry's size meanwhile.
+
+        Args:
+            stem_key (str): Entry the published files come from
+            holder (str): Holder of the lease the link is offered under
+            link_dir (str): Directory holding the published files
+
+        Returns:
+            bool: False if the holder has no live lease on the entry
+        """
+        with self._transaction() as conn:
+            if not conn.execute(
+                "SELECT 1 FROM leases WHERE holder = ? AND stem_key = ? AND expires > ?",
+                (holder, stem_key, time.time())
+            ).fetchone():
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO links (holder, link_dir, stem_key) VALUES (?, ?, ?)",
+                (holder, os.path.abspath(link_dir), stem_key)
+            )
+        return True
+
+    def release(self, stem_key: str, holder: str) -> None:
+        """Drop a holder's lease; the entry becomes evictable once no lease is left."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE holder = ? AND stem_key = ?", (holder, stem_key))
+
+    def usage(self) -> Dict[str, int]:
+        """Stored bytes, entries and live leases."""
+        conn = self._connection()
+        total_bytes, entries = conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM stems").fetchone()
+        leases = conn.execute("SELECT COUNT(*) FROM leases WHERE expires > ?", (time.time(),)).fetchone()[0]
+        return {'bytes': total_bytes, 'entries': entries, 'leases': leases}
+
+    @timed('stem_store.collect')
+    def collect(self) -> Dict[str, int]:
+        """
+        Enforce the quota by evicting least recently used, unleased entries.
+
+        Entry sizes are refreshed first, since encoded downloads are added
+        next to the stems after they are stored, and published copies are
+        counted with their entry. Expired leases, the links published under
+        them and abandoned staging directories are removed along the way.
+
+        Returns:
+            Dict[str, int]: Evicted entries and the bytes they freed
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+            stale = [row[0] for row in conn.execute(
+                "SELECT DISTINCT link_dir FROM links WHERE NOT EXISTS "
+                "(SELECT 1 FROM leases WHERE leases.holder = links.holder AND leases.stem_key = links.stem_key)"
+            )]
+            conn.execute(
+                "DELETE FROM links WHERE NOT EXISTS "
+                "(SELECT 1 FROM leases WHERE leases.holder = links.holder AND leases.stem_key = links.stem_key)"
+            )
+            # Directories shared with sessions whose lease is still live stay published
+            unlinked = [link_dir for link_dir in stale
+                        if not conn.execute("SELECT 1 FROM links WHERE link_dir = ?", (link_dir,)).fetchone()]
+            keys = [row[0] for row in conn.execute("SELECT stem_key FROM stems")]
+            links = conn.execute("SELECT DISTINCT stem_key, link_dir FROM links").fetchall()
+        for link_dir in unlinked:
+            shutil.rmtree(link_dir, ignore_errors=True)
+
+        sizes = {stem_key: _dir_size(self._entry_dir(stem_key)) for stem_key in keys}
+        for stem_key, link_dir in links:
+            if stem_key in sizes:
+                # Hard links share the entry's blocks; copies (across filesystems) take their own
+                sizes[stem_key] += _dir_size(link_dir, copies_only=True)
+        sizes = [(size, stem_key) for stem_key, size in sizes.items()]
+        with self._transaction() as conn:
+            conn.executemany("UPDATE stems SET size = ? WHERE stem_key = ?", sizes)
+
+        evicted = {'evicted': 0, 'freed_bytes': 0}
+        if self.max_bytes is not None:
+            with self._transaction() as conn:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM stems").fetchone()[0]
+                victims = []
+                if total > self.max_bytes:
+                    candidates = conn.execute(
+                        "SELECT stem_key, size FROM stems "
+                        "WHERE last_access < ? AND NOT EXISTS "
+                        "(SELECT 1 FROM leases WHERE leases.stem_key = stems.stem_key AND expires > ?) "
+                        "ORDER BY last_access",
+                        (now - self.min_age, now)
+                    ).fetchall()
+                    for stem_key, size in candidates:
+                        if total <= self.max_bytes:
+                            break
+                        victims.append(stem_key)
+                        total -= size
+                        evicted['freed_bytes'] += size
+                    conn.executemany("DELETE FROM stems WHERE stem_key = ?", [(key,) for key in victims])
+            # Unindexed now, so no new lookup or lease can reach them
+            for stem_key in victims:
+                shutil.rmtree(self._entry_dir(stem_key), ignore_errors=True)
+            evicted['evicted'] = len(victims)
+
+        for name in os.listdir(self.staging_root):
+            path = os.path.join(self.staging_root, name)
+            try:
+                if os.path.getmtime(path) < now - self.staging_ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+        return evicted
+
+    def start_collector(self, interval: float = 60.0) -> None:
+        """Run collect() every interval seconds on a daemon thread."""
+        if self._collector is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.collect()
+                except Exception:
+                    logger.exception("Stem store collection failed, retrying in %s s", interval)
+
+        self._collector = threading.Thread(target=run, name="stem-store-collector", daemon=True)
+        self._collector.start()
+
+    def close(self) -> None:
+        """Stop the background collector."""
+        self._stop.set()
+        if self._collector is not None:
+            self._collector.join()
+            self._collector = None
+
+
+def _dir_size(path: str, copies_only: bool = False) -> int:
+    """Bytes of the files directly inside a directory, 0 if it is missing; copies_only skips hard links."""
+    try:
+        stats = [entry.stat() for entry in os.scandir(path) if entry.is_file()]
+    except FileNotFoundError:
+        return 0
+    return sum(stat.st_size for stat in stats if not (copies_only and stat.st_nlink > 1))
+
+
+_stem_store: Optional[StemStore] = None
+_stem_store_lock = threading.Lock()
+
+
+def get_stem_store() -> StemStore:
+    """
+    Get the process-wide stem store, with its collector running.
+
+    The directory and quota come from STEM_STORE_DIR and STEM_STORE_MAX_BYTES
+    (0 for no quota).
+    """
+    global _stem_store
+    with _stem_store_lock:
+        if _stem_store is None:
+            max_bytes = int(os.environ.get('STEM_STORE_MAX_BYTES', 10 * 1024 ** 3))
+            _stem_store = StemStore(os.environ.get('STEM_STORE_DIR', "temp/stems"), max_bytes=max_bytes or None)
+            _stem_store.start_collector()
+        return _stem_store
@@ -0,0 +1,243 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("audio_analyzer.metrics")
+
+# Upper bounds of the wall time histogram, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class _StageStats:
+    __slots__ = ('count', 'errors', 'wall_seconds', 'cpu_seconds', 'memory_bytes', 'max_memory_bytes',
+                 'max_wall_seconds', 'buckets')
+
+    def __init__(self, n_buckets: int):
+        self.count = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.memory_bytes = 0
+        self.max_memory_bytes = 0
+        self.max_wall_seconds = 0.0
+        self.buckets = [0] * n_buckets
+
+
+class _MemoryFrame:
+    __slots__ = ('start', 'peak')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+
+
+class MetricsRegistry:
+    def __init__(self, trace_memory: Optional[bool] = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Per-stage wall time, CPU time and allocated memory.
+
+        CPU time is the time of the calling thread, so stages running in
+        parallel threads are not charged for each other. Memory is the peak
+        of Python and numpy allocations traced by tracemalloc during the stage;
+        tracing slows allocation-heavy code down and is off unless enabled here
+        or with AUDIO_ANALYZER_TRACE_MEMORY=1.
+
+        Args:
+            trace_memory (Optional[bool]): Trace allocations, None to read the environment
+            buckets (Tuple[float, ...]): Upper bounds of the wall time histogram in seconds
+        """
+        if trace_memory is None:
+            trace_memory = os.environ.get("AUDIO_ANALYZER_TRACE_MEMORY", "") not in ("", "0")
+        self.trace_memory = trace_memory
+        self.buckets = tuple(buckets)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._memory_frames = []
+        self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Measure the enclosed block as one run of a stage; exceptions are counted and re-raised."""
+        frame = self._start_memory() if self.trace_memory else None
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            memory = self._stop_memory(frame) if frame is not None else 0
+            self.record(name, wall, cpu, memory, failed)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """Decorator measuring every call of a function as a stage, named after it by default."""
+        def decorator(fn: Callable) -> Callable:
+            stage_name = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, wall: float, cpu: float, memory: int = 0, failed: bool = False) -> None:
+        """Add one run of a stage and log it as a JSON record."""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = _StageStats(len(self.buckets))
+            stats.count += 1
+            stats.errors += failed
+            stats.wall_seconds += wall
+            stats.cpu_seconds += cpu
+            stats.memory_bytes += memory
+            stats.max_memory_bytes = max(stats.max_memory_bytes, memory)
+            stats.max_wall_seconds = max(stats.max_wall_seconds, wall)
+            for i, bound in enumerate(self.buckets):
+                if wall <= bound:
+                    stats.buckets[i] += 1
+                    break
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'event': 'stage', 'stage': name, 'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6),
+                'memory_bytes': memory, 'error': failed
+            }))
+
+    def _start_memory(self) -> _MemoryFrame:
+        with self._memory_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            self._update_peaks(peak)
+            frame = _MemoryFrame(current)
+            self._memory_frames.append(frame)
+            return frame
+
+    def _stop_memory(self, frame: _MemoryFrame) -> int:
+        with self._memory_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            self._update_peaks(peak)
+            self._memory_frames.remove(frame)
+            if not hasattr(tracemalloc, 'reset_peak'):
+                # Python < 3.9 has no resettable peak; fall back to the net allocation
+                frame.peak = max(frame.start, current)
+            if not self._memory_frames and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+            return frame.peak - frame.start
+
+    def _update_peaks(self, peak: int) -> None:
+        """Fold the peak since the last reset into every open stage, then reset it."""
+        for open_frame in self._memory_frames:
+            open_frame.peak = max(open_frame.peak, peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Summary per stage, slowest total first."""
+        with self._lock:
+            rows = [
+                {
+                    'stage': name,
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'wall_seconds': stats.wall_seconds,
+                    'mean_wall_seconds': stats.wall_seconds / stats.count,
+                    'max_wall_seconds': stats.max_wall_seconds,
+                    'cpu_seconds': stats.cpu_seconds,
+                    'mean_cpu_seconds': stats.cpu_seconds / stats.count,
+                    'mean_memory_bytes': stats.memory_bytes / stats.count,
+                    'max_memory_bytes': stats.max_memory_bytes,
+                }
+                for name, stats in self._stats.items()
+            ]
+        return sorted(rows, key=lambda row: row['wall_seconds'], reverse=True)
+
+    def prometheus_text(self, prefix: str = "audio_analyzer") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds Wall time of a processing stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            stats = sorted(self._stats.items())
+            for name, stage in stats:
+                label = _label(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets, stage.buckets):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{label}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{label}",le="+Inf"}} {stage.count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{label}"}} {stage.wall_seconds:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{label}"}} {stage.count}')
+
+            for metric, help_text, kind, attribute in (
+                ("stage_cpu_seconds_total", "CPU time of the calling thread in a stage.", "counter", 'cpu_seconds'),
+                ("stage_errors_total", "Runs of a stage that raised.", "counter", 'errors'),
+                ("stage_memory_bytes_total", "Memory allocated at the peak of a stage, summed over runs.",
+                 "counter", 'memory_bytes'),
+                ("stage_max_memory_bytes", "Largest memory peak of a single run of a stage.",
+                 "gauge", 'max_memory_bytes'),
+            ):
+                lines.append(f"# HELP {prefix}_{metric} {help_text}")
+                lines.append(f"# TYPE {prefix}_{metric} {kind}")
+                for name, stage in stats:
+                    lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {getattr(stage, attribute)}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide registry used by the instrumented modules
+metrics = MetricsRegistry()
+stage = metrics.stage
+timed = metrics.timed
+
+
+def start_metrics_server(port: int, registry: MetricsRegistry = metrics,
+                         host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve the Prometheus exposition on /metrics from a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: the running server, stop it with shutdown()
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -1,41 +1,116 @@
 from yt_dlp import YoutubeDL
+import glob
 import os
-from typing import Optional
+import re
+import threading
+from typing import List, Optional
+
+# Video ids in watch, short-link, shorts, embed and live URLs
+_VIDEO_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+# Leftovers of interrupted downloads, never served from the cache
+_PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.lock')
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """Get the YouTube video id from a URL without a network request, None if it has none."""
+    match = _VIDEO_ID_PATTERN.search(url)
+    return match.group(1) if match else None
 
 
 class YoutubeDownloader:
-    def __init__(self):
+    def __init__(self, audio_format: Optional[str] = None):
+        """
+        Download audio from YouTube, at most once per video and output directory.
+
+        Files are named after the video id, so a repeated request for the same
+        video is served from disk without contacting YouTube.
+
+        Args:
+            audio_format (Optional[str]): Codec to re-encode to with FFmpeg (e.g. 'wav');
+                None keeps the downloaded stream, which the audio decoder reads directly
+        """
         self.ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-                'preferredquality': '192',
-            }],
-            'outtmpl': '%(title)s.%(ext)s',
+            # m4a decodes with ffmpeg without a WebM demux and needs no re-encode
+            'format': 'bestaudio[ext=m4a]/bestaudio/best',
+            'outtmpl': '%(id)s.%(ext)s',
             'quiet': True,
             'no_warnings': True
         }
+        if audio_format is not None:
+            self.ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': audio_format,
+                'preferredquality': '192',
+            }]
+        self.audio_format = audio_format
+        self._locks = {}
+        self._locks_lock = threading.Lock()
 
-    def download_audio(self, url: str, output_dir: str) -> Optional[str]:
-        try:
-            self.ydl_opts['outtmpl'] = os.path.join(output_dir, '%(title)s.%(ext)s')
+    def _video_lock(self, key: tuple) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
 
-            with YoutubeDL(self.ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                video_title = info['title']
+    def find_cached(self, video_id: str, output_dir: str) -> Optional[str]:
+        """Get the path of a finished download of a video in output_dir, if any."""
+        pattern = os.path.join(glob.escape(output_dir), f"{glob.escape(video_id)}.*")
+        for path in sorted(glob.glob(pattern)):
+            if path.endswith(_PARTIAL_SUFFIXES):
+                continue
+            if self.audio_format is None or path.endswith(f".{self.audio_format}"):
+                return path
+        return None
 
-                ydl.download([url])
+    def download_audio(self, url: str, output_dir: str) -> Optional[str]:
+        try:
+            video_id = extract_video_id(url)
+            if video_id is None:
+                return self._download(url, output_dir)
 
-                output_path = os.path.join(output_dir, f"{video_title}.wav")
-                return output_path if os.path.exists(output_path) else None
+            # Concurrent requests for one video wait for a single download
+            with self._video_lock((os.path.abspath(output_dir), video_id)):
+                cached = self.find_cached(video_id, output_dir)
+                if cached is not None:
+                    return cached
+                return self._download(url, output_dir)
 
         except Exception as e:
             raise Exception(f"Error while downloading: {str(e)}")
 
+    def _download(self, url: str, output_dir: str) -> Optional[str]:
+        # Per-call options, the shared ones are never mutated
+        opts = {**self.ydl_opts, 'outtmpl': os.path.join(output_dir, '%(id)s.%(ext)s')}
+
+        with YoutubeDL(opts) as ydl:
+            # Resolve and download in a single pass
+            info = ydl.extract_info(url, download=True)
+
+        downloads = info.get('requested_downloads') or []
+        if downloads and downloads[0].get('filepath'):
+            output_path = downloads[0]['filepath']
+        else:
+            output_path = os.path.join(output_dir, f"{info['id']}.{self.audio_format or info['ext']}")
+        return output_path if os.path.exists(output_path) else None
+
     def get_video_info(self, url: str) -> dict:
         try:
-            with YoutubeDL(self.ydl_opts) as ydl:
+            with YoutubeDL(dict(self.ydl_opts)) as ydl:
                 return ydl.extract_info(url, download=False)
         except Exception as e:
-            raise Exception(f"Error while downloading information: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error while downloading information: {str(e)}")
+
+    def get_playlist_urls(self, url: str) -> List[str]:
+        """List the video URLs of a playlist without resolving each video; a video URL lists itself."""
+        try:
+            with YoutubeDL({**self.ydl_opts, 'extract_flat': 'in_playlist'}) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            raise Exception(f"Error while listing playlist: {str(e)}")
+
+        if 'entries' not in info:
+            return [info.get('webpage_url') or url]
+        return [
+            entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}"
+            for entry in info['entries'] if entry
+        ]
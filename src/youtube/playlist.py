@@ -0,0 +1,142 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+POLL_INTERVAL = 0.1  # seconds between checks for a stopped pipeline while the queue is full or empty
+
+
+class PlaylistIngestor:
+    def __init__(self, downloader, process: Callable[[str], Any], download_workers: int = 3,
+                 analysis_workers: int = 1, max_pending: int = 2):
+        """
+        Download and process many URLs as a pipeline.
+
+        Several downloads run at once and hand finished files to the analysis
+        workers through a bounded queue, so processing item N overlaps with
+        downloading item N+1. When analysis falls behind, downloaders block on
+        the full queue; at most download_workers + max_pending + analysis_workers
+        downloaded files exist at any time. If an analysis worker dies, every
+        loop stops and its error is raised instead of leaving downloaders
+        blocked on a queue nobody drains.
+
+        Args:
+            downloader: Object with download_audio(url, output_dir) -> path, such as YoutubeDownloader
+            process (Callable[[str], Any]): Processes one downloaded file and returns its result
+            download_workers (int): Downloads in flight
+            analysis_workers (int): Files processed concurrently
+            max_pending (int): Downloaded files allowed to wait for processing
+        """
+        self.downloader = downloader
+        self.process = process
+        self.download_workers = max(download_workers, 1)
+        self.analysis_workers = max(analysis_workers, 1)
+        self.max_pending = max(max_pending, 1)
+
+    def ingest_playlist(self, url: str, output_dir: str,
+                        progress_callback: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """Expand a playlist URL with the downloader and ingest its entries."""
+        return self.ingest(self.downloader.get_playlist_urls(url), output_dir, progress_callback)
+
+    def ingest(self, urls: Iterable[str], output_dir: str,
+               progress_callback: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
+        """
+        Download and process every URL; a failing item never stops the others.
+
+        Args:
+            urls (Iterable[str]): Video URLs
+            output_dir (str): Directory receiving the downloads
+            progress_callback (Optional[ProgressCallback]): Called with the total, downloaded,
+                processed and failed counts after every change
+
+        Returns:
+            List[Dict[str, Any]]: One record per URL, in input order, with url, status
+            ('done' or 'failed'), path, result and error
+        """
+        urls = list(urls)
+        items = [{'url': url, 'status': 'pending', 'path': None, 'result': None, 'error': None} for url in urls]
+        progress = {'total': len(urls), 'downloaded': 0, 'processed': 0, 'failed': 0}
+        lock = threading.Lock()
+        todo = iter(range(len(urls)))
+        ready = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()  # set when an analysis worker dies
+
+        def report(counter: str) -> None:
+            with lock:
+                progress[counter] += 1
+                if progress_callback is not None:
+                    progress_callback(dict(progress))
+
+        def fail(index: int, stage: str, error: Exception) -> None:
+            logger.warning("%s of %s failed: %s", stage, urls[index], error)
+            items[index].update(status='failed', error=f"{stage} failed: {error}")
+            report('failed')
+
+        def hand_over(index: Optional[int]) -> bool:
+            # Blocks while the analysis workers are behind, gives up once they are gone
+            while not stop.is_set():
+                try:
+                    ready.put(index, timeout=POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def next_ready() -> Optional[int]:
+            while not stop.is_set():
+                try:
+                    return ready.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return None
+
+        def download_loop() -> None:
+            while not stop.is_set():
+                with lock:
+                    index = next(todo, None)
+                if index is None:
+                    return
+                try:
+                    path = self.downloader.download_audio(urls[index], output_dir)
+                    if not path:
+                        raise RuntimeError("no audio file was produced")
+                except Exception as e:
+                    fail(index, "Download", e)
+                    continue
+                items[index]['path'] = path
+                report('downloaded')
+                if not hand_over(index):
+                    return
+
+        def analysis_loop() -> None:
+            try:
+                while (index := next_ready()) is not None:
+                    try:
+                        items[index]['result'] = self.process(items[index]['path'])
+                    except Exception as e:
+                        fail(index, "Processing", e)
+                        continue
+                    items[index]['status'] = 'done'
+                    report('processed')
+            except BaseException:
+                stop.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.analysis_workers) as analysis_pool:
+            consumers = [analysis_pool.submit(analysis_loop) for _ in range(self.analysis_workers)]
+            try:
+                with ThreadPoolExecutor(max_workers=self.download_workers) as download_pool:
+                    producers = [download_pool.submit(download_loop) for _ in range(self.download_workers)]
+                    wait(producers)
+            finally:
+                for _ in consumers:
+                    hand_over(None)
+
+        for future in producers + consumers:
+            future.result()  # surface bugs in the loops themselves
+        return items
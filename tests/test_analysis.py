@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.audio import analysis
+from src.audio.analysis import analyze_file
+from src.audio.profiles import PROFILES
+from src.optimization.cache import ResultsCache
+
+
+@pytest.fixture
+def track(tmp_path):
+    sr = 22050
+    t = np.arange(sr * 8) / sr
+    y = 0.3 * (np.sin(2 * np.pi * 220 * t) + np.sin(2 * np.pi * 277.18 * t))
+    path = tmp_path / "tone.wav"
+    sf.write(path, y.astype(np.float32), sr)
+    return str(path)
+
+
+def test_results_are_cached_per_variant(track, tmp_path):
+    cache = ResultsCache(str(tmp_path / "cache"))
+    results = analyze_file(track, cache)
+    assert cache.get_cached_result(track, PROFILES['balanced'].cache_variant) == results
+    assert cache.get_cached_result(track, PROFILES['fast'].cache_variant) is None
+    assert analyze_file(track, cache) == results
+
+
+def test_long_files_are_streamed(track, monkeypatch):
+    streamed = []
+    real = analysis.StreamingAnalyzer.analyze_file
+    monkeypatch.setattr(analysis.StreamingAnalyzer, 'analyze_file',
+                        lambda self, path: streamed.append(path) or real(self, path))
+
+    in_memory = analyze_file(track)
+    assert streamed == []
+    streaming = analyze_file(track, streaming_min_duration=5)
+    assert streamed == [track]
+    assert streaming['key'] == in_memory['key']
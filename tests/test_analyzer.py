@@ -1,5 +1,6 @@
 import pytest
 import numpy as np
+from benchmarks.corpus import make_track
 from src.audio.analyzer import AudioAnalyzer
 
 
@@ -17,8 +18,50 @@ def test_detect_key(analyzer):
 
 
 def test_detect_bpm(analyzer):
-    y = np.random.rand(22050 * 5)  # 5 sekund audio
+    y = make_track('A minor', 128, 10)
     sr = 22050
     bpm = analyzer.detect_bpm(y, sr)
     assert isinstance(bpm, int)
-    assert 60 <= bpm <= 180
\ No newline at end of file
+    assert abs(bpm - 128) <= 1
+
+def test_features_shared_between_methods(analyzer):
+    y = np.random.rand(22050 * 5)
+    sr = 22050
+    analyzer.detect_key(y, sr)
+    features = analyzer.features(y, sr)
+    assert 'chroma' in features.__dict__
+    analyzer.get_additional_info(y, sr)
+    assert analyzer.features(y, sr) is features
+
+
+def test_analyze_returns_all_results(analyzer):
+    y = np.random.rand(22050 * 5)
+    results = analyzer.analyze(y, 22050)
+    assert set(results) == {'key', 'bpm', 'additional_info'}
+    assert results['key'] == analyzer.detect_key(y, 22050)
+
+
+def test_detect_keys_batch(analyzer):
+    # Chroma profiles equal to the key profiles rotated to D major and A minor
+    chroma = np.stack([
+        np.roll(analyzer.major_profile, 2),
+        np.roll(analyzer.minor_profile, 9)
+    ])
+    keys, modes, confidences = analyzer.detect_keys(chroma)
+    assert keys == ['D', 'A']
+    assert modes == ['major', 'minor']
+    np.testing.assert_allclose(confidences, 1.0)
+
+
+def test_analyze_stops_between_stages(analyzer):
+    y = np.random.rand(22050 * 5)
+    stages = []
+
+    def check_cancelled():
+        stages.append(set(analyzer.features(y, 22050).__dict__))
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError, match="cancelled"):
+        analyzer.analyze(y, 22050, check_cancelled)
+    # Stopped right after the key, before the tempo stage computed the onset envelope
+    assert len(stages) == 1 and 'chroma' in stages[0] and 'onset_env' not in stages[0]
@@ -0,0 +1,56 @@
+import json
+import pytest
+import numpy as np
+import soundfile as sf
+from src.batch.runner import BatchRunner, iter_audio_files, load_completed
+
+
+@pytest.fixture
+def library(tmp_path):
+    sr = 22050
+    t = np.arange(sr * 3) / sr
+    root = tmp_path / "library"
+    (root / "album").mkdir(parents=True)
+    for i, path in enumerate([root / "a.wav", root / "album" / "b.wav"]):
+        sf.write(path, (0.3 * np.sin(2 * np.pi * (220 + 50 * i) * t)).astype(np.float32), sr)
+    (root / "notes.txt").write_text("not audio")
+    return root
+
+
+def test_iter_audio_files(library, tmp_path):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(f"# comment\n{library / 'a.wav'}\n")
+    files = list(iter_audio_files([str(library)], manifest=str(manifest)))
+    assert [f.rsplit("/", 1)[-1] for f in files] == ["a.wav", "b.wav"]
+
+
+def test_batch_run_and_resume(library, tmp_path):
+    output = tmp_path / "results.jsonl"
+    files = list(iter_audio_files([str(library)]))
+
+    stats = BatchRunner(str(output), max_workers=2).run(files)
+    assert stats['analyzed'] == 2 and stats['failed'] == 0
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert all({'path', 'key', 'bpm', 'additional_info'} <= set(r) for r in records)
+
+    # A crash mid-write leaves a partial line which must not count as done
+    with open(output, "a") as f:
+        f.write('{"path": "trunc')
+    assert load_completed(str(output)) == set(files)
+
+    stats = BatchRunner(str(output), max_workers=2).run(files)
+    assert stats['skipped'] == 2 and stats['analyzed'] == 0
+    assert output.read_text().endswith("}\n")
+
+
+def test_resume_after_partial_line(library, tmp_path):
+    output = tmp_path / "results.jsonl"
+    files = list(iter_audio_files([str(library)]))
+    BatchRunner(str(output), max_workers=1).run(files[:1])
+    with open(output, "a") as f:
+        f.write(f'{{"path": "{files[1]}", "key": "C maj')
+
+    stats = BatchRunner(str(output), max_workers=1).run(files)
+    assert stats['skipped'] == 1 and stats['analyzed'] == 1
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record['path'] for record in records] == files
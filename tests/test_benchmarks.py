@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from benchmarks.corpus import build_corpus, click_track, make_track
+from benchmarks.run import DEFAULT_THRESHOLDS, StubSeparationModel, benchmark_track, compare
+from src.audio.analyzer import AudioAnalyzer
+
+
+def test_corpus_is_deterministic(tmp_path):
+    first = build_corpus(str(tmp_path / "a"), [2, 3], seed=7)
+    second = build_corpus(str(tmp_path / "b"), [2, 3], seed=7)
+    assert [t.name for t in first] == [t.name for t in second]
+    y, sr = sf.read(first[0].path)
+    assert sr == 22050 and len(y) == 2 * 22050
+    assert np.array_equal(y, sf.read(second[0].path)[0])
+
+
+def test_click_track_places_beats():
+    sr = 8000
+    y = click_track(120, 2.0, sr=sr)
+    active = np.abs(y).reshape(-1, sr // 100).max(axis=1) > 0.05  # 10 ms frames
+    onsets = np.flatnonzero(active & ~np.roll(active, 1))
+    assert list(onsets) == [0, 50, 100, 150]
+
+
+def test_benchmark_track_checks_ground_truth(tmp_path):
+    track = build_corpus(str(tmp_path), [8], seed=1)[0]
+    result = benchmark_track(track, repeat=1)
+    assert {'reference', 'load_audio', 'detect_key', 'detect_bpm', 'get_additional_info',
+            'cache_put', 'cache_get', 'separation'} <= set(result['timings'])
+    assert result['key_correct']
+    assert result['peak_rss_mb'] > 0
+
+
+def test_compare_flags_regressions():
+    base = {'timings': {'detect_key': 1.0, 'cache_get': 0.001}, 'peak_rss_mb': 100.0,
+            'key_correct': True, 'bpm_metrical_error': 0.0}
+    same = {**base, 'key': 'C major', 'expected_key': 'C major', 'bpm': 120, 'expected_bpm': 120.0}
+    assert compare({'t': same}, {'t': base}, DEFAULT_THRESHOLDS) == []
+
+    # A 5 ms slowdown of a 1 ms stage is below the noise floor
+    worse = {**same, 'timings': {'detect_key': 1.5, 'cache_get': 0.006}, 'peak_rss_mb': 130.0,
+             'key_correct': False, 'key': 'G major', 'bpm_metrical_error': 0.1, 'bpm': 132}
+    regressions = compare({'t': worse}, {'t': base}, DEFAULT_THRESHOLDS)
+    assert len(regressions) == 4
+    assert any("detect_key" in r for r in regressions)
+    assert not any("cache_get" in r for r in regressions)
+
+
+def test_stub_model_keeps_shape():
+    waveform = make_track('C major', 120, 0.5)[:, np.newaxis].repeat(2, axis=1)
+    stems = StubSeparationModel().separate(waveform)
+    assert set(stems) == {'vocals', 'accompaniment'}
+    assert stems['vocals'].shape == waveform.shape
+
+
+def test_compare_scales_timings_of_other_machines():
+    base = {'timings': {'reference': 0.1, 'detect_key': 1.0, 'separation': 0.5}, 'peak_rss_mb': 100.0,
+            'key_correct': True, 'bpm_metrical_error': 0.0}
+    # A machine twice as slow at everything
+    slower = {**base, 'timings': {'reference': 0.2, 'detect_key': 2.0, 'separation': 1.0},
+              'key': 'C major', 'expected_key': 'C major', 'bpm': 120, 'expected_bpm': 120.0}
+    assert compare({'t': slower}, {'t': base}, DEFAULT_THRESHOLDS, same_machine=False) == []
+    assert len(compare({'t': slower}, {'t': base}, DEFAULT_THRESHOLDS)) == 2
+
+    # ...where separation also got slower relative to the reference
+    regressed = {**slower, 'timings': {**slower['timings'], 'separation': 2.0}}
+    regressions = compare({'t': regressed}, {'t': base}, DEFAULT_THRESHOLDS, same_machine=False)
+    assert len(regressions) == 1 and "separation" in regressions[0]
+
+
+@pytest.mark.parametrize('profile', ['fast', 'balanced', 'accurate'])
+def test_tempo_accuracy_on_corpus(tmp_path, profile):
+    analyzer = AudioAnalyzer(profile)
+    tracks = build_corpus(str(tmp_path), [10, 20, 30, 40, 50, 60], seed=3)
+    errors = []
+    for track in tracks:
+        y, sr = sf.read(track.path, dtype='float32')
+        errors.append(abs(analyzer.detect_bpm(y, sr) - track.bpm) / track.bpm)
+    # Exact tempo, not another metrical level
+    assert max(errors) <= 0.02
@@ -1,20 +1,110 @@
 import pytest
+import json
 import os
+import time
 from src.optimization.cache import ResultsCache
 from unittest.mock import patch
 
 
 @pytest.fixture
-def cache():
-    return ResultsCache()
+def cache(tmp_path):
+    return ResultsCache(str(tmp_path / "cache"))
 
 
-def test_cache_result(cache):
-    cache.cache_result("dummy_path.wav", {"key": "C major", "bpm": 120})
-    assert os.path.exists("cache/cache_metadata.json")
+@pytest.fixture
+def audio_path(tmp_path):
+    path = tmp_path / "dummy_path.wav"
+    path.write_bytes(b"RIFF" + os.urandom(1024))
+    return str(path)
+
+
+def test_cache_result(cache, audio_path):
+    cache.cache_result(audio_path, {"key": "C major", "bpm": 120})
+    assert os.path.exists(os.path.join(cache.cache_dir, "cache_index.db"))
+
+
+def test_get_cached_result(cache, audio_path):
+    cache.cache_result(audio_path, {"key": "C major", "bpm": 120})
+    result = cache.get_cached_result(audio_path)
+    assert result == {"key": "C major", "bpm": 120}
+
+
+def test_batch_get_and_put(cache, tmp_path, audio_path):
+    other = tmp_path / "other.wav"
+    other.write_bytes(b"RIFF" + os.urandom(1024))
+    cache.cache_results({audio_path: {"bpm": 120}, str(other): {"bpm": 90}})
+    results = cache.get_cached_results([audio_path, str(other), str(tmp_path / "missing.wav")])
+    assert results == {audio_path: {"bpm": 120}, str(other): {"bpm": 90}}
+
+
+def test_clear_expired(cache, audio_path):
+    cache.cache_result(audio_path, {"bpm": 120})
+    with patch('time.time', return_value=time.time() + cache.cache_ttl + 1):
+        assert cache.clear_expired() == 1
+    assert cache.get_cached_result(audio_path) is None
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResultsCache(str(tmp_path / "cache"), max_entries=2)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"track{i}.wav"
+        path.write_bytes(b"RIFF" + os.urandom(256))
+        paths.append(str(path))
+
+    cache.cache_result(paths[0], {"bpm": 100})
+    cache.cache_result(paths[1], {"bpm": 110})
+    assert cache.get_cached_result(paths[0]) == {"bpm": 100}  # paths[1] becomes least recently used
+    cache.cache_result(paths[2], {"bpm": 120})
+
+    assert cache.get_cached_result(paths[1]) is None
+    assert cache.get_cached_result(paths[0]) == {"bpm": 100}
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+    assert stats['hits'] == 2 and stats['misses'] == 1
+
+
+def test_byte_budget(tmp_path, audio_path):
+    cache = ResultsCache(str(tmp_path / "cache"), max_bytes=100)
+    cache.cache_result(audio_path, {"payload": "x" * 500})
+    assert cache.get_stats()['bytes'] == 0
+
+
+def test_variants_do_not_collide(cache, audio_path):
+    cache.cache_result(audio_path, {"bpm": 120})
+    cache.cache_result(audio_path, {"bpm": 118}, variant="fast")
+    assert cache.get_cached_result(audio_path) == {"bpm": 120}
+    assert cache.get_cached_result(audio_path, "fast") == {"bpm": 118}
+    assert cache.get_cached_result(audio_path, "accurate") is None
+    assert cache.get_cached_results([audio_path], "fast") == {audio_path: {"bpm": 118}}
+
+
+def test_evicted_files_are_removed_after_commit(tmp_path, audio_path):
+    cache = ResultsCache(str(tmp_path / "cache"), max_entries=1)
+    cache.cache_result(audio_path, {"bpm": 120})
+    old_file = cache._get_cache_path(cache._get_cache_key(audio_path))
+
+    removed = []
+    remove_entry_file = cache._remove_entry_file
+
+    def remove_outside_transaction(key):
+        assert not cache._connection().in_transaction
+        removed.append(key)
+        remove_entry_file(key)
+
+    with patch.object(cache, '_remove_entry_file', side_effect=remove_outside_transaction):
+        cache.cache_result(audio_path, {"bpm": 118}, variant="fast")
+    assert len(removed) == 1 and not os.path.exists(old_file)
+    assert cache.get_cached_result(audio_path, "fast") == {"bpm": 118}
+
 
+def test_legacy_metadata_entries_are_dropped(tmp_path, audio_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (cache_dir / "cache_metadata.json").write_text(json.dumps({"0123abcd": {"timestamp": time.time()}}))
+    (cache_dir / "0123abcd.pkl").write_bytes(b"legacy")
 
-def test_get_cached_result(cache):
-    cache.cache_result("dummy_path.wav", {"key": "C major", "bpm": 120})
-    result = cache.get_cached_result("dummy_path.wav")
-    assert result == {"key": "C major", "bpm": 120}
\ No newline at end of file
+    cache = ResultsCache(str(cache_dir))
+    assert not any(name.endswith((".pkl", ".json")) for name in os.listdir(cache_dir))
+    assert cache.get_stats()['entries'] == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from src.audio.chunking import overlap_add, split_windows
+
+
+def identity_stems(window):
+    return {'vocals': window * 0.25, 'accompaniment': window * 0.75}
+
+
+def test_split_windows():
+    waveform = np.arange(25)
+    windows = list(split_windows(waveform, window=10, overlap=3))
+    assert [len(w) for w in windows] == [10, 10, 10, 4]
+    assert windows[1][0] == 7
+    assert len(windows[-1]) > 3
+
+
+def test_overlap_add_reconstructs_signal():
+    waveform = np.random.rand(1000, 2).astype(np.float32)
+    stems = overlap_add(split_windows(waveform, 128, 32), identity_stems, overlap=32, max_workers=3)
+    np.testing.assert_allclose(stems['vocals'], waveform * 0.25, rtol=1e-5)
+    np.testing.assert_allclose(stems['accompaniment'], waveform * 0.75, rtol=1e-5)
+
+
+def test_overlap_add_streams_to_sink():
+    waveform = np.random.rand(1000).astype(np.float32)
+    blocks = []
+    result = overlap_add(split_windows(waveform, 100, 10), identity_stems, overlap=10,
+                         sink=lambda name, block: blocks.append(block) if name == 'vocals' else None)
+    assert result == {}
+    assert max(len(b) for b in blocks) <= 100
+    np.testing.assert_allclose(np.concatenate(blocks), waveform * 0.25, rtol=1e-5)
+
+
+def test_overlap_add_stops_when_cancelled():
+    processed = []
+
+    def check_cancelled():
+        if len(processed) == 2:
+            raise RuntimeError("cancelled")
+
+    def process(window):
+        processed.append(window)
+        return identity_stems(window)
+
+    with pytest.raises(RuntimeError, match="cancelled"):
+        overlap_add(split_windows(np.random.rand(1000), 100, 10), process, overlap=10,
+                    check_cancelled=check_cancelled)
+    assert len(processed) == 2
@@ -0,0 +1,122 @@
+import io
+import json
+import pytest
+import numpy as np
+import soundfile as sf
+from src.audio.decoder import AudioDecodeError, decode_audio, iter_blocks, probe_audio
+from unittest.mock import patch, MagicMock
+
+
+@pytest.fixture
+def stereo(tmp_path):
+    sr = 44100
+    y = (np.random.rand(sr * 2, 2) - 0.5).astype(np.float32)
+    return tmp_path, y, sr
+
+
+@pytest.mark.parametrize("name,subtype", [("pcm16.wav", "PCM_16"), ("float.wav", "FLOAT"), ("audio.flac", "PCM_16")])
+def test_decode_matches_soundfile(stereo, name, subtype):
+    tmp_path, y, sr = stereo
+    path = str(tmp_path / name)
+    sf.write(path, y, sr, subtype=subtype)
+    expected, _ = sf.read(path, dtype='float32')
+
+    decoded, decoded_sr = decode_audio(path, mono=False)
+    assert decoded_sr == sr
+    np.testing.assert_allclose(decoded, expected)
+
+    mono, _ = decode_audio(path)
+    np.testing.assert_allclose(mono, expected.mean(axis=1), atol=1e-6)
+
+
+def test_partial_load_and_resample(stereo):
+    tmp_path, y, sr = stereo
+    path = str(tmp_path / "audio.wav")
+    sf.write(path, y, sr)
+    decoded, decoded_sr = decode_audio(path, sr=22050, offset=0.5, duration=1.0)
+    assert decoded_sr == 22050
+    assert len(decoded) == 22050
+
+
+@patch('shutil.which', return_value='/usr/bin/ffmpeg')
+@patch('subprocess.run')
+def test_ffmpeg_pipe(mock_run, mock_which, tmp_path):
+    path = tmp_path / "audio.m4a"
+    path.write_bytes(b"not really aac")
+    samples = np.linspace(-1, 1, 480, dtype='<f4')
+    mock_run.side_effect = [
+        MagicMock(stdout=b'{"streams": [{"sample_rate": "48000", "channels": 2}]}', returncode=0),
+        MagicMock(stdout=samples.tobytes(), returncode=0),
+    ]
+    decoded, sr = decode_audio(str(path), offset=1.0, duration=0.01)
+    assert sr == 48000
+    np.testing.assert_array_equal(decoded, samples)
+    command = mock_run.call_args_list[1][0][0]
+    assert command[command.index('-ss') + 1] == '1.0'
+    assert command[command.index('-ac') + 1] == '1'
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(AudioDecodeError):
+        decode_audio(str(tmp_path / "missing.wav"))
+
+
+class FakeFFmpeg:
+    """Plays ffprobe and a streaming ffmpeg for a file holding the given stereo samples."""
+
+    def __init__(self, samples, sr):
+        self.samples = samples
+        self.sr = sr
+        self.decoded = []  # '-ac' of every ffmpeg run
+
+    def run(self, command, **kwargs):
+        assert command[0] == 'ffprobe', "whole-file ffmpeg decode"
+        duration = len(self.samples) / self.sr
+        return MagicMock(returncode=0, stdout=json.dumps({
+            'streams': [{'sample_rate': str(self.sr), 'channels': 2}],
+            'format': {'duration': str(duration)}}).encode())
+
+    def popen(self, command, stdout=None, stderr=None):
+        channels = int(command[command.index('-ac') + 1])
+        self.decoded.append(channels)
+        data = self.samples if channels == 2 else self.samples.mean(axis=1)
+        process = MagicMock(stdout=io.BytesIO(np.ascontiguousarray(data, dtype='<f4').tobytes()))
+        process.wait.return_value = 0
+        process.poll.return_value = 0
+        return process
+
+    def patch(self):
+        return patch.multiple('src.audio.decoder.subprocess', run=self.run, Popen=self.popen)
+
+
+@pytest.fixture
+def fake_m4a(stereo):
+    tmp_path, y, sr = stereo
+    path = tmp_path / "audio.m4a"
+    path.write_bytes(b"not really aac")
+    with patch('shutil.which', return_value='/usr/bin/ffmpeg'):
+        ffmpeg = FakeFFmpeg(y, sr)
+        with ffmpeg.patch():
+            yield str(path), y, sr, ffmpeg
+
+
+def test_probe_audio(stereo, fake_m4a):
+    tmp_path, y, sr = stereo
+    flac = str(tmp_path / "audio.flac")
+    sf.write(flac, y, sr)
+    assert probe_audio(flac) == (sr, 2, pytest.approx(2.0))
+    path, _, _, _ = fake_m4a
+    assert probe_audio(path) == (sr, 2, pytest.approx(2.0))
+
+
+@pytest.mark.parametrize("name", ["audio.flac", "audio.m4a"])
+def test_iter_blocks(stereo, fake_m4a, name):
+    tmp_path, y, sr = stereo
+    path = str(tmp_path / name)
+    if name.endswith(".flac"):
+        sf.write(path, y, sr, subtype='PCM_24')
+    blocks = list(iter_blocks(path, 30000))
+    assert [len(block) for block in blocks] == [30000, 30000, len(y) - 60000]
+    np.testing.assert_allclose(np.concatenate(blocks), y, atol=1e-4)
+    mono = np.concatenate(list(iter_blocks(path, 30000, mono=True)))
+    assert mono.shape == (len(y), 1)
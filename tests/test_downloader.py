@@ -1,19 +1,75 @@
+import os
 import pytest
-from src.youtube.downloader import YoutubeDownloader
+from src.youtube.downloader import YoutubeDownloader, extract_video_id
 from unittest.mock import patch
 
+URL = "https://youtube.com/watch?v=dQw4w9WgXcQ"
+
 
 @pytest.fixture
 def downloader():
     return YoutubeDownloader()
 
 
-@patch('yt_dlp.YoutubeDL.extract_info')
-def test_download_audio(mock_extract_info, downloader):
-    mock_extract_info.return_value = {'title': 'test_audio'}
-    with patch('yt_dlp.YoutubeDL.download'):
-        path = downloader.download_audio(
-            "https://youtube.com/watch?v=dQw4w9WgXcQ", "temp"
-        )
-        assert path is not None
-        assert "test_audio.wav" in path
\ No newline at end of file
+def fake_extract_info(url, download=True):
+    """Writes the file yt-dlp would produce for the id-based output template."""
+    path = os.path.join(fake_extract_info.output_dir, "dQw4w9WgXcQ.m4a")
+    if download:
+        with open(path, "wb") as f:
+            f.write(b"audio")
+    return {'id': 'dQw4w9WgXcQ', 'title': 'test_audio', 'ext': 'm4a',
+            'requested_downloads': [{'filepath': path}]}
+
+
+@patch('src.youtube.downloader.YoutubeDL')
+def test_download_audio(mock_ydl, downloader, tmp_path):
+    fake_extract_info.output_dir = str(tmp_path)
+    ydl = mock_ydl.return_value.__enter__.return_value
+    ydl.extract_info.side_effect = fake_extract_info
+
+    path = downloader.download_audio(URL, str(tmp_path))
+    assert path is not None
+    assert path.endswith("dQw4w9WgXcQ.m4a")
+    ydl.extract_info.assert_called_once_with(URL, download=True)
+    ydl.download.assert_not_called()
+
+    # Per-call options; the shared template is left alone
+    opts = mock_ydl.call_args[0][0]
+    assert opts['outtmpl'] == os.path.join(str(tmp_path), '%(id)s.%(ext)s')
+    assert downloader.ydl_opts['outtmpl'] == '%(id)s.%(ext)s'
+    assert 'postprocessors' not in opts
+
+
+@patch('src.youtube.downloader.YoutubeDL')
+def test_repeat_download_served_from_cache(mock_ydl, downloader, tmp_path):
+    fake_extract_info.output_dir = str(tmp_path)
+    ydl = mock_ydl.return_value.__enter__.return_value
+    ydl.extract_info.side_effect = fake_extract_info
+
+    first = downloader.download_audio(URL, str(tmp_path))
+    second = downloader.download_audio("https://youtu.be/dQw4w9WgXcQ?t=42", str(tmp_path))
+    assert first == second
+    assert ydl.extract_info.call_count == 1
+
+
+@patch('src.youtube.downloader.YoutubeDL')
+def test_partial_downloads_are_not_reused(mock_ydl, downloader, tmp_path):
+    (tmp_path / "dQw4w9WgXcQ.m4a.part").write_bytes(b"partial")
+    fake_extract_info.output_dir = str(tmp_path)
+    ydl = mock_ydl.return_value.__enter__.return_value
+    ydl.extract_info.side_effect = fake_extract_info
+
+    assert downloader.download_audio(URL, str(tmp_path)).endswith(".m4a")
+    assert ydl.extract_info.call_count == 1
+
+
+def test_wav_option_keeps_reencode():
+    downloader = YoutubeDownloader(audio_format='wav')
+    assert downloader.ydl_opts['postprocessors'][0]['preferredcodec'] == 'wav'
+
+
+def test_extract_video_id():
+    assert extract_video_id(URL) == "dQw4w9WgXcQ"
+    assert extract_video_id("https://www.youtube.com/watch?list=PL1&v=dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert extract_video_id("https://youtube.com/shorts/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert extract_video_id("https://example.com/video.mp4") is None
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.audio.encoder import StemEncoder, encode_stem, encoded_path, get_format, publish, published_dir
+
+
+@pytest.fixture
+def stem(tmp_path):
+    sr = 44100
+    t = np.arange(sr * 3) / sr
+    y = 0.5 * np.stack([np.sin(2 * np.pi * 440 * t), np.sin(2 * np.pi * 220 * t)], axis=1)
+    path = tmp_path / "vocals.wav"
+    sf.write(str(path), y, sr, subtype='PCM_16')
+    return str(path)
+
+
+def test_flac_is_lossless_and_smaller(stem):
+    path = encode_stem(stem, 'flac', block_seconds=1.0)
+    assert path == encoded_path(stem, 'flac') and path.endswith("vocals.flac")
+    original, _ = sf.read(stem, dtype='int16')
+    encoded, sr = sf.read(path, dtype='int16')
+    assert sr == 44100
+    np.testing.assert_array_equal(encoded, original)
+    assert os.path.getsize(path) < os.path.getsize(stem)
+
+
+def test_opus_is_resampled_to_a_supported_rate(stem):
+    path = encode_stem(stem, 'opus', block_seconds=1.0)
+    info = sf.info(path)
+    assert path.endswith("vocals.opus")
+    assert info.samplerate == 48000 and info.channels == 2
+    assert info.duration == pytest.approx(3.0, abs=0.05)
+    assert os.path.getsize(path) * 4 < os.path.getsize(stem)
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.part')]
+
+
+def test_wav_is_served_as_is(stem):
+    assert encode_stem(stem, 'wav') == stem
+    with pytest.raises(ValueError):
+        get_format('mp3')
+
+
+def test_encoder_reuses_encoded_files(stem):
+    encoder = StemEncoder(max_workers=1)
+    try:
+        assert not encoder.is_ready(stem, 'flac')
+        first = encoder.submit(stem, 'flac')
+        second = encoder.submit(stem, 'flac')
+        assert first.result(timeout=10) == second.result(timeout=10)
+        assert encoder.is_ready(stem, 'flac')
+
+        modified = os.path.getmtime(first.result())
+        assert encoder.get(stem, 'flac') == first.result()
+        assert os.path.getmtime(first.result()) == modified
+        assert encoder.is_ready(stem, 'wav')
+    finally:
+        encoder.shutdown()
+
+
+def test_publish_links_the_stem(stem, tmp_path):
+    static_dir = tmp_path / "static"
+    published = publish(stem, str(static_dir), "vocals.wav")
+    assert published.endswith("/vocals.wav")
+    assert os.path.samefile(static_dir / published, stem)
+    assert publish(stem, str(static_dir), "vocals.wav") == published
+    assert published_dir(stem, str(static_dir)) == str(static_dir / os.path.dirname(published))
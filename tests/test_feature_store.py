@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+import soundfile as sf
+from src.audio.analyzer import AudioAnalyzer
+from src.optimization.feature_store import FeatureNotStored, FeatureStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(str(tmp_path / "features"))
+
+
+@pytest.fixture
+def audio(tmp_path):
+    sr = 22050
+    y = np.random.rand(sr * 5).astype(np.float32)
+    path = tmp_path / "noise.wav"
+    sf.write(path, y, sr)
+    return str(path), y, sr
+
+
+def test_save_and_load(store, audio):
+    path, y, sr = audio
+    analyzer = AudioAnalyzer()
+    features = analyzer.features(y, sr)
+    expected = analyzer.analyze_features(features)
+
+    assert store.load(path, features.params) is None
+    store.save(path, features)
+    stored = store.load(path, features.params)
+
+    assert isinstance(stored.chroma, np.memmap)
+    np.testing.assert_array_equal(stored.onset_env, features.onset_env)
+    assert AudioAnalyzer().analyze_features(stored) == expected
+
+
+def test_params_are_part_of_the_key(store, audio):
+    path, y, sr = audio
+    features = AudioAnalyzer().features(y, sr)
+    store.save(path, features)
+    assert store.load(path, {**features.params, 'hop_length': 1024}) is None
+
+
+def test_saves_only_the_profile_features(store, audio):
+    path, y, sr = audio
+    analyzer = AudioAnalyzer("fast")
+    features = analyzer.features(y, sr)
+    expected = analyzer.analyze_features(features)
+    names = analyzer.profile.feature_names
+    assert 'harmonic_chroma' not in names and 'spectral_bandwidth' not in names
+
+    store.save(path, features, names)
+    assert 'harmonic' not in vars(features)  # no HPSS was run to store features
+    stored = store.load(path, analyzer.profile.feature_params(features.sr), names)
+    assert set(stored.names) == set(names)
+    assert analyzer.analyze_features(stored) == expected
+
+    # Callers needing more features don't reuse the entry
+    assert store.load(path, features.params, names + ('harmonic_chroma',)) is None
+    with pytest.raises(FeatureNotStored):
+        stored.harmonic_chroma
@@ -0,0 +1,36 @@
+import pytest
+import os
+from src.optimization.fingerprint import FileFingerprinter
+from unittest.mock import patch
+
+
+@pytest.fixture
+def fingerprinter(tmp_path):
+    return FileFingerprinter(str(tmp_path / "fingerprints.db"))
+
+
+def test_fingerprint_is_content_based(fingerprinter, tmp_path):
+    data = os.urandom(4096)
+    first, second = tmp_path / "a.wav", tmp_path / "b.wav"
+    first.write_bytes(data)
+    second.write_bytes(data)
+    assert fingerprinter.fingerprint(str(first)) == fingerprinter.fingerprint(str(second))
+
+    second.write_bytes(os.urandom(4096))
+    assert fingerprinter.fingerprint(str(first)) != fingerprinter.fingerprint(str(second))
+
+
+def test_repeat_lookup_skips_hashing(fingerprinter, tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(os.urandom(4096))
+    expected = fingerprinter.fingerprint(str(path))
+    with patch.object(FileFingerprinter, 'hash_file') as mock_hash:
+        assert fingerprinter.fingerprint(str(path)) == expected
+        mock_hash.assert_not_called()
+
+
+def test_sampled_fingerprint(tmp_path):
+    path = tmp_path / "a.wav"
+    path.write_bytes(os.urandom(64 * 1024))
+    fingerprinter = FileFingerprinter(sampled=True, chunk_size=1024, sample_chunks=4)
+    assert fingerprinter.fingerprint(str(path)).startswith("b2s:")
@@ -0,0 +1,141 @@
+import threading
+import time
+import numpy as np
+import pytest
+from src.jobs.queue import (DONE, FAILED, QUEUED, RUNNING, WORKER_LOST, InMemoryJobQueue, JobQueue, SQLiteJobQueue,
+                            get_job_queue)
+from src.jobs.worker import JobWorker
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobQueue()
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"), poll_interval=0.01)
+
+
+def test_queue_lifecycle(queue):
+    first = queue.enqueue('echo', {'value': 1})
+    second = queue.enqueue('echo', {'value': 2})
+    assert queue.get(first)['status'] == QUEUED
+    assert queue.get(second)['position'] == 1
+
+    job = queue.claim(timeout=0.1)
+    assert job['id'] == first and job['status'] == RUNNING
+    assert job['payload'] == {'value': 1}
+    assert queue.get(second)['position'] == 0
+
+    queue.complete(first, {'bpm': np.float64(120.0)})
+    assert queue.get(first)['status'] == DONE
+    assert queue.get(first)['result'] == {'bpm': 120.0}
+
+    queue.claim(timeout=0.1)
+    queue.fail(second, "boom")
+    assert queue.get(second)['status'] == FAILED and queue.get(second)['error'] == "boom"
+    assert queue.claim(timeout=0.05) is None
+
+
+def test_sqlite_queue_shared_between_instances(tmp_path):
+    producer = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    consumer = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    job_id = producer.enqueue('echo', {'value': 3})
+    assert consumer.claim(timeout=0.1)['id'] == job_id
+    consumer.complete(job_id, {'value': 3})
+    assert producer.get(job_id)['result'] == {'value': 3}
+
+
+def test_worker_runs_handlers_and_records_failures(queue):
+    def explode(payload):
+        raise ValueError("bad input")
+
+    worker = JobWorker(queue, {'echo': lambda payload: {'echo': payload['value']}, 'explode': explode},
+                       poll_timeout=0.05)
+    ok = queue.enqueue('echo', {'value': 5})
+    bad = queue.enqueue('explode', {})
+    unknown = queue.enqueue('missing', {})
+
+    assert worker.run_once() and worker.run_once() and worker.run_once()
+    assert not worker.run_once()
+    assert queue.get(ok)['result'] == {'echo': 5}
+    assert queue.get(bad)['error'] == "bad input"
+    assert "Unknown job kind" in queue.get(unknown)['error']
+
+
+def test_wait_for_job_run_by_worker_thread(queue):
+    stop = threading.Event()
+    worker = JobWorker(queue, {'echo': lambda payload: payload}, poll_timeout=0.05)
+    thread = threading.Thread(target=worker.run, args=(stop,))
+    thread.start()
+    try:
+        job_id = queue.enqueue('echo', {'value': 7})
+        job = queue.wait(job_id, timeout=5, poll_interval=0.01)
+    finally:
+        stop.set()
+        thread.join()
+    assert job['status'] == DONE and job['result'] == {'value': 7}
+
+
+def test_get_job_queue(tmp_path, monkeypatch):
+    monkeypatch.delenv("JOB_QUEUE_URL", raising=False)
+    assert get_job_queue() is None
+    assert isinstance(get_job_queue("memory://"), InMemoryJobQueue)
+    monkeypatch.setenv("JOB_QUEUE_URL", f"sqlite:///{tmp_path / 'jobs.db'}")
+    assert isinstance(get_job_queue(), SQLiteJobQueue)
+    with pytest.raises(ValueError):
+        get_job_queue("ftp://nowhere")
+
+
+def test_stale_jobs_are_requeued_then_failed(tmp_path):
+    for queue in (InMemoryJobQueue(visibility_timeout=0.2, max_attempts=2),
+                  SQLiteJobQueue(str(tmp_path / "jobs.db"), poll_interval=0.01, visibility_timeout=0.2,
+                                 max_attempts=2)):
+        job_id = queue.enqueue('echo', {'value': 1})
+        queue.enqueue('echo', {'value': 2})
+        assert queue.claim(timeout=0.1)['id'] == job_id
+
+        # A heartbeat keeps the job running
+        time.sleep(0.1)
+        queue.heartbeat(job_id)
+        time.sleep(0.1)
+        assert queue.requeue_stale() == 0
+
+        # Its worker died: the job goes back to the front of the queue
+        time.sleep(0.25)
+        assert queue.reap()['requeued'] == 1
+        assert queue.get(job_id)['status'] == QUEUED and queue.get(job_id)['position'] == 0
+        job = queue.claim(timeout=0.1)
+        assert job['id'] == job_id and job['attempts'] == 2
+
+        time.sleep(0.25)
+        assert queue.requeue_stale() == 1
+        assert queue.get(job_id)['status'] == FAILED and queue.get(job_id)['error'] == WORKER_LOST
+
+
+def test_finished_jobs_are_purged(queue):
+    queue.result_ttl = 0.05
+    job_id = queue.enqueue('echo', {})
+    queue.claim(timeout=0.1)
+    queue.complete(job_id, {})
+    assert queue.purge_finished() == 0
+    time.sleep(0.06)
+    assert queue.purge_finished() == 1
+    assert queue.get(job_id) is None
+
+
+def test_worker_heartbeats_long_jobs():
+    queue = InMemoryJobQueue(visibility_timeout=0.2)
+    worker = JobWorker(queue, {'slow': lambda payload: time.sleep(0.6) or {}}, poll_timeout=0.05)
+    job_id = queue.enqueue('slow', {})
+    thread = threading.Thread(target=worker.run_once)
+    thread.start()
+    requeued = 0
+    while thread.is_alive():
+        requeued += queue.requeue_stale()
+        time.sleep(0.01)
+    thread.join()
+    assert requeued == 0 and queue.get(job_id)['status'] == DONE
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
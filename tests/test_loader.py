@@ -14,4 +14,12 @@ def test_load_audio(mock_load, loader):
     mock_load.return_value = (np.random.rand(22050 * 5), 22050)
     y, sr = loader.load_audio("dummy_path.wav")
     assert y is not None
-    assert sr == 22050
\ No newline at end of file
+    assert sr == 22050
+
+def test_load_audio_partial(loader, tmp_path):
+    import soundfile as sf
+    path = tmp_path / "tone.wav"
+    sf.write(path, np.random.rand(44100 * 3).astype(np.float32), 44100)
+    y, sr = loader.load_audio(str(path), offset=1.0, duration=1.5)
+    assert sr == 22050
+    assert len(y) == int(22050 * 1.5)
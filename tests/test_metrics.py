@@ -0,0 +1,75 @@
+import json
+import logging
+import time
+import urllib.request
+import numpy as np
+import pytest
+from src.audio.analyzer import AudioAnalyzer
+from src.utils.metrics import MetricsRegistry, metrics, start_metrics_server
+
+
+def test_stage_records_wall_cpu_and_memory():
+    registry = MetricsRegistry(trace_memory=True)
+    with registry.stage("outer"):
+        with registry.stage("allocate"):
+            block = np.ones(2_000_000)  # 16 MB
+            del block
+        time.sleep(0.02)
+
+    rows = {row['stage']: row for row in registry.snapshot()}
+    assert rows['outer']['count'] == 1 and rows['allocate']['count'] == 1
+    assert rows['outer']['wall_seconds'] >= 0.02
+    assert rows['outer']['cpu_seconds'] < rows['outer']['wall_seconds']
+    # The inner peak also counts towards the enclosing stage
+    assert rows['allocate']['max_memory_bytes'] >= 16_000_000
+    assert rows['outer']['max_memory_bytes'] >= 16_000_000
+
+
+def test_timed_counts_errors_and_logs(caplog):
+    registry = MetricsRegistry(trace_memory=False)
+
+    @registry.timed()
+    def fails():
+        raise ValueError("boom")
+
+    with caplog.at_level(logging.INFO, logger="audio_analyzer.metrics"):
+        with pytest.raises(ValueError):
+            fails()
+
+    row = registry.snapshot()[0]
+    assert row['stage'].endswith("fails") and row['errors'] == 1
+    record = json.loads(caplog.records[-1].message)
+    assert record['stage'] == row['stage'] and record['error'] is True
+
+
+def test_prometheus_text():
+    registry = MetricsRegistry(trace_memory=False, buckets=(0.1, 1.0))
+    registry.record('load_audio', 0.05, 0.04, 1024)
+    registry.record('load_audio', 0.5, 0.4, 2048)
+    text = registry.prometheus_text()
+    assert 'audio_analyzer_stage_seconds_bucket{stage="load_audio",le="0.1"} 1' in text
+    assert 'audio_analyzer_stage_seconds_bucket{stage="load_audio",le="1"} 2' in text
+    assert 'audio_analyzer_stage_seconds_bucket{stage="load_audio",le="+Inf"} 2' in text
+    assert 'audio_analyzer_stage_seconds_count{stage="load_audio"} 2' in text
+    assert 'audio_analyzer_stage_max_memory_bytes{stage="load_audio"} 2048' in text
+    assert "# TYPE audio_analyzer_stage_cpu_seconds_total counter" in text
+
+
+def test_analyzer_stages_are_instrumented():
+    metrics.reset()
+    AudioAnalyzer().analyze(np.random.rand(22050 * 2), 22050)
+    stages = {row['stage'] for row in metrics.snapshot()}
+    assert {'AudioAnalyzer.analyze', 'AudioAnalyzer.estimate_tempo', 'AudioFeatures.chroma',
+            'AudioFeatures.onset_env'} <= stages
+
+
+def test_metrics_server():
+    registry = MetricsRegistry(trace_memory=False)
+    registry.record('cache_get', 0.001, 0.001)
+    server = start_metrics_server(0, registry, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert 'stage="cache_get"' in response.read().decode()
+    finally:
+        server.shutdown()
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from src.youtube.playlist import PlaylistIngestor
+
+
+class FakeDownloader:
+    """Stands in for the extractor: writes a small file per URL after a delay."""
+
+    def __init__(self, delay=0.05, broken=()):
+        self.delay = delay
+        self.broken = set(broken)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def get_playlist_urls(self, url):
+        return [f"{url}&index={i}" for i in range(4)]
+
+    def download_audio(self, url, output_dir):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if url in self.broken:
+                raise Exception("Error while downloading: video unavailable")
+            path = os.path.join(output_dir, url.rsplit("/", 1)[-1] + ".wav")
+            with open(path, "wb") as f:
+                f.write(url.encode())
+            return path
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def read_file(path):
+    time.sleep(0.05)
+    with open(path, "rb") as f:
+        return {'content': f.read().decode()}
+
+
+def test_ingest_overlaps_downloads_and_processing(tmp_path):
+    urls = [f"https://example.com/v{i}" for i in range(8)]
+    processing_started = threading.Event()
+    overlapped = []
+
+    class GatedDownloader(FakeDownloader):
+        def download_audio(self, url, output_dir):
+            # The last download only finishes once processing has begun,
+            # which never happens if everything is downloaded first
+            if url == urls[-1]:
+                overlapped.append(processing_started.wait(timeout=5))
+            return super().download_audio(url, output_dir)
+
+    def process(path):
+        processing_started.set()
+        return read_file(path)
+
+    downloader = GatedDownloader()
+    ingestor = PlaylistIngestor(downloader, process, download_workers=3, analysis_workers=2)
+    items = ingestor.ingest(urls, str(tmp_path))
+
+    assert [item['url'] for item in items] == urls
+    assert all(item['status'] == 'done' for item in items)
+    assert [item['result']['content'] for item in items] == urls
+    assert downloader.max_in_flight > 1
+    assert overlapped == [True]
+
+
+def test_failures_are_isolated_and_progress_is_reported(tmp_path):
+    urls = [f"https://example.com/v{i}" for i in range(5)]
+
+    def process(path):
+        if path.endswith("v3.wav"):
+            raise ValueError("corrupt audio")
+        return read_file(path)
+
+    updates = []
+    ingestor = PlaylistIngestor(FakeDownloader(delay=0.01, broken=[urls[1]]), process)
+    items = ingestor.ingest(urls, str(tmp_path), progress_callback=updates.append)
+
+    assert [item['status'] for item in items] == ['done', 'failed', 'done', 'failed', 'done']
+    assert "Download failed" in items[1]['error']
+    assert "Processing failed: corrupt audio" in items[3]['error']
+    assert updates[-1] == {'total': 5, 'downloaded': 4, 'processed': 3, 'failed': 2}
+
+
+def test_backpressure_bounds_downloaded_files(tmp_path):
+    waiting = []
+    lock = threading.Lock()
+    max_waiting = 0
+
+    class CountingDownloader(FakeDownloader):
+        def download_audio(self, url, output_dir):
+            nonlocal max_waiting
+            path = super().download_audio(url, output_dir)
+            with lock:
+                waiting.append(path)
+                max_waiting = max(max_waiting, len(waiting))
+            return path
+
+    def slow_process(path):
+        time.sleep(0.05)
+        with lock:
+            waiting.remove(path)
+        return {}
+
+    ingestor = PlaylistIngestor(CountingDownloader(delay=0.001), slow_process,
+                                download_workers=2, analysis_workers=1, max_pending=1)
+    items = ingestor.ingest([f"https://example.com/v{i}" for i in range(10)], str(tmp_path))
+
+    assert all(item['status'] == 'done' for item in items)
+    assert max_waiting <= 2 + 1 + 1
+
+
+def test_ingest_playlist_expands_entries(tmp_path):
+    ingestor = PlaylistIngestor(FakeDownloader(delay=0), read_file)
+    items = ingestor.ingest_playlist("https://example.com/playlist?list=abc", str(tmp_path))
+    assert len(items) == 4 and all(item['status'] == 'done' for item in items)
+
+
+def test_empty_input(tmp_path):
+    assert PlaylistIngestor(FakeDownloader(), read_file).ingest([], str(tmp_path)) == []
+
+
+def test_dead_analysis_worker_stops_downloads(tmp_path):
+    class Crash(BaseException):
+        pass
+
+    downloader = FakeDownloader(delay=0.001)
+    processed = []
+
+    def crash(path):
+        processed.append(path)
+        raise Crash("analysis worker died")
+
+    ingestor = PlaylistIngestor(downloader, crash, download_workers=2, analysis_workers=1, max_pending=1)
+    errors = []
+
+    def run():
+        try:
+            ingestor.ingest([f"https://example.com/v{i}" for i in range(10)], str(tmp_path))
+        except Crash as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive(), "downloaders blocked on the queue of a dead analysis worker"
+    assert len(errors) == 1 and len(processed) == 1
+    assert len(os.listdir(tmp_path)) < 10  # remaining downloads were abandoned
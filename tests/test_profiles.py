@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from dataclasses import replace
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.profiles import ANALYSIS_VERSION, DEFAULT_PROFILE, PROFILES, AnalysisProfile, get_profile
+
+
+def a_minor(sr, seconds):
+    t = np.arange(int(sr * seconds)) / sr
+    return (sum(np.sin(2 * np.pi * f * t) for f in (220.0, 261.63, 329.63)) / 6).astype(np.float32)
+
+
+def test_get_profile():
+    assert get_profile() is DEFAULT_PROFILE is PROFILES['balanced']
+    assert get_profile('fast') is PROFILES['fast']
+    custom = AnalysisProfile('custom', hop_length=1024)
+    assert get_profile(custom) is custom
+    with pytest.raises(ValueError, match="Unknown analysis profile"):
+        get_profile('ultra')
+    with pytest.raises(ValueError):
+        AnalysisProfile('bad', bins_per_octave=20)
+
+
+def test_cache_variants_are_distinct():
+    assert PROFILES['balanced'].cache_variant == f'balanced-v{ANALYSIS_VERSION}'
+    assert PROFILES['fast'].cache_variant == f'fast-v{ANALYSIS_VERSION}'
+    assert PROFILES['accurate'].cache_variant == f'accurate-v{ANALYSIS_VERSION}'
+    tweaked = replace(PROFILES['fast'], hop_length=512)
+    assert tweaked.cache_variant.startswith('fast-') and tweaked.cache_variant.endswith(f'-v{ANALYSIS_VERSION}')
+    assert tweaked.cache_variant != replace(PROFILES['fast'], hop_length=128).cache_variant
+
+
+def test_fast_profile_downsamples_and_skips_extras():
+    analyzer = AudioAnalyzer('fast')
+    y = a_minor(22050, 5)
+    features = analyzer.features(y, 22050)
+    assert features.sr == 11025 and features.hop_length == 256
+    assert analyzer.features(y, 22050) is features
+
+    results = analyzer.analyze(y, 22050)
+    assert results['key'] == "A minor"
+    assert list(results['additional_info']) == ['duration']
+    assert results['additional_info']['duration'] == pytest.approx(5, abs=0.01)
+    assert 'harmonic' not in vars(features)
+
+
+def test_accurate_profile_scores_the_harmonic_component():
+    analyzer = AudioAnalyzer('accurate')
+    y = a_minor(22050, 5)
+    results = analyzer.analyze(y, 22050)
+    assert results['key'] == "A minor"
+    assert 'harmonic_chroma' in vars(analyzer.features(y, 22050))
+    assert 'tempo_confidence' in results['additional_info']
+
+
+def test_feature_params_include_cqt_bins():
+    params = PROFILES['accurate'].features(None, 22050).params
+    assert params == {'sr': 22050, 'hop_length': 256, 'bins_per_octave': 72, 'n_octaves': 7}
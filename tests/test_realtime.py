@@ -0,0 +1,65 @@
+import time
+import numpy as np
+import pytest
+import soundfile as sf
+from src.audio.realtime import OnlineAnalyzer, RingBuffer
+
+
+def a_minor_at_120(sr, seconds):
+    """A minor triad tones under clicks every half second."""
+    t = np.arange(int(sr * seconds)) / sr
+    y = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 261.63, 329.63)) / 6
+    click_t = np.arange(int(0.03 * sr)) / sr
+    click = np.sin(2 * np.pi * 1000 * click_t) * np.exp(-click_t * 150)
+    for start in range(0, len(y) - len(click), sr // 2):
+        y[start:start + len(click)] += 0.5 * click
+    return y.astype(np.float32)
+
+
+def test_ring_buffer():
+    ring = RingBuffer(4)
+    assert list(ring.latest()) == [0, 0, 0, 0]
+    ring.extend([1, 2, 3])
+    ring.extend([4, 5])
+    assert list(ring.latest()) == [2, 3, 4, 5]
+    assert list(ring.latest(2)) == [4, 5]
+    ring.extend(np.arange(10, 20))
+    assert list(ring.latest()) == [16, 17, 18, 19]
+
+
+def test_wav_fed_in_chunks_keeps_up(tmp_path):
+    sr = 22050
+    path = tmp_path / "live.wav"
+    sf.write(path, a_minor_at_120(sr, 20), sr)
+
+    analyzer = OnlineAnalyzer()
+    chunk = 1024
+    slowest = 0.0
+    estimate = None
+    for block in sf.blocks(str(path), blocksize=chunk, dtype='float32'):
+        start = time.perf_counter()
+        estimate = analyzer.push(block) or estimate
+        slowest = max(slowest, time.perf_counter() - start)
+
+    # Every chunk is processed faster than it plays
+    assert slowest < chunk / sr
+    assert estimate['key'] == "A minor"
+    assert estimate['bpm'] == pytest.approx(120, abs=2)
+    assert estimate['time'] == pytest.approx(20, abs=0.1)
+
+
+def test_partial_hops_and_warmup():
+    analyzer = OnlineAnalyzer()
+    assert analyzer.push(np.zeros(100, dtype=np.float32)) is None
+    estimate = analyzer.push(np.zeros(412, dtype=np.float32))
+    assert estimate == {'time': pytest.approx(512 / 22050), 'key': None, 'key_confidence': 0.0,
+                        'bpm': None, 'tempo_confidence': 0.0}
+
+
+def test_resamples_stereo_input():
+    sr = 44100
+    y = a_minor_at_120(sr, 12)
+    analyzer = OnlineAnalyzer(input_sample_rate=sr)
+    estimates = list(analyzer.process_stream(np.stack([y, y], axis=1)[i:i + 4096] for i in range(0, len(y), 4096)))
+    assert estimates[-1]['key'] == "A minor"
+    assert estimates[-1]['bpm'] == pytest.approx(120, abs=2)
@@ -0,0 +1,120 @@
+import os
+import pytest
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:
+    pytest.skip("pyarrow is not available", allow_module_level=True)
+
+from src.optimization.results_store import ResultsStore, parse_key
+
+
+def make_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = tmp_path / f"track{i}.wav"
+        path.write_bytes(b"RIFF" + os.urandom(256))
+        paths.append(str(path))
+    return paths
+
+
+def result(key, bpm, duration=200.0):
+    return {'key': key, 'bpm': bpm, 'additional_info': {
+        'duration': duration, 'tempo_confidence': 0.8, 'key_strength': 0.6,
+        'spectral_bandwidth': 1500.0, 'zero_crossing_rate': 0.05}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(str(tmp_path / "store"), buffer_size=3, compact_after=1000)
+
+
+def test_parse_key():
+    assert parse_key("A minor") == ("A", "minor", False)
+    assert parse_key("C# major (uncertain)") == ("C#", "major", True)
+    assert parse_key(None) == (None, None, False)
+
+
+def test_query_pushes_filters(store, tmp_path):
+    paths = make_files(tmp_path, 4)
+    store.append({paths[0]: result("A minor", 124), paths[1]: result("A minor", 140),
+                  paths[2]: result("C major", 122)})
+    store.append({paths[3]: result("A minor (uncertain)", 120)})
+
+    table = store.query(key="A minor", min_bpm=120, max_bpm=128, columns=['path', 'bpm', 'key_uncertain'])
+    rows = sorted(table.to_pylist(), key=lambda row: row['bpm'])
+    assert rows == [{'path': paths[3], 'bpm': 120.0, 'key_uncertain': True},
+                    {'path': paths[0], 'bpm': 124.0, 'key_uncertain': False}]
+    assert store.query(filter=ds.field('bpm') > 130).column('path').to_pylist() == [paths[1]]
+    assert store.query(variant="fast").num_rows == 0
+
+
+def test_latest_result_wins_and_compaction(store, tmp_path):
+    path, other = make_files(tmp_path, 2)
+    store.append({path: result("A minor", 124), other: result("D major", 90)})
+    store.append({path: result("C major", 124)}, segments={path: [
+        {'start': 0, 'end': 30, 'key': "C major", 'bpm': 124},
+        {'start': 30, 'end': 60, 'key': "A minor", 'bpm': 125}]})
+    store.append({path: result("C major", 100)}, variant="fast")
+
+    assert store.query(key="A minor").num_rows == 0
+    assert store.query(key="C major").column('bpm').to_pylist() == [124.0]
+    assert store.query(variant=None).num_rows == 3
+    segments = store.segments(store.query(key="C major", columns=['track_id']).column('track_id').to_pylist())
+    assert segments.column('key').to_pylist() == ["C", "A"]
+
+    kept = store.compact()
+    assert kept == {'tracks': 3, 'segments': 2}
+    assert len(store._parts(store.TRACKS)) == 1
+    assert store.query(key="C major").column('bpm').to_pylist() == [124.0]
+    assert store.segments().num_rows == 2
+
+
+def test_buffered_adds_and_export(store, tmp_path):
+    paths = make_files(tmp_path, 4)
+    with store:
+        for i, path in enumerate(paths):
+            store.add(path, result("G major", 100 + i))
+        assert store.query().num_rows == 3  # one buffer written, one row pending
+    assert store.query().num_rows == 4
+
+    assert store.export(str(tmp_path / "g.csv"), min_bpm=102) == 2
+    assert (tmp_path / "g.csv").read_text().count("\n") == 3
+    with pytest.raises(ValueError):
+        store.export(str(tmp_path / "g.xlsx"))
+
+
+def test_compacted_parts_stay_readable_until_the_next_compaction(store, tmp_path):
+    paths = make_files(tmp_path, 3)
+    for i, path in enumerate(paths[:2]):
+        store.append({path: result("E minor", 120 + i)})
+    listed = store._dataset(store.TRACKS)  # a query that listed the parts before compaction
+    store.compact()
+    assert listed.to_table().num_rows == 2
+    assert store.query().num_rows == 2
+
+    store.append({paths[2]: result("E minor", 130)})
+    store.compact()
+    tracks_dir = os.path.join(store.store_dir, "tracks")
+    entries = os.listdir(tracks_dir)
+    # The first compaction's input is gone; this one's is tombstoned
+    assert len([entry for entry in entries if entry.endswith(".removed")]) == 2
+    assert len(entries) == 5
+    with pytest.raises(FileNotFoundError):
+        listed.to_table()
+    assert store.query().num_rows == 3
+
+
+def test_reads_list_the_parts_again(store, tmp_path):
+    path, other = make_files(tmp_path, 2)
+    store.append({path: result("E minor", 120)})
+    store.append({other: result("E minor", 121)})
+    real_dataset = store._dataset
+    stale = [real_dataset(store.TRACKS)]
+    os.remove(stale[0].files[0])
+
+    def dataset(name):
+        return stale.pop() if stale else real_dataset(name)
+
+    store._dataset = dataset
+    assert store.query().num_rows == 1
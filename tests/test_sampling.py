@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from src.audio.sampling import SampledAnalyzer
+
+
+@pytest.fixture(scope="module")
+def long_track(tmp_path_factory):
+    """Four minutes of an A minor triad under clicks at 128 BPM."""
+    sr = 22050
+    t = np.arange(sr * 240) / sr
+    y = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 261.63, 329.63)) / 6
+    click_t = np.arange(int(0.03 * sr)) / sr
+    click = np.sin(2 * np.pi * 1000 * click_t) * np.exp(-click_t * 150)
+    for start in range(0, len(y) - len(click), int(sr * 60 / 128)):
+        y[start:start + len(click)] += 0.5 * click
+    path = tmp_path_factory.mktemp("sampling") / "long.wav"
+    sf.write(path, y.astype(np.float32), sr)
+    return str(path)
+
+
+def test_plan_windows_picks_start_middle_and_loudest():
+    analyzer = SampledAnalyzer()
+    centres = np.arange(5, 600, 10.0)
+    rms = np.where((centres > 400) & (centres < 430), 1.0, 0.1)
+    starts = analyzer.plan_windows(600, centres, rms)
+    assert starts[:2] == [0.0, 285.0]
+    assert 380 <= starts[2] <= 405
+
+
+def test_more_windows_spread_out():
+    analyzer = SampledAnalyzer()
+    added = analyzer.more_windows(600, [0.0, 285.0, 570.0], 2)
+    assert len(added) == 2
+    starts = sorted([0.0, 285.0, 570.0] + added)
+    assert all(b - a >= 30 for a, b in zip(starts, starts[1:]))
+
+
+def test_consistent_track_uses_three_windows(long_track):
+    results = SampledAnalyzer().analyze_file(long_track)
+    assert results['key'] == "A minor"
+    assert results['additional_info']['duration'] == pytest.approx(240, abs=0.5)
+    sampling = results['sampling']
+    assert len(sampling['windows']) == 3
+    assert not sampling['escalated'] and not sampling['full']
+    assert sampling['tempo_agreement'] == 1.0
+
+
+def test_uncertain_estimates_escalate_to_the_full_track(long_track):
+    results = SampledAnalyzer(key_threshold=0.999, max_windows=5).analyze_file(long_track)
+    assert results['key'] == "A minor"
+    assert results['sampling']['escalated'] and results['sampling']['full']
+
+
+def test_short_tracks_are_analysed_whole(tmp_path):
+    path = tmp_path / "short.wav"
+    sf.write(path, np.random.default_rng(0).standard_normal(22050 * 20).astype(np.float32) * 0.1, 22050)
+    results = SampledAnalyzer().analyze_file(str(path))
+    assert results['sampling']['full'] and not results['sampling']['escalated']
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+
+from src.jobs.queue import DONE, FAILED
+from src.jobs.scheduler import (ANALYSIS, CANCELLED, SEPARATION, Scheduler, SchedulerFull, TaskCancelled,
+                                check_cancelled)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = Scheduler(analysis_workers=1, separation_workers=1, max_queued=4, max_queued_per_user=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def blocker(scheduler, pool=ANALYSIS):
+    """Occupy the pool's single worker until the returned event is set."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    task = scheduler.submit(pool, block, user='blocker')
+    assert started.wait(5)
+    return task, release
+
+
+def test_result_and_failure(scheduler):
+    assert scheduler.submit(ANALYSIS, lambda x: x * 2, 21).result(timeout=5) == 42
+
+    def fail():
+        raise ValueError("boom")
+
+    task = scheduler.submit(SEPARATION, fail)
+    with pytest.raises(ValueError):
+        task.result(timeout=5)
+    assert task.status == FAILED
+
+
+def test_round_robin_between_users(scheduler):
+    task, release = blocker(scheduler)
+    order = []
+    for user, name in [('alice', 'a1'), ('alice', 'a2'), ('bob', 'b1')]:
+        scheduler.submit(ANALYSIS, order.append, name, user=user)
+    release.set()
+    task.result(timeout=5)
+    scheduler.submit(ANALYSIS, lambda: None, user='carol').result(timeout=5)
+    assert order == ['a1', 'b1', 'a2']
+
+
+def test_queue_position(scheduler):
+    task, release = blocker(scheduler)
+    first = scheduler.submit(ANALYSIS, lambda: None, user='alice')
+    second = scheduler.submit(ANALYSIS, lambda: None, user='alice')
+    other = scheduler.submit(ANALYSIS, lambda: None, user='bob')
+    assert (first.position, other.position, second.position) == (0, 1, 2)
+    release.set()
+    assert second.result(timeout=5) is None and second.position == 0
+
+
+def test_admission_limits(scheduler):
+    task, release = blocker(scheduler)
+    for _ in range(2):
+        scheduler.submit(ANALYSIS, lambda: None, user='alice')
+    with pytest.raises(SchedulerFull):
+        scheduler.submit(ANALYSIS, lambda: None, user='alice')
+    for _ in range(2):
+        scheduler.submit(ANALYSIS, lambda: None, user='bob')
+    with pytest.raises(SchedulerFull):
+        scheduler.submit(ANALYSIS, lambda: None, user='carol')
+    # The other pool has its own queue
+    scheduler.submit(SEPARATION, lambda: None, user='carol').result(timeout=5)
+    release.set()
+
+
+def test_cancel_queued_task(scheduler):
+    task, release = blocker(scheduler)
+    calls = []
+    queued = scheduler.submit(ANALYSIS, calls.append, 1, user='alice')
+    finished = []
+    queued.add_done_callback(finished.append)
+    assert queued.cancel()
+    assert queued.status == CANCELLED and finished == [queued]
+    assert scheduler.stats()[ANALYSIS]['queued'] == 0
+    with pytest.raises(TaskCancelled):
+        queued.result()
+    release.set()
+    task.result(timeout=5)
+    assert calls == [] and not queued.cancel()
+
+
+def test_cancel_running_task_cooperatively(scheduler):
+    started = threading.Event()
+
+    def loop():
+        started.set()
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    task = scheduler.submit(SEPARATION, loop)
+    assert started.wait(5)
+    task.cancel()
+    with pytest.raises(TaskCancelled):
+        task.result(timeout=5)
+    assert task.status == CANCELLED
+    # The worker is free again
+    assert scheduler.submit(SEPARATION, lambda: 1).result(timeout=5) == 1
+
+
+def test_timeout_counts_from_start_and_cancels(scheduler):
+    task, release = blocker(scheduler)
+    queued = scheduler.submit(ANALYSIS, time.sleep, 0.01)
+    time.sleep(0.2)
+    release.set()
+    # Waited longer than the timeout in the queue, but ran well within it
+    assert queued.result(timeout=0.1, poll_interval=0.01) is None
+    assert queued.status == DONE
+
+    def loop():
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    slow = scheduler.submit(ANALYSIS, loop)
+    updates = []
+    with pytest.raises(TimeoutError):
+        slow.result(timeout=0.1, on_update=updates.append, poll_interval=0.02)
+    assert updates and slow.cancel_event.is_set()
+    slow.add_done_callback(lambda t: None)
+    assert scheduler.submit(ANALYSIS, lambda: 2).result(timeout=5) == 2
+    assert slow.status == CANCELLED
+
+
+def test_check_cancelled_outside_task():
+    # Outside a scheduled task there is nothing to cancel
+    check_cancelled()
+
+
+def test_pipeline_wait_fails_fast_and_cancels_siblings(scheduler):
+    from src.jobs.pipeline import _wait
+
+    def separate():
+        for _ in range(500):
+            check_cancelled()
+            time.sleep(0.01)
+
+    def analyse():
+        raise ValueError("bad audio")
+
+    separation = scheduler.submit(SEPARATION, separate)
+    analysis = scheduler.submit(ANALYSIS, analyse)
+    with pytest.raises(ValueError):
+        _wait([separation, analysis], timeout=30, on_update=None, poll_interval=0.01)
+    # Stopped by the analysis failure instead of running to completion
+    with pytest.raises(TaskCancelled):
+        separation.result(timeout=30)
+
+
+def test_pipeline_wait_applies_one_deadline(scheduler):
+    from src.jobs.pipeline import _wait
+
+    def slow():
+        for _ in range(100):
+            check_cancelled()
+            time.sleep(0.01)
+
+    tasks = [scheduler.submit(SEPARATION, slow), scheduler.submit(ANALYSIS, slow)]
+    with pytest.raises(TimeoutError):
+        _wait(tasks, timeout=0.2, on_update=None, poll_interval=0.01)
+    assert all(task.cancel_event.is_set() for task in tasks)
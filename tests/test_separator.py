@@ -1,4 +1,6 @@
 import pytest
+import os
+import numpy as np
 from src.audio.separator import VocalSeparator
 from unittest.mock import patch
 
@@ -11,4 +13,56 @@ def separator():
 @patch('spleeter.separator.Separator.separate_to_file')
 def test_separate_vocals(mock_separate, separator):
     separator.separate_vocals("dummy_path.wav", "output_dir")
-    mock_separate.assert_called_once_with("dummy_path.wav", "output_dir")
\ No newline at end of file
+    mock_separate.assert_called_once_with("dummy_path.wav", "output_dir")
+
+@patch('spleeter.separator.Separator.separate')
+def test_separate_waveform(mock_separate, separator):
+    mock_separate.return_value = {'vocals': np.zeros((44100, 2)), 'accompaniment': np.zeros((44100, 2))}
+    stems = separator.separate_waveform(np.zeros(22050, dtype=np.float32), sample_rate=22050)
+    waveform = mock_separate.call_args[0][0]
+    assert waveform.shape == (44100, 2)
+    assert waveform.dtype == np.float32
+    assert set(stems) == {'vocals', 'accompaniment'}
+
+
+def test_save_stems(separator, tmp_path):
+    stems = {'vocals': np.zeros((44100, 2), dtype=np.float32)}
+    paths = separator.save_stems(stems, str(tmp_path))
+    assert paths == {'vocals': str(tmp_path / "vocals.wav")}
+    assert os.path.exists(paths['vocals'])
+
+
+def test_separate_file_chunked(separator, tmp_path):
+    import soundfile as sf
+    audio_path = tmp_path / "input.wav"
+    sf.write(audio_path, np.random.rand(44100 * 3, 2).astype(np.float32) * 0.1, 44100)
+
+    def fake_separate(waveform):
+        return {'vocals': waveform * 0.5, 'accompaniment': waveform * 0.5}
+
+    with patch('spleeter.separator.Separator.separate', side_effect=fake_separate):
+        paths = separator.separate_file_chunked(str(audio_path), str(tmp_path / "out"),
+                                                window_seconds=1.0, overlap_seconds=0.1)
+    vocals, sr = sf.read(paths['vocals'])
+    assert sr == 44100
+    assert vocals.shape == (44100 * 3, 2)
+
+
+def test_separate_waveform_to_files_stops_when_cancelled(tmp_path):
+    from benchmarks.run import StubSeparationModel
+    backend = StubSeparationModel()
+    separator = VocalSeparator('stub', backend=backend)
+    checks = []
+
+    def check_cancelled():
+        checks.append(len(checks))
+        if len(checks) == 3:
+            raise RuntimeError("cancelled")
+
+    with patch.object(backend, 'separate', wraps=backend.separate) as separate, \
+            pytest.raises(RuntimeError, match="cancelled"):
+        separator.separate_waveform_to_files(np.zeros((44100 * 5, 2), dtype=np.float32), str(tmp_path),
+                                             window_seconds=1.0, overlap_seconds=0.1,
+                                             check_cancelled=check_cancelled)
+    # Once before resampling, then before each window
+    assert separate.call_count == 1
@@ -0,0 +1,33 @@
+import pytest
+import numpy as np
+import soundfile as sf
+from src.audio.shared_buffer import SharedAudioBuffer
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    samples = (np.random.rand(44100, 2) - 0.5).astype(np.float32)
+    path = tmp_path / "stereo.wav"
+    sf.write(path, samples, 44100, subtype="FLOAT")
+    return str(path), samples
+
+
+def test_from_file_decodes_once(audio_file):
+    path, samples = audio_file
+    with SharedAudioBuffer.from_file(path) as buffer:
+        full = buffer.full_rate()
+        np.testing.assert_array_equal(full, samples)
+        assert not full.flags.writeable
+
+        analysis = buffer.analysis_view(22050)
+        assert analysis.dtype == np.float32
+        assert len(analysis) == 22050
+        assert buffer.analysis_view(22050) is analysis
+
+
+def test_close_keeps_views_alive(audio_file):
+    path, samples = audio_file
+    buffer = SharedAudioBuffer.from_file(path)
+    full = buffer.full_rate()
+    buffer.close()
+    np.testing.assert_array_equal(full, samples)
@@ -0,0 +1,200 @@
+import os
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from src.audio.encoder import publish, published_dir
+from src.jobs.pipeline import process_file
+from src.jobs.scheduler import Scheduler
+from src.optimization.cache import ResultsCache
+from src.optimization.stem_store import StemStore
+
+MODEL = 'spleeter:2stems'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StemStore(str(tmp_path / "stems"), max_bytes=None, min_age=0)
+
+
+def stage(store, size=1000):
+    staging = store.staging_dir()
+    for name in ("vocals", "accompaniment"):
+        with open(os.path.join(staging, f"{name}.wav"), "wb") as f:
+            f.write(b"\0" * size)
+    return staging
+
+
+def test_commit_and_lookup(store):
+    assert store.lookup("b2:abc", MODEL) is None
+    stems = store.commit("b2:abc", MODEL, stage(store))
+    assert set(stems) == {"vocals", "accompaniment"}
+    assert store.lookup("b2:abc", MODEL) == stems
+    assert store.lookup("b2:abc", "spleeter:4stems") is None
+    assert store.usage() == {'bytes': 2000, 'entries': 1, 'leases': 0}
+
+
+def test_concurrent_commit_keeps_first_stems(store):
+    first = store.commit("b2:abc", MODEL, stage(store))
+    staging = stage(store)
+    assert store.commit("b2:abc", MODEL, staging) == first
+    assert not os.path.exists(staging)
+
+
+def test_lookup_forgets_missing_entries(store):
+    stems = store.commit("b2:abc", MODEL, stage(store))
+    for path in stems.values():
+        os.remove(path)
+    os.rmdir(os.path.dirname(stems['vocals']))
+    assert store.lookup("b2:abc", MODEL) is None
+    assert store.usage()['entries'] == 0
+
+
+def test_collect_evicts_least_recently_used(store):
+    store.max_bytes = 4500
+    for fingerprint in ("b2:a", "b2:b", "b2:c"):
+        store.commit(fingerprint, MODEL, stage(store))
+        time.sleep(0.01)
+    store.lookup("b2:a", MODEL)  # a is now the most recently used
+
+    assert store.collect() == {'evicted': 1, 'freed_bytes': 2000}
+    assert store.lookup("b2:b", MODEL) is None
+    assert store.lookup("b2:a", MODEL) and store.lookup("b2:c", MODEL)
+
+
+def test_collect_counts_encoded_downloads(store):
+    store.max_bytes = 2500
+    stems = store.commit("b2:a", MODEL, stage(store))
+    assert store.collect()['evicted'] == 0
+    with open(os.path.join(os.path.dirname(stems['vocals']), "vocals.flac"), "wb") as f:
+        f.write(b"\0" * 1000)
+    assert store.collect()['evicted'] == 1
+    assert not os.path.exists(stems['vocals'])
+
+
+def test_leased_stems_are_kept(store):
+    store.max_bytes = 0
+    store.commit("b2:a", MODEL, stage(store))
+    key = store.stem_key("b2:a", MODEL)
+    assert store.lease(key, "session-1") and store.lease(key, "session-2")
+    assert store.usage()['leases'] == 2
+
+    store.release(key, "session-1")
+    assert store.collect()['evicted'] == 0
+    store.release(key, "session-2")
+    assert store.collect()['evicted'] == 1
+    assert not store.lease(key, "session-1")
+
+
+def test_expired_leases_and_recent_entries(store):
+    store.max_bytes = 0
+    store.commit("b2:a", MODEL, stage(store))
+    key = store.stem_key("b2:a", MODEL)
+    store.lease(key, "session-1", ttl=-1)
+    store.min_age = 60
+    assert store.collect()['evicted'] == 0  # recently used
+    store.min_age = 0
+    assert store.collect()['evicted'] == 1
+    assert store.usage()['leases'] == 0
+
+
+def test_published_links_end_with_their_lease(store, tmp_path):
+    stems = store.commit("b2:a", MODEL, stage(store))
+    key = store.stem_key("b2:a", MODEL)
+    static_dir = str(tmp_path / "static")
+    link_dir = published_dir(stems['vocals'], static_dir)
+    assert not store.track_link(key, "session-1", link_dir)  # no lease
+
+    for holder in ("session-1", "session-2"):
+        store.lease(key, holder)
+        assert store.track_link(key, holder, link_dir)
+    publish(stems['vocals'], static_dir, "vocals.wav")
+
+    store.release(key, "session-1")
+    store.collect()
+    assert os.path.exists(link_dir)  # still offered by session-2
+    store.release(key, "session-2")
+    store.collect()
+    assert not os.path.exists(link_dir)
+
+
+def test_collect_counts_copied_links(store, tmp_path):
+    stems = store.commit("b2:a", MODEL, stage(store))
+    key = store.stem_key("b2:a", MODEL)
+    link_dir = tmp_path / "static" / "copy"
+    link_dir.mkdir(parents=True)
+    os.link(stems['vocals'], link_dir / "linked.wav")
+    store.lease(key, "session-1", ttl=-1)  # expires right away
+    store.lease(key, "session-2")
+    store.track_link(key, "session-2", str(link_dir))
+    store.collect()
+    assert store.usage()['bytes'] == 2000  # hard links share the stem's bytes
+
+    (link_dir / "copied.wav").write_bytes(b"\0" * 1000)
+    store.collect()
+    assert store.usage()['bytes'] == 3000
+
+    store.release(key, "session-2")
+    store.collect()
+    assert not link_dir.exists() and store.usage()['bytes'] == 2000
+
+
+def test_abandoned_staging_is_removed(store):
+    staging = stage(store)
+    store.collect()
+    assert os.path.exists(staging)
+    store.staging_ttl = -1
+    store.collect()
+    assert not os.path.exists(staging)
+
+
+def test_background_collector(store):
+    store.max_bytes = 0
+    store.commit("b2:a", MODEL, stage(store))
+    store.start_collector(interval=0.01)
+    try:
+        deadline = time.time() + 5
+        while store.usage()['entries'] and time.time() < deadline:
+            time.sleep(0.01)
+        assert store.usage()['entries'] == 0
+    finally:
+        store.close()
+
+
+class FakeSeparator:
+    model = MODEL
+
+    def __init__(self):
+        self.calls = 0
+
+    def separate_waveform_to_files(self, waveform, output_dir, sample_rate=None, check_cancelled=None):
+        self.calls += 1
+        for name in ("vocals", "accompaniment"):
+            sf.write(os.path.join(output_dir, f"{name}.wav"), waveform, sample_rate)
+
+
+def test_process_file_reuses_stored_stems(tmp_path, store):
+    sr = 22050
+    t = np.arange(sr * 3) / sr
+    audio_path = str(tmp_path / "song.wav")
+    sf.write(audio_path, 0.5 * np.sin(2 * np.pi * 440 * t), sr)
+    copy_path = str(tmp_path / "same song.wav")
+    with open(audio_path, "rb") as src, open(copy_path, "wb") as dst:
+        dst.write(src.read())
+
+    separator = FakeSeparator()
+    cache = ResultsCache(str(tmp_path / "cache"))
+    scheduler = Scheduler()
+    try:
+        first = process_file(audio_path, None, separator, cache, scheduler=scheduler, stem_store=store)
+        second = process_file(copy_path, None, separator, cache, scheduler=scheduler, stem_store=store)
+    finally:
+        scheduler.shutdown()
+
+    assert separator.calls == 1
+    assert second['vocal_path'] == first['vocal_path'] and os.path.exists(first['vocal_path'])
+    assert second['stem_key'] == first['stem_key']
+    assert second['results']['key'] == first['results']['key']
+    assert os.listdir(store.staging_root) == []
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+import librosa
+import pytest
+import numpy as np
+import soundfile as sf
+from benchmarks.run import StubSeparationModel
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.loader import AudioLoader
+from src.audio.profiles import get_profile
+from src.audio.separator import VocalSeparator
+from src.audio.streaming import StreamingAnalyzer
+from src.jobs import pipeline
+from src.jobs.scheduler import Scheduler
+from src.optimization.cache import ResultsCache
+from tests.test_decoder import FakeFFmpeg
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    sr = 44100
+    t = np.arange(sr * 12) / sr
+    y = np.sin(2 * np.pi * 220 * t) + 0.5 * np.sin(2 * np.pi * 277.18 * t)
+    y *= 0.6 + 0.4 * np.sign(np.sin(2 * np.pi * 2 * t))
+    path = tmp_path / "tone.wav"
+    sf.write(path, (0.3 * y).astype(np.float32), sr)
+    return str(path)
+
+
+def test_streaming_matches_full_analysis(audio_file):
+    streaming = StreamingAnalyzer(block_seconds=4.0, margin_seconds=2.0)
+    result = streaming.analyze_file(audio_file)
+
+    y, sr = AudioLoader().load_audio(audio_file)
+    expected = AudioAnalyzer().analyze(y, sr)
+
+    assert result['key'] == expected['key']
+    assert result['bpm'] == expected['bpm']
+    assert set(result['additional_info']) == set(expected['additional_info'])
+    for name, value in expected['additional_info'].items():
+        assert result['additional_info'][name] == pytest.approx(value, rel=1e-2)
+
+
+def test_harmonic_chroma_is_only_streamed_when_scored(audio_file):
+    with patch('src.audio.features.librosa.effects.harmonic', wraps=librosa.effects.harmonic) as hpss:
+        StreamingAnalyzer(AudioAnalyzer(get_profile('accurate')), block_seconds=4.0).accumulate(audio_file)
+        assert hpss.call_count == 3  # every block
+
+        hpss.reset_mock()
+        balanced = StreamingAnalyzer(AudioAnalyzer(get_profile('balanced')), block_seconds=4.0)
+        summary = balanced.accumulate(audio_file)
+        assert hpss.call_count == 0
+
+        # An ambiguous key streams the file a second time for its harmonic double-check
+        harmonic_chroma = summary.harmonic_chroma_mean
+        assert hpss.call_count == 3
+        expected = StreamingAnalyzer(balanced.analyzer, block_seconds=4.0, harmonic=True).accumulate(audio_file)
+        np.testing.assert_allclose(harmonic_chroma, expected.harmonic_chroma_mean)
+        np.testing.assert_allclose(summary.chroma_mean, expected.chroma_mean)
+
+
+def test_get_duration(audio_file, tmp_path):
+    assert StreamingAnalyzer.get_duration(audio_file) == pytest.approx(12.0)
+    assert StreamingAnalyzer.get_duration(str(tmp_path / "missing.wav")) is None
+
+
+def test_process_file_streams_formats_libsndfile_cannot_read(tmp_path, monkeypatch):
+    # A YouTube download kept as m4a, long enough to be streamed: it must
+    # neither be decoded whole nor fall back to the in-memory path
+    sr = 44100
+    t = np.arange(sr * 6) / sr
+    y = 0.3 * np.stack([np.sin(2 * np.pi * 220 * t), np.sin(2 * np.pi * 330 * t)], axis=1).astype(np.float32)
+    path = tmp_path / "dQw4w9WgXcQ.m4a"
+    path.write_bytes(b"not really aac")
+    monkeypatch.setattr(pipeline.SharedAudioBuffer, 'from_file', None)
+
+    ffmpeg = FakeFFmpeg(y, sr)
+    scheduler = Scheduler()
+    try:
+        with patch('shutil.which', return_value='/usr/bin/ffmpeg'), ffmpeg.patch():
+            result = pipeline.process_file(str(path), str(tmp_path / "stems"),
+                                           VocalSeparator('stub', backend=StubSeparationModel()),
+                                           ResultsCache(str(tmp_path / "cache")), scheduler=scheduler,
+                                           streaming_min_duration=5)
+    finally:
+        scheduler.shutdown()
+
+    assert sorted(ffmpeg.decoded) == [2, 2]  # separation and analysis each streamed the file once
+    assert sf.info(result['vocal_path']).duration == pytest.approx(6.0, abs=0.01)
+    assert set(result['results']) == {'key', 'bpm', 'additional_info'}
+    assert result['results']['additional_info']['duration'] == pytest.approx(6.0, abs=0.01)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy.ndimage import median_filter
+from src.audio.analyzer import AudioAnalyzer
+from src.audio.tempo import TempoEngine, _median_filter, _onset_flux
+
+
+def click_track(bpm, seconds, sr=22050):
+    y = 0.01 * np.random.default_rng(0).standard_normal(int(sr * seconds))
+    click_t = np.arange(int(0.03 * sr)) / sr
+    click = np.sin(2 * np.pi * 1000 * click_t) * np.exp(-click_t * 150)
+    for start in np.arange(0, seconds - 0.05, 60.0 / bpm):
+        start = int(start * sr)
+        y[start:start + len(click)] += click
+    return y.astype(np.float32)
+
+
+def test_median_filter_matches_scipy():
+    x = np.random.default_rng(1).random(500).astype(np.float32)
+    for size in (1, 5, 9):
+        assert np.array_equal(_median_filter(x, size), median_filter(x, size=size))
+
+
+def test_onset_flux():
+    log_mel = np.array([[0, 1, 3, 2], [0, 0, 1, 4]], dtype=np.float32)
+    assert np.allclose(_onset_flux(log_mel), [0, 0.5, 1.5, 1.5])
+
+
+@pytest.mark.parametrize("bpm", [72, 100, 128, 150])
+def test_estimate_click_tracks(bpm):
+    estimated, confidence = TempoEngine().estimate(click_track(bpm, 30))
+    assert estimated == pytest.approx(bpm, rel=0.03)
+    assert 0.3 < confidence <= 1.0
+
+
+def test_silence_and_short_input():
+    engine = TempoEngine()
+    assert engine.estimate(np.zeros(22050 * 5, dtype=np.float32)) == (0.0, 0.0)
+    assert engine.estimate(np.zeros(100, dtype=np.float32)) == (0.0, 0.0)
+
+
+def test_noise_has_low_confidence():
+    noise = np.random.default_rng(2).standard_normal(22050 * 20).astype(np.float32)
+    _, confidence = TempoEngine().estimate(noise)
+    assert confidence < 0.3
+
+
+def test_analyzer_detect_tempo():
+    bpm, confidence = AudioAnalyzer().detect_tempo(click_track(110, 20), 22050)
+    assert isinstance(bpm, int) and abs(bpm - 110) <= 2
+    assert isinstance(confidence, float)